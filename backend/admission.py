@@ -0,0 +1,228 @@
+"""
+Admission Control
+Per-endpoint concurrency limits with bounded, per-user-fair wait queues for CPU-heavy uploads
+
+Admission happens in ASGI middleware, before the upload body is read, so a
+rejected request costs almost nothing. A request either runs, waits in its
+client's queue, or is answered 503 at once with a Retry-After estimated from
+the measured service time and the backlog ahead of it. Freed slots go to the
+waiting clients in round-robin order, so one client sending a burst only
+delays its own requests.
+
+Limits are per process; under serve.py each worker gets its share of the host.
+"""
+import asyncio
+import json
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Dict, Optional, Tuple
+
+# Weight of the newest request in the service time average
+SERVICE_TIME_ALPHA = 0.2
+
+
+class Overloaded(Exception):
+    """No slot and no room to wait; retry_after is in whole seconds."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionSlot:
+    """A held slot; release() is idempotent and records how long the slot was held."""
+
+    def __init__(self, controller: "AdmissionController"):
+        self.controller = controller
+        self.started = time.perf_counter()
+        self.released = False
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.controller._release(time.perf_counter() - self.started)
+
+
+class AdmissionController:
+    """
+    At most max_concurrent requests run at once; up to max_queue more wait, no
+    more than max_queue_per_user of them from one client, each for at most
+    max_wait seconds.
+    """
+
+    def __init__(self, name: str, max_concurrent: int, max_queue: int, max_queue_per_user: int = 2, max_wait: float = 30.0):
+        self.name = name
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max(0, max_queue)
+        self.max_queue_per_user = max(1, max_queue_per_user)
+        self.max_wait = max_wait
+        self.running = 0
+        self.queued = 0
+        self._waiting: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+        self.service_time: Optional[float] = None
+        self._stats = {"admitted": 0, "waited": 0, "rejected_full": 0, "rejected_user": 0, "timed_out": 0}
+
+    def retry_after(self) -> int:
+        """Seconds until a new request would likely get a slot: the queue ahead of it drained at the measured rate."""
+        service = self.service_time if self.service_time is not None else 1.0
+        return max(1, math.ceil(service * (self.queued + 1) / self.max_concurrent))
+
+    def saturated(self) -> bool:
+        return self.running >= self.max_concurrent and self.queued >= self.max_queue
+
+    async def acquire(self, user: str) -> AdmissionSlot:
+        if self.running < self.max_concurrent and not self.queued:
+            self.running += 1
+            self._stats["admitted"] += 1
+            return AdmissionSlot(self)
+        if self.queued >= self.max_queue:
+            self._stats["rejected_full"] += 1
+            raise Overloaded("queue full", self.retry_after())
+        user_queue = self._waiting.get(user)
+        if user_queue is not None and len(user_queue) >= self.max_queue_per_user:
+            self._stats["rejected_user"] += 1
+            raise Overloaded("too many queued requests from this client", self.retry_after())
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiting.setdefault(user, deque()).append(waiter)
+        self.queued += 1
+        self._stats["waited"] += 1
+        try:
+            await asyncio.wait({waiter}, timeout=self.max_wait)
+        except asyncio.CancelledError:
+            # Client went away while waiting; pass on a slot it may just have been handed
+            if waiter.done() and not waiter.cancelled():
+                self._release(None)
+            else:
+                self._forget(user, waiter)
+            raise
+        if not waiter.done():
+            self._forget(user, waiter)
+            self._stats["timed_out"] += 1
+            raise Overloaded("timed out waiting for a slot", self.retry_after())
+        self._stats["admitted"] += 1
+        return AdmissionSlot(self)
+
+    def _forget(self, user: str, waiter: asyncio.Future):
+        waiter.cancel()
+        user_queue = self._waiting.get(user)
+        if user_queue is not None and waiter in user_queue:
+            user_queue.remove(waiter)
+            self.queued -= 1
+            if not user_queue:
+                del self._waiting[user]
+
+    def _release(self, held_seconds: Optional[float]):
+        if held_seconds is not None:
+            if self.service_time is None:
+                self.service_time = held_seconds
+            else:
+                self.service_time += SERVICE_TIME_ALPHA * (held_seconds - self.service_time)
+        # Hand the slot straight to the next client in round-robin order
+        while self._waiting:
+            user, user_queue = next(iter(self._waiting.items()))
+            waiter = user_queue.popleft()
+            self.queued -= 1
+            if user_queue:
+                self._waiting.move_to_end(user)
+            else:
+                del self._waiting[user]
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.running -= 1
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            **self._stats,
+            "running": self.running,
+            "queued": self.queued,
+            "waiting_clients": len(self._waiting),
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "service_time_ms": round(self.service_time * 1000, 1) if self.service_time is not None else None,
+            "retry_after": self.retry_after(),
+        }
+
+
+def client_key(scope) -> str:
+    """
+    Fairness key: the authenticated user when an auth middleware has set one,
+    else the client address. X-User-Id is sent by the client and could be
+    rotated to get around max_queue_per_user, so it only separates clients
+    whose address is unknown.
+    """
+    user = scope.get("user")
+    if user is not None and getattr(user, "is_authenticated", False):
+        return "user:" + str(user.identity)
+    client = scope.get("client")
+    if client:
+        return "addr:" + client[0]
+    for name, value in scope["headers"]:
+        if name == b"x-user-id" and value:
+            return "unknown:" + value.decode("latin-1")
+    return "addr:unknown"
+
+
+class AdmissionMiddleware:
+    """ASGI middleware holding a slot of the route's controller for the whole request, streaming included."""
+
+    def __init__(self, app, routes: Dict[Tuple[str, str], AdmissionController], on_reject=None, on_wait=None):
+        self.app = app
+        self.routes = routes
+        self.on_reject = on_reject
+        self.on_wait = on_wait
+
+    async def __call__(self, scope, receive, send):
+        controller = self.routes.get((scope.get("method"), scope.get("path"))) if scope["type"] == "http" else None
+        if controller is None:
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        try:
+            slot = await controller.acquire(client_key(scope))
+        except Overloaded as e:
+            if self.on_reject is not None:
+                self.on_reject(controller, e)
+            body = json.dumps({"detail": f"Server busy ({controller.name}): {e.reason}. Retry after {e.retry_after}s."}).encode()
+            await send({
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"retry-after", str(e.retry_after).encode()),
+                ],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+        if self.on_wait is not None:
+            self.on_wait(controller, time.perf_counter() - started)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            slot.release()
+
+
+def create_admission_controller(name: str, env_prefix: str, default_concurrency: int, queue_factor: int) -> AdmissionController:
+    """
+    Build a controller from <env_prefix>_CONCURRENCY and <env_prefix>_QUEUE, with
+    ADMISSION_QUEUE_PER_USER and ADMISSION_MAX_WAIT_SECONDS shared by all of them.
+    """
+    concurrency = int(os.getenv(f"{env_prefix}_CONCURRENCY", str(default_concurrency)))
+    return AdmissionController(
+        name,
+        max_concurrent=concurrency,
+        max_queue=int(os.getenv(f"{env_prefix}_QUEUE", str(concurrency * queue_factor))),
+        max_queue_per_user=int(os.getenv("ADMISSION_QUEUE_PER_USER", "2")),
+        max_wait=float(os.getenv("ADMISSION_MAX_WAIT_SECONDS", "30")),
+    )
+
+
+def cpu_share() -> int:
+    """CPUs per worker process: the host's CPUs split across SERVE_WORKERS (set by serve.py)."""
+    workers = max(1, int(os.getenv("SERVE_WORKERS", "1")))
+    return max(1, (os.cpu_count() or 1) // workers)
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+Bulk resume ingestion.
+
+Walks a directory of resumes, extracts text and skills from each file in a
+worker pool and appends one JSON record per file to a JSONL results file.
+The results file doubles as the checkpoint: re-running the same command skips
+every file that already has a record, so an interrupted run resumes where it
+stopped.
+
+Usage:
+    python bulk_ingest.py ./cohort-resumes --out cohort.jsonl
+    python bulk_ingest.py ./cohort-resumes --out cohort.jsonl --workers 8 --offline
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Dict, Iterator, List, Optional, Set
+
+RESUME_EXTENSIONS = (".pdf", ".doc", ".docx")
+
+
+def file_key(root: str, path: str) -> str:
+    """Identify a file by relative path, size and mtime so edited files are reprocessed."""
+    stat = os.stat(path)
+    return f"{os.path.relpath(path, root)}|{stat.st_size}|{stat.st_mtime_ns}"
+
+
+def iter_resume_files(root: str) -> Iterator[str]:
+    """Yield resume files under root in a stable order."""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if os.path.splitext(filename)[1].lower() in RESUME_EXTENSIONS:
+                yield os.path.join(dirpath, filename)
+
+
+def load_checkpoint(out_path: str, retry_errors: bool = False) -> Set[str]:
+    """
+    Read keys of already processed files from an existing results file. A file
+    retried with --retry-errors has several records; the last one counts.
+    """
+    latest: Dict[str, Dict] = {}
+    if not os.path.exists(out_path):
+        return set()
+    with open(out_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A torn last line from an interrupted run; that file is redone
+                continue
+            key = record.get("key") if isinstance(record, dict) else None
+            if key is None:
+                continue
+            latest[key] = record
+    return {key for key, record in latest.items() if not (retry_errors and record.get("error"))}
+
+
+def trim_torn_tail(out_path: str):
+    """Cut a partial last line left by an interrupted run, so appended records start on a line of their own."""
+    if not os.path.exists(out_path):
+        return
+    with open(out_path, "rb+") as f:
+        size = f.seek(0, os.SEEK_END)
+        if size == 0:
+            return
+        f.seek(size - 1)
+        if f.read(1) == b"\n":
+            return
+        # Walk back to the last newline; everything after it is the torn record
+        position = size
+        while position > 0:
+            step = min(65536, position)
+            f.seek(position - step)
+            newline = f.read(step).rfind(b"\n")
+            if newline != -1:
+                f.truncate(position - step + newline + 1)
+                return
+            position -= step
+        f.truncate(0)
+
+
+def _init_worker(offline: bool):
+    """Import the app modules once per worker process."""
+    if offline:
+        # Empty rather than unset: main.py's load_dotenv() would restore a key from .env
+        os.environ["GEMINI_API_KEY"] = ""
+    import main as app_main  # noqa: F401
+    import resume_analyzer  # noqa: F401
+
+
+def process_resume(path: str, key: str) -> Dict:
+    """Extract text and skills from one resume and return its result record."""
+    import main as app_main
+    from resume_analyzer import extract_text_from_resume
+
+    record: Dict = {"key": key, "file": path, "size": os.path.getsize(path)}
+    timings: Dict[str, float] = {}
+    started = time.perf_counter()
+    try:
+        t0 = time.perf_counter()
+        text = extract_text_from_resume(path)
+        timings["extract"] = time.perf_counter() - t0
+
+        record["text_stats"] = {
+            "chars": len(text),
+            "words": len(text.split()),
+            "lines": text.count("\n") + 1 if text else 0,
+        }
+
+        t0 = time.perf_counter()
+        skills = asyncio.run(app_main.process_text_with_gemini(text)) if text.strip() else []
+        timings["skills"] = time.perf_counter() - t0
+
+        record["skills"] = [s.skill for s in skills]
+        record["levels"] = {s.skill: s.level for s in skills}
+        record["categories"] = {s.skill: s.category for s in skills}
+    except Exception as e:
+        record["error"] = str(e)
+    timings["total"] = time.perf_counter() - started
+    record["timings"] = timings
+    return record
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a list of values."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def print_summary(records: List[Dict], elapsed: float, skipped: int):
+    """Print throughput and per-stage time breakdown for this run."""
+    processed = len(records)
+    failed = sum(1 for r in records if r.get("error"))
+    total_bytes = sum(r.get("size", 0) for r in records)
+
+    print(f"\n{'='*60}")
+    print(f"Processed: {processed} files ({failed} failed), skipped from checkpoint: {skipped}")
+    print(f"Wall time: {elapsed:.2f}s")
+    if elapsed > 0:
+        print(f"Throughput: {processed / elapsed:.2f} files/s, {total_bytes / elapsed / 1e6:.2f} MB/s")
+
+    stages = ["extract", "skills", "total"]
+    busy = sum(r["timings"].get("total", 0.0) for r in records)
+    print(f"\n{'stage':<10}{'sum (s)':>10}{'share':>8}{'mean (ms)':>12}{'p50 (ms)':>10}{'p95 (ms)':>10}")
+    for stage in stages:
+        values = [r["timings"][stage] for r in records if stage in r["timings"]]
+        stage_sum = sum(values)
+        share = stage_sum / busy * 100 if busy else 0.0
+        mean = stage_sum / len(values) * 1000 if values else 0.0
+        print(
+            f"{stage:<10}{stage_sum:>10.2f}{share:>7.1f}%{mean:>12.1f}"
+            f"{percentile(values, 50) * 1000:>10.1f}{percentile(values, 95) * 1000:>10.1f}"
+        )
+    print(f"{'='*60}")
+
+
+def run(root: str, out_path: str, workers: int, offline: bool, retry_errors: bool, restart: bool) -> int:
+    """Ingest every resume under root, appending results to out_path."""
+    if restart and os.path.exists(out_path):
+        os.remove(out_path)
+    done = load_checkpoint(out_path, retry_errors=retry_errors)
+    trim_torn_tail(out_path)
+
+    pending = []
+    skipped = 0
+    for path in iter_resume_files(root):
+        key = file_key(root, path)
+        if key in done:
+            skipped += 1
+        else:
+            pending.append((path, key))
+
+    print(f"Found {len(pending) + skipped} resumes in {root}: {len(pending)} to process, {skipped} already done")
+    records: List[Dict] = []
+    started = time.perf_counter()
+
+    with open(out_path, "a", encoding="utf-8") as out, ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(offline,)
+    ) as pool:
+        queue = iter(pending)
+        in_flight = set()
+        # Keep a bounded window of submitted files so huge folders don't pile up futures
+        for path, key in queue:
+            in_flight.add(pool.submit(process_resume, path, key))
+            if len(in_flight) >= workers * 4:
+                break
+
+        while in_flight:
+            finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                record = future.result()
+                out.write(json.dumps(record) + "\n")
+                records.append(record)
+                status = "ERROR " + record["error"] if record.get("error") else f"{len(record['skills'])} skills"
+                print(f"[{len(records)}/{len(pending)}] {os.path.relpath(record['file'], root)}: {status}")
+                next_item = next(queue, None)
+                if next_item:
+                    in_flight.add(pool.submit(process_resume, *next_item))
+            # Flush after each batch so the checkpoint survives an interruption
+            out.flush()
+            os.fsync(out.fileno())
+
+    print_summary(records, time.perf_counter() - started, skipped)
+    return 1 if any(r.get("error") for r in records) else 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Bulk-ingest a directory of resumes into a JSONL file")
+    parser.add_argument("directory", help="Directory to walk for .pdf/.doc/.docx resumes")
+    parser.add_argument("--out", default="ingest_results.jsonl", help="JSONL results file (also the checkpoint)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Number of worker processes")
+    parser.add_argument("--offline", action="store_true", help="Skip Gemini and use keyword skill extraction")
+    parser.add_argument("--retry-errors", action="store_true", help="Reprocess files whose previous record has an error")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and start from scratch")
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.directory):
+        print(f"Error: {args.directory} is not a directory")
+        return 2
+
+    return run(
+        os.path.abspath(args.directory),
+        args.out,
+        max(1, args.workers),
+        args.offline,
+        args.retry_errors,
+        args.restart,
+    )
+
+
+if __name__ == "__main__":
+    sys.exit(main())
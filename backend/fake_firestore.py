@@ -0,0 +1,284 @@
+"""
+Fake Firestore
+In-process stand-in for the Firestore client with injectable latency and error rate
+
+Implements the part of the google-cloud-firestore API the backend uses:
+documents (get, set with merge, update with ArrayUnion/ArrayRemove/DELETE_FIELD
+on field paths, delete), batches, collection streams ordered by document id or
+a field with limit (start_after pages by document id), and snapshot listeners. Every call blocks
+for the configured latency, like the real client's round trip, and fails with
+the configured probability; the skills store then falls back to memory as it
+would on a Firestore outage. Transactions are not supported, so /items always
+uses that fallback.
+
+main.py uses it in place of Firebase when FIRESTORE_FAKE is set (see loadtest.py).
+"""
+import copy
+import os
+import random
+import threading
+import time
+from collections import Counter
+from typing import Callable, Dict, List, Optional
+
+from google.cloud.firestore_v1.field_path import FieldPath
+from google.cloud.firestore_v1.transforms import DELETE_FIELD, ArrayRemove, ArrayUnion
+
+DOCUMENT_ID = FieldPath.document_id()
+
+
+class FakeFirestoreError(Exception):
+    """An injected failure, worded like the real client's 503."""
+
+
+class _ChangeType:
+    def __init__(self, name: str):
+        self.name = name
+
+
+class _DocumentChange:
+    def __init__(self, kind: str, document: "FakeSnapshot"):
+        self.type = _ChangeType(kind)
+        self.document = document
+
+
+class FakeSnapshot:
+    def __init__(self, reference: "FakeDocumentRef", data: Optional[dict]):
+        self.reference = reference
+        self.id = reference.id
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self) -> Optional[dict]:
+        return copy.deepcopy(self._data)
+
+
+class FakeWatch:
+    def __init__(self, collection: "FakeCollection", callback: Callable):
+        self._collection = collection
+        self.callback = callback
+
+    def unsubscribe(self):
+        self._collection.client._unwatch(self._collection.name, self)
+
+
+class FakeDocumentRef:
+    def __init__(self, collection: "FakeCollection", document_id: str):
+        self.collection = collection
+        self.id = document_id
+
+    @property
+    def _client(self) -> "FakeFirestore":
+        return self.collection.client
+
+    def get(self, **kwargs) -> FakeSnapshot:
+        self._client._call("get")
+        return FakeSnapshot(self, self._client._read(self.collection.name, self.id))
+
+    def set(self, doc: dict, merge: bool = False):
+        self._client._call("set")
+        self._client._apply([("set", self, doc, merge)])
+
+    def update(self, fields: dict):
+        self._client._call("update")
+        self._client._apply([("update", self, fields, False)])
+
+    def delete(self):
+        self._client._call("delete")
+        self._client._apply([("delete", self, None, False)])
+
+
+class FakeQuery:
+    def __init__(self, collection: "FakeCollection", order: Optional[str] = None, count: Optional[int] = None, after=None):
+        self.collection = collection
+        self.order = order
+        self.count = count
+        self.after = after
+
+    def order_by(self, field) -> "FakeQuery":
+        return FakeQuery(self.collection, str(field), self.count, self.after)
+
+    def limit(self, count: int) -> "FakeQuery":
+        return FakeQuery(self.collection, self.order, count, self.after)
+
+    def start_after(self, cursor) -> "FakeQuery":
+        # {field: value} with a document reference for the document id, or a snapshot
+        value = next(iter(cursor.values())) if isinstance(cursor, dict) else cursor
+        return FakeQuery(self.collection, self.order, self.count, getattr(value, "id", value))
+
+    def _key(self, item):
+        document_id, data = item
+        return document_id if self.order in (None, DOCUMENT_ID) else (data.get(self.order), document_id)
+
+    def stream(self):
+        client = self.collection.client
+        client._call("query")
+        items = sorted(client._items(self.collection.name), key=self._key)
+        if self.after is not None:
+            # Cursors are only used when paging by document id
+            items = [item for item in items if item[0] > self.after]
+        if self.count is not None:
+            items = items[:self.count]
+        for document_id, data in items:
+            yield FakeSnapshot(self.collection.document(document_id), data)
+
+
+class FakeCollection(FakeQuery):
+    def __init__(self, client: "FakeFirestore", name: str):
+        super().__init__(self)
+        self.client = client
+        self.name = name
+
+    def document(self, document_id: str) -> FakeDocumentRef:
+        return FakeDocumentRef(self, document_id)
+
+    def on_snapshot(self, callback: Callable) -> FakeWatch:
+        """Deliver every document as ADDED now, then each change as it is written."""
+        watch = FakeWatch(self, callback)
+        snapshots = [FakeSnapshot(self.document(document_id), data) for document_id, data in sorted(self.client._items(self.name))]
+        callback(snapshots, [_DocumentChange("ADDED", snapshot) for snapshot in snapshots], time.time())
+        self.client._watch(self.name, watch)
+        return watch
+
+
+class FakeBatch:
+    def __init__(self, client: "FakeFirestore"):
+        self.client = client
+        self._writes: List[tuple] = []
+
+    def set(self, ref: FakeDocumentRef, doc: dict, merge: bool = False):
+        self._writes.append(("set", ref, doc, merge))
+
+    def update(self, ref: FakeDocumentRef, fields: dict):
+        self._writes.append(("update", ref, fields, False))
+
+    def delete(self, ref: FakeDocumentRef):
+        self._writes.append(("delete", ref, None, False))
+
+    def commit(self):
+        """All writes in one round trip, applied atomically or not at all."""
+        self.client._call("commit")
+        self.client._apply(self._writes)
+
+
+def _merge(target: dict, doc: dict):
+    for key, value in doc.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            _merge(target[key], value)
+        else:
+            target[key] = copy.deepcopy(value)
+
+
+def _apply_update(data: dict, fields: dict):
+    for path, value in fields.items():
+        parts = FieldPath.from_api_repr(path).parts
+        parent = data
+        for part in parts[:-1]:
+            parent = parent.setdefault(part, {})
+        name = parts[-1]
+        if value is DELETE_FIELD:
+            parent.pop(name, None)
+        elif isinstance(value, ArrayUnion):
+            current = parent.setdefault(name, [])
+            current.extend(copy.deepcopy(v) for v in value.values if v not in current)
+        elif isinstance(value, ArrayRemove):
+            parent[name] = [v for v in parent.get(name, []) if v not in value.values]
+        else:
+            parent[name] = copy.deepcopy(value)
+
+
+class FakeFirestore:
+    """The client: documents by collection, per-operation call counts in calls."""
+
+    def __init__(self, latency_ms: float = 0.0, error_rate: float = 0.0, seed: Optional[int] = None):
+        self.latency = latency_ms / 1000
+        self.error_rate = error_rate
+        self.calls: Counter = Counter()
+        self.errors: Counter = Counter()
+        self._random = random.Random(seed)
+        self._data: Dict[str, Dict[str, dict]] = {}
+        self._watches: Dict[str, List[FakeWatch]] = {}
+        self._lock = threading.Lock()
+
+    def collection(self, name: str) -> FakeCollection:
+        return FakeCollection(self, name)
+
+    def batch(self) -> FakeBatch:
+        return FakeBatch(self)
+
+    def transaction(self):
+        raise FakeFirestoreError("Transactions are not supported by the fake Firestore")
+
+    def _call(self, op: str):
+        with self._lock:
+            self.calls[op] += 1
+            fail = self.error_rate and self._random.random() < self.error_rate
+            if fail:
+                self.errors[op] += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if fail:
+            raise FakeFirestoreError(f"503 The service is currently unavailable (injected, {op})")
+
+    def _read(self, collection: str, document_id: str) -> Optional[dict]:
+        with self._lock:
+            data = self._data.get(collection, {}).get(document_id)
+            return copy.deepcopy(data)
+
+    def _items(self, collection: str) -> List[tuple]:
+        with self._lock:
+            return [(document_id, copy.deepcopy(data)) for document_id, data in self._data.get(collection, {}).items()]
+
+    def _apply(self, writes: List[tuple]):
+        changes = []
+        with self._lock:
+            # Validate first so a failing batch leaves nothing half written
+            for op, ref, _, _ in writes:
+                if op == "update" and ref.id not in self._data.get(ref.collection.name, {}):
+                    raise FakeFirestoreError(f"404 No document to update: {ref.collection.name}/{ref.id}")
+            for op, ref, doc, merge in writes:
+                documents = self._data.setdefault(ref.collection.name, {})
+                existed = ref.id in documents
+                if op == "delete":
+                    if documents.pop(ref.id, None) is not None:
+                        changes.append((ref, "REMOVED", None))
+                    continue
+                if op == "set" and not merge:
+                    documents[ref.id] = copy.deepcopy(doc)
+                elif op == "set":
+                    _merge(documents.setdefault(ref.id, {}), doc)
+                else:
+                    _apply_update(documents[ref.id], doc)
+                changes.append((ref, "MODIFIED" if existed else "ADDED", copy.deepcopy(documents[ref.id])))
+            watches = {name: list(watches) for name, watches in self._watches.items()}
+        for ref, kind, data in changes:
+            for watch in watches.get(ref.collection.name, []):
+                snapshot = FakeSnapshot(ref, data)
+                watch.callback([snapshot], [_DocumentChange(kind, snapshot)], time.time())
+
+    def _watch(self, collection: str, watch: FakeWatch):
+        with self._lock:
+            self._watches.setdefault(collection, []).append(watch)
+
+    def _unwatch(self, collection: str, watch: FakeWatch):
+        with self._lock:
+            if watch in self._watches.get(collection, []):
+                self._watches[collection].remove(watch)
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "calls": dict(self.calls),
+                "errors": dict(self.errors),
+                "documents": {name: len(documents) for name, documents in self._data.items()},
+            }
+
+
+def create_fake_firestore() -> FakeFirestore:
+    """Build the fake from FAKE_FIRESTORE_LATENCY_MS, FAKE_FIRESTORE_ERROR_RATE and FAKE_SEED."""
+    seed = os.getenv("FAKE_SEED")
+    return FakeFirestore(
+        latency_ms=float(os.getenv("FAKE_FIRESTORE_LATENCY_MS", "0")),
+        error_rate=float(os.getenv("FAKE_FIRESTORE_ERROR_RATE", "0")),
+        seed=int(seed) if seed else None,
+    )
@@ -0,0 +1,97 @@
+"""
+Fake Gemini
+In-process stand-in for google.generativeai with injectable latency and error rate
+
+GenerativeModel(...).generate_content(prompt) blocks for the configured latency,
+like the real SDK call, then answers with the whitelisted skills that appear in
+the prompt's input text, as the fenced JSON array the backend's prompt asks
+for. Injected failures raise like the SDK's 503s, so the circuit breaker and
+the keyword fallback run as they would against the real service.
+
+main.py uses it in place of google.generativeai when GEMINI_FAKE is set (see loadtest.py).
+"""
+import json
+import os
+import random
+import re
+import threading
+import time
+from typing import Optional
+
+
+class FakeGeminiError(Exception):
+    """An injected failure, worded like the SDK's ServiceUnavailable."""
+
+
+def _section(prompt: str, start: str, end: str) -> str:
+    begin = prompt.find(start)
+    if begin == -1:
+        return ""
+    begin += len(start)
+    finish = prompt.find(end, begin)
+    return prompt[begin:finish if finish != -1 else len(prompt)].strip()
+
+
+class _Response:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class _FakeModel:
+    def __init__(self, genai: "FakeGenAI", name: str):
+        self.genai = genai
+        self.name = name
+
+    def generate_content(self, prompt: str) -> _Response:
+        self.genai._call()
+        whitelist = [s.strip() for s in _section(prompt, "VALID SKILLS WHITELIST:", "EXAMPLES:").split(",") if s.strip()]
+        text = _section(prompt, "INPUT TEXT:", "OUTPUT FORMAT")
+        skills = [
+            {"skill": skill, "level": "Intermediate"}
+            for skill in whitelist
+            if re.search(rf"(?<![A-Za-z0-9]){re.escape(skill)}(?![A-Za-z0-9])", text, re.IGNORECASE)
+        ]
+        return _Response("```json\n" + json.dumps(skills) + "\n```")
+
+
+class FakeGenAI:
+    """Module-shaped fake: configure() and GenerativeModel(), with call and error counts."""
+
+    def __init__(self, latency_ms: float = 0.0, error_rate: float = 0.0, seed: Optional[int] = None):
+        self.latency = latency_ms / 1000
+        self.error_rate = error_rate
+        self.calls = 0
+        self.errors = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def configure(self, api_key: Optional[str] = None, **kwargs):
+        pass
+
+    def GenerativeModel(self, name: str) -> _FakeModel:
+        return _FakeModel(self, name)
+
+    def _call(self):
+        with self._lock:
+            self.calls += 1
+            fail = self.error_rate and self._random.random() < self.error_rate
+            if fail:
+                self.errors += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if fail:
+            raise FakeGeminiError("503 The model is overloaded. Please try again later. (injected)")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"calls": self.calls, "errors": self.errors}
+
+
+def create_fake_genai() -> FakeGenAI:
+    """Build the fake from FAKE_GEMINI_LATENCY_MS, FAKE_GEMINI_ERROR_RATE and FAKE_SEED."""
+    seed = os.getenv("FAKE_SEED")
+    return FakeGenAI(
+        latency_ms=float(os.getenv("FAKE_GEMINI_LATENCY_MS", "0")),
+        error_rate=float(os.getenv("FAKE_GEMINI_ERROR_RATE", "0")),
+        seed=int(seed) if seed else None,
+    )
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Fake LinkedIn
+Local stand-in for the LinkedIn OAuth and profile APIs with configurable latency and error rate
+
+Serves the token, userinfo, v2 /me, emailAddress and profilePicture endpoints
+used by /api/linkedin/callback. Point the backend at it with
+LINKEDIN_OAUTH_BASE and LINKEDIN_API_BASE.
+
+Usage:
+    python fake_linkedin.py --port 8765 --latency-ms 80
+    python fake_linkedin.py --port 8765 --latency-ms 80 --error-rate 0.05
+    python fake_linkedin.py --latency-ms 80 --no-userinfo --bench 20   # callback latency: sequential vs pooled vs cached
+"""
+import argparse
+import asyncio
+import base64
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from collections import Counter
+from typing import List, Optional
+
+import uvicorn
+from fastapi import FastAPI, Form, Request
+from fastapi.responses import JSONResponse, Response
+
+MEMBER_ID = "fake-id"
+USERINFO_ETAG = '"userinfo-v1"'
+
+
+def _id_token(sub: str) -> str:
+    """An unsigned JWT carrying the member id, shaped like LinkedIn's OpenID Connect id_token."""
+    encode = lambda part: base64.urlsafe_b64encode(json.dumps(part).encode()).rstrip(b"=").decode()
+    return f"{encode({'alg': 'none'})}.{encode({'sub': sub, 'iss': 'https://www.linkedin.com'})}."
+
+
+def create_app(latency_ms: float = 0.0, userinfo: bool = True, error_rate: float = 0.0, seed: Optional[int] = None) -> FastAPI:
+    """
+    A fake LinkedIn; userinfo=False answers /v2/userinfo with 401 to force the v2
+    fallback, and error_rate of requests get a 503 after the usual latency.
+    fake.state.calls counts requests per path, fake.state.errors the injected 503s.
+    """
+    fake = FastAPI()
+    fake.state.calls = Counter()
+    fake.state.errors = Counter()
+    delay = latency_ms / 1000
+    rng = random.Random(seed)
+
+    @fake.middleware("http")
+    async def count_calls(request: Request, call_next):
+        fake.state.calls[request.url.path] += 1
+        if error_rate and rng.random() < error_rate:
+            fake.state.errors[request.url.path] += 1
+            await asyncio.sleep(delay)
+            return JSONResponse({"message": "Service unavailable (injected)"}, status_code=503)
+        return await call_next(request)
+
+    @fake.post("/oauth/v2/accessToken")
+    async def access_token(code: str = Form(...)):
+        await asyncio.sleep(delay)
+        if code == "bad":
+            return JSONResponse({"error": "invalid_grant"}, status_code=400)
+        return {"access_token": f"token-{code}", "expires_in": 5184000, "id_token": _id_token(MEMBER_ID)}
+
+    @fake.get("/v2/userinfo")
+    async def userinfo_endpoint(request: Request):
+        await asyncio.sleep(delay)
+        if not userinfo:
+            return JSONResponse({"message": "Not enough permissions"}, status_code=401)
+        if request.headers.get("if-none-match") == USERINFO_ETAG:
+            return Response(status_code=304, headers={"ETag": USERINFO_ETAG})
+        return JSONResponse({
+            "sub": MEMBER_ID, "name": "Ada Lovelace", "given_name": "Ada", "family_name": "Lovelace",
+            "email": "ada@example.com", "picture": "https://media.example.com/ada.jpg",
+        }, headers={"ETag": USERINFO_ETAG})
+
+    @fake.get("/v2/me")
+    async def me(request: Request, projection: Optional[str] = None):
+        await asyncio.sleep(delay)
+        profile = {
+            "id": MEMBER_ID,
+            "firstName": {"localized": {"en_US": "Ada"}},
+            "lastName": {"localized": {"en_US": "Lovelace"}},
+        }
+        if projection and "profilePicture" in projection:
+            profile["profilePicture"] = {"displayImage~": {"elements": [
+                {
+                    "data": {"com.linkedin.digitalmedia.mediaartifact.StillImage": {"storageSize": {"width": width}}},
+                    "identifiers": [{"identifier": f"https://media.example.com/ada-{width}.jpg"}],
+                }
+                for width in (100, 400, 200)
+            ]}}
+        return profile
+
+    @fake.get("/v2/emailAddress")
+    async def email_address(request: Request):
+        await asyncio.sleep(delay)
+        return {"elements": [{"handle~": {"emailAddress": "ada@example.com"}}]}
+
+    return fake
+
+
+def _sequential_baseline(base: str, runs: int) -> List[float]:
+    """The pre-pooling call pattern: five blocking calls in a row, each on a new connection."""
+    import requests
+
+    api = f"{base}/v2"
+    times = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        token = requests.post(f"{base}/oauth/v2/accessToken", data={"code": "x"}).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        if requests.get(f"{api}/userinfo", headers=headers).status_code != 200:
+            requests.get(f"{api}/me", headers=headers)
+            requests.get(f"{api}/emailAddress?q=members&projection=(elements*(handle~))", headers=headers)
+            requests.get(f"{api}/me?projection=(id,firstName,lastName,profilePicture(displayImage~:playableStreams))", headers=headers)
+        times.append((time.perf_counter() - started) * 1000)
+    return times
+
+
+def _bench(args):
+    server = uvicorn.Server(uvicorn.Config(
+        create_app(args.latency_ms, not args.no_userinfo), host="127.0.0.1", port=args.port, log_level="warning"
+    ))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+
+    base = f"http://127.0.0.1:{args.port}"
+    os.environ.setdefault("LINKEDIN_CLIENT_ID", "fake-client")
+    os.environ.setdefault("LINKEDIN_CLIENT_SECRET", "fake-secret")
+    os.environ["LINKEDIN_OAUTH_BASE"] = base
+    os.environ["LINKEDIN_API_BASE"] = base
+    from fastapi.testclient import TestClient
+    import main
+
+    baseline = _sequential_baseline(base, args.bench)
+    timings = {}
+    with TestClient(main.app) as client:
+        # First pass with the profile always stale, then repeat connects served from the cache
+        for label, ttl in (("pooled callback, concurrent ", 0), ("repeat connect, cached     ", 3600)):
+            main.linkedin_profiles.ttl_seconds = ttl
+            timings[label] = []
+            for i in range(args.bench):
+                started = time.perf_counter()
+                response = client.get("/api/linkedin/callback", params={"code": f"c{i}"})
+                timings[label].append((time.perf_counter() - started) * 1000)
+                if "Connected Successfully" not in response.text:
+                    print(f"Callback failed: {response.text[:300]}", file=sys.stderr)
+                    return 1
+    print(f"latency {args.latency_ms:.0f}ms per call, userinfo {'off (v2 fallback)' if args.no_userinfo else 'on'}")
+    print(f"sequential, new connections  p50={statistics.median(baseline):.1f}ms")
+    for label, times in timings.items():
+        print(f"{label} p50={statistics.median(times):.1f}ms")
+    server.should_exit = True
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run a fake LinkedIn OAuth/profile API")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Delay added to every response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered 503")
+    parser.add_argument("--no-userinfo", action="store_true", help="Fail /v2/userinfo so the callback uses the v2 fallback")
+    parser.add_argument("--bench", type=int, metavar="RUNS", help="Time RUNS callbacks against the sequential call pattern")
+    args = parser.parse_args(argv)
+    if args.bench:
+        return _bench(args)
+    uvicorn.run(create_app(args.latency_ms, not args.no_userinfo, args.error_rate), host="127.0.0.1", port=args.port)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
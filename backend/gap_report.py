@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+"""
+Cohort gap report.
+
+Scores every user against every position and writes one row per
+(user, position) pair with coverage, level-weighted score and missing skill
+count, plus per-skill gap totals for the whole cohort.
+
+Users are encoded as a users x skills weight matrix and positions as a
+skills x positions indicator matrix over the skills the positions require.
+Blocks of users are multiplied against the positions matrix in a process
+pool (two BLAS matmuls per block), so the N x M comparisons never go through
+HTTP or per-pair Python code.
+
+Usage:
+    python gap_report.py --out cohort_gaps.csv
+    python gap_report.py --out top5.ndjson --top 5 --missing-skills --gaps-out gaps.csv
+    python gap_report.py --users-file users.jsonl --positions-file positions.json --out gaps.csv
+    python gap_report.py --synthetic 100000 5000 --out /dev/null
+"""
+
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from position_matcher import LEVEL_WEIGHTS, load_positions_file, synthetic_positions
+from skill_index import level_rank, skill_key, synthetic_users
+
+CSV_HEADER = ["user_id", "position_id", "coverage", "score", "missing_count"]
+
+
+class PositionMatrix:
+    """Positions as a dense skills x positions 0/1 matrix over the skills they require."""
+
+    def __init__(self, positions: List[Tuple[str, dict]]):
+        self.skill_ids: Dict[str, int] = {}
+        self.skill_names: List[str] = []
+        self.position_ids: List[str] = []
+        required: List[List[int]] = []
+        for position_id, doc in positions:
+            ids = list(dict.fromkeys(
+                self._skill_id(s) for s in doc.get("requiredSkills") or [] if s and s.strip()
+            ))
+            if ids:  # A position without required skills has no coverage to report
+                self.position_ids.append(str(position_id))
+                required.append(ids)
+
+        self.required = required
+        self.matrix = np.zeros((len(self.skill_names), len(required)), dtype=np.float32)
+        for column, ids in enumerate(required):
+            self.matrix[ids, column] = 1.0
+        self.counts = self.matrix.sum(axis=0)
+        self.positions_requiring = self.matrix.sum(axis=1).astype(np.int64)
+
+    def _skill_id(self, skill: str) -> int:
+        key = skill_key(skill)
+        if key not in self.skill_ids:
+            self.skill_ids[key] = len(self.skill_names)
+            self.skill_names.append(skill.strip())
+        return self.skill_ids[key]
+
+    def encode_users(self, users: List[Tuple[str, List[dict]]]) -> np.ndarray:
+        """users x skills matrix of level weights (0 where the user lacks the skill)."""
+        weights = np.zeros((len(users), len(self.skill_names)), dtype=np.float32)
+        for row, (_, skills) in enumerate(users):
+            for s in skills:
+                column = self.skill_ids.get(skill_key(s.get("skill", "")))
+                if column is not None:
+                    weights[row, column] = max(weights[row, column], LEVEL_WEIGHTS[level_rank(s.get("level"))])
+        return weights
+
+
+VALUE_STEPS = 10000  # Coverage and score are reported to 4 decimals
+VALUE_STRINGS = [str(round(v / VALUE_STEPS, 4)) for v in range(VALUE_STEPS + 1)]
+
+_positions: Optional[PositionMatrix] = None
+_options: Dict = {}
+_position_fields: List[str] = []
+
+
+def _csv_field(value: str) -> str:
+    """Quote a CSV field only when it needs it."""
+    if any(c in value for c in ',"\n\r'):
+        return '"' + value.replace('"', '""') + '"'
+    return value
+
+
+def _init_worker(positions: PositionMatrix, options: Dict):
+    """Keep the positions matrix and formatted position ids in each worker so blocks only carry users."""
+    global _positions, _options, _position_fields
+    _positions, _options = positions, options
+    encode = _csv_field if options["format"] == "csv" else json.dumps
+    _position_fields = [encode(position_id) for position_id in positions.position_ids]
+
+
+def score_block(users: List[Tuple[str, List[dict]]]) -> Dict:
+    """Score one block of users against all positions and format its output rows."""
+    positions, options = _positions, _options
+    weights = positions.encode_users(users)
+    has = (weights > 0).astype(np.float32)
+
+    # Blocked product: (users x skills) @ (skills x positions)
+    matched = has @ positions.matrix
+    coverage = matched / positions.counts
+    score = (weights @ positions.matrix) / positions.counts
+
+    # Pairs to report: every pair, or each user's top K, above the coverage floor
+    selected = np.ones_like(coverage, dtype=bool)
+    top = options["top"]
+    if top and top < coverage.shape[1]:
+        ranking = score + coverage * 1e-3
+        best = np.argpartition(-ranking, top - 1, axis=1)[:, :top]
+        selected = np.zeros_like(selected)
+        np.put_along_axis(selected, best, True, axis=1)
+    if options["min_coverage"] > 0:
+        selected &= coverage >= options["min_coverage"]
+
+    filtered = top or options["min_coverage"] > 0
+    reported_gaps = None
+    if filtered:
+        # For each skill, count reported pairs that require it while the user lacks it
+        reported_gaps = ((selected.astype(np.float32) @ positions.matrix.T) * (1 - has)).sum(axis=0)
+
+    missing = (positions.counts - matched).astype(np.int64)
+    coverage_keys = np.rint(coverage * VALUE_STEPS).astype(np.int32)
+    score_keys = np.rint(score * VALUE_STEPS).astype(np.int32)
+    csv_out = options["format"] == "csv"
+    position_fields = _position_fields
+    rows = 0
+    buffer = io.StringIO()
+    for i, (user_id, _) in enumerate(users):
+        columns = np.flatnonzero(selected[i])
+        if top:
+            columns = columns[np.argsort(-(score[i, columns] + coverage[i, columns] * 1e-3), kind="stable")]
+        rows += len(columns)
+        cov_row = coverage_keys[i, columns].tolist()
+        score_row = score_keys[i, columns].tolist()
+        missing_row = missing[i, columns].tolist()
+        columns = columns.tolist()
+
+        # Rows are assembled from pre-formatted pieces; formatting floats per pair
+        # would cost more than the matrix product itself
+        if options["missing_skills"]:
+            names = [
+                [positions.skill_names[s] for s in positions.required[j] if not has[i, s]]
+                for j in columns
+            ]
+            if csv_out:
+                tails = [_csv_field(";".join(n)) for n in names]
+                template = "{},{},{},{},{},{}\n"
+            else:
+                tails = [json.dumps(n) for n in names]
+                template = '{{"user_id": {}, "position_id": {}, "coverage": {}, "score": {}, "missing_count": {}, "missing_skills": {}}}\n'
+            user_field = _csv_field(user_id) if csv_out else json.dumps(user_id)
+            buffer.write("".join([
+                template.format(user_field, position_fields[j], VALUE_STRINGS[c], VALUE_STRINGS[sc], m, t)
+                for j, c, sc, m, t in zip(columns, cov_row, score_row, missing_row, tails)
+            ]))
+        elif csv_out:
+            prefix = _csv_field(user_id) + ","
+            buffer.write("".join([
+                f"{prefix}{position_fields[j]},{VALUE_STRINGS[c]},{VALUE_STRINGS[sc]},{m}\n"
+                for j, c, sc, m in zip(columns, cov_row, score_row, missing_row)
+            ]))
+        else:
+            prefix = '{"user_id": ' + json.dumps(user_id) + ', "position_id": '
+            buffer.write("".join([
+                f'{prefix}{position_fields[j]}, "coverage": {VALUE_STRINGS[c]}, '
+                f'"score": {VALUE_STRINGS[sc]}, "missing_count": {m}}}\n'
+                for j, c, sc, m in zip(columns, cov_row, score_row, missing_row)
+            ]))
+
+    return {
+        "text": buffer.getvalue(),
+        "users": len(users),
+        "rows": rows,
+        "users_missing": (1 - has).sum(axis=0).astype(np.int64),
+        "reported_gaps": reported_gaps,
+    }
+
+
+def load_users(users_file: Optional[str]) -> List[Tuple[str, List[dict]]]:
+    """Users from a JSONL file ({user_id, skills}) or from the app's skills store."""
+    if users_file:
+        users = []
+        with open(users_file, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    users.append((record["user_id"], record.get("skills", [])))
+        return users
+
+    import main as app_main
+    return [(user_id, doc.get("skills", [])) for user_id, doc in app_main.skills_store.iter_all()]
+
+
+def load_positions(positions_file: Optional[str]) -> List[Tuple[str, dict]]:
+    """Positions from a JSON file or the Firestore positions collection."""
+    if positions_file:
+        return load_positions_file(positions_file)
+
+    import main as app_main
+    client = app_main.get_firestore()
+    if client is None:
+        raise RuntimeError("Firestore is not configured; pass --positions-file")
+    return [(doc.id, doc.to_dict() or {}) for doc in client.collection("positions").stream()]
+
+
+def iter_blocks(users: List[Tuple[str, List[dict]]], block_size: int) -> Iterator[List[Tuple[str, List[dict]]]]:
+    for start in range(0, len(users), block_size):
+        yield users[start:start + block_size]
+
+
+def write_gap_totals(path: str, positions: PositionMatrix, users_missing: np.ndarray,
+                     reported_gaps: Optional[np.ndarray]):
+    """One row per skill: how many positions need it, users lacking it and pair gap counts."""
+    pair_gaps = positions.positions_requiring * users_missing
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        header = ["skill", "positions_requiring", "users_missing", "pair_gaps"]
+        if reported_gaps is not None:
+            header.append("reported_gaps")
+        writer.writerow(header)
+        for s in np.argsort(-pair_gaps, kind="stable"):
+            row = [positions.skill_names[s], int(positions.positions_requiring[s]),
+                   int(users_missing[s]), int(pair_gaps[s])]
+            if reported_gaps is not None:
+                row.append(int(reported_gaps[s]))
+            writer.writerow(row)
+
+
+def run(args) -> int:
+    started = time.perf_counter()
+    if args.synthetic:
+        user_count, position_count = args.synthetic
+        users = [(user_id, doc["skills"]) for user_id, doc in synthetic_users(user_count, 300, seed=7)]
+        positions = PositionMatrix(list(synthetic_positions(position_count, 300, seed=11)))
+    else:
+        users = load_users(args.users_file)
+        positions = PositionMatrix(load_positions(args.positions_file))
+    load_seconds = time.perf_counter() - started
+    print(f"Loaded {len(users)} users and {len(positions.position_ids)} positions "
+          f"({len(positions.skill_names)} required skills) in {load_seconds:.1f}s", file=sys.stderr)
+    if not users or not positions.position_ids:
+        print("Nothing to do", file=sys.stderr)
+        return 1
+
+    fmt = args.format or ("ndjson" if args.out.endswith((".ndjson", ".jsonl")) else "csv")
+    options = {"top": args.top, "min_coverage": args.min_coverage, "missing_skills": args.missing_skills, "format": fmt}
+    users_missing = np.zeros(len(positions.skill_names), dtype=np.int64)
+    reported_gaps = None
+    done_users = rows = written = 0
+    compute_started = time.perf_counter()
+
+    with open(args.out, "w", encoding="utf-8", newline="") as out, ProcessPoolExecutor(
+        max_workers=args.workers, initializer=_init_worker, initargs=(positions, options)
+    ) as pool:
+        if fmt == "csv":
+            out.write(",".join(CSV_HEADER + (["missing_skills"] if args.missing_skills else [])) + "\n")
+        blocks = iter_blocks(users, args.block_size)
+        in_flight = set()
+        # Bounded window of blocks so finished output doesn't pile up in memory
+        for block in blocks:
+            in_flight.add(pool.submit(score_block, block))
+            if len(in_flight) >= args.workers * 2:
+                break
+
+        while in_flight:
+            finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                result = future.result()
+                out.write(result["text"])
+                written += len(result["text"])
+                rows += result["rows"]
+                done_users += result["users"]
+                users_missing += result["users_missing"]
+                if result["reported_gaps"] is not None:
+                    reported_gaps = result["reported_gaps"] if reported_gaps is None else reported_gaps + result["reported_gaps"]
+                next_block = next(blocks, None)
+                if next_block:
+                    in_flight.add(pool.submit(score_block, next_block))
+            print(f"[{done_users}/{len(users)}] users scored, {rows} rows written", file=sys.stderr)
+
+    elapsed = time.perf_counter() - compute_started
+    pairs = len(users) * len(positions.position_ids)
+    pair_gaps = positions.positions_requiring * users_missing
+    print(f"\n{'='*60}", file=sys.stderr)
+    print(f"Scored {pairs} user x position pairs in {elapsed:.1f}s ({pairs / elapsed / 1e6:.1f}M pairs/s)", file=sys.stderr)
+    print(f"Wrote {rows} rows, {written / 1e6:.1f} MB to {args.out} ({rows / elapsed:.0f} rows/s)", file=sys.stderr)
+    print("\nMost common gaps (skill: user x position pairs missing it):", file=sys.stderr)
+    for s in np.argsort(-pair_gaps, kind="stable")[:15]:
+        line = f"  {positions.skill_names[s]}: {int(pair_gaps[s])} ({int(users_missing[s])} users lack it)"
+        if reported_gaps is not None:
+            line += f", {int(reported_gaps[s])} in reported pairs"
+        print(line, file=sys.stderr)
+    print(f"{'='*60}", file=sys.stderr)
+
+    if args.gaps_out:
+        write_gap_totals(args.gaps_out, positions, users_missing, reported_gaps)
+    return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Score every user against every position and report skill gaps")
+    parser.add_argument("--out", default="gap_report.csv", help="Output file (.csv or .ndjson)")
+    parser.add_argument("--format", choices=["csv", "ndjson"], help="Output format (default: from --out extension)")
+    parser.add_argument("--users-file", help="JSONL of {user_id, skills} instead of the skills store")
+    parser.add_argument("--positions-file", help="JSON positions file instead of Firestore")
+    parser.add_argument("--top", type=int, default=0, help="Only report each user's top K positions (0 = all)")
+    parser.add_argument("--min-coverage", type=float, default=0.0, help="Only report pairs with at least this coverage")
+    parser.add_argument("--missing-skills", action="store_true", help="Include the names of the missing skills")
+    parser.add_argument("--gaps-out", help="Write per-skill gap totals to this CSV file")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Number of worker processes")
+    parser.add_argument("--block-size", type=int, default=1024, help="Users per matrix block")
+    parser.add_argument("--synthetic", type=int, nargs=2, metavar=("USERS", "POSITIONS"),
+                        help="Benchmark on synthetic users and positions")
+    args = parser.parse_args(argv)
+
+    if args.top < 0 or not 0.0 <= args.min_coverage <= 1.0:
+        print("Error: --top must be >= 0 and --min-coverage between 0 and 1")
+        return 2
+    args.workers = max(1, args.workers)
+    args.block_size = max(1, args.block_size)
+    return run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
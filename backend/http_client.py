@@ -0,0 +1,113 @@
+"""
+HTTP Client
+Shared pooled async HTTP client for outbound API calls (LinkedIn OAuth and profile)
+"""
+import asyncio
+import importlib.util
+import os
+import random
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    import httpx
+
+# httpx (and certifi with it) is imported when the first client is created, not at API
+# startup; it only negotiates HTTP/2 when h2 is installed
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+RETRY_STATUSES = (429, 502, 503, 504)
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+class PooledHTTPClient:
+    """
+    One keep-alive connection pool shared by every request handler, using
+    HTTP/2 where the server and installed packages allow it.
+
+    Connection failures are retried for every method since the request never
+    reached the server; 429/5xx responses and timeouts are only retried for
+    idempotent methods. Retries back off exponentially with jitter.
+    """
+
+    def __init__(
+        self,
+        timeout: float = 10.0,
+        retries: int = 2,
+        backoff: float = 0.2,
+        max_connections: int = 100,
+        max_keepalive: int = 20,
+    ):
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_connections = max_connections
+        self.max_keepalive = max_keepalive
+        self._client: Optional["httpx.AsyncClient"] = None
+
+    def _get_client(self) -> "httpx.AsyncClient":
+        # Created on first use so the pool belongs to the running event loop
+        if self._client is None or self._client.is_closed:
+            import httpx
+
+            self._client = httpx.AsyncClient(
+                http2=HTTP2_AVAILABLE,
+                limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_keepalive),
+                timeout=self.timeout,
+            )
+        return self._client
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        timeout: Optional[float] = None,
+        retries: Optional[int] = None,
+        **kwargs,
+    ) -> "httpx.Response":
+        """Send a request through the shared pool; timeout and retries override the defaults per call."""
+        import httpx
+
+        method = method.upper()
+        retries = self.retries if retries is None else retries
+        idempotent = method in IDEMPOTENT_METHODS
+        attempt = 0
+        while True:
+            try:
+                response = await self._get_client().request(
+                    method, url, timeout=timeout if timeout is not None else self.timeout, **kwargs
+                )
+                if not (idempotent and response.status_code in RETRY_STATUSES and attempt < retries):
+                    return response
+                await response.aclose()
+            except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout):
+                if attempt >= retries:
+                    raise
+            except httpx.TransportError:
+                if not idempotent or attempt >= retries:
+                    raise
+            attempt += 1
+            await asyncio.sleep(self.backoff * (2 ** (attempt - 1)) * (0.5 + random.random()))
+
+    async def get(self, url: str, **kwargs) -> "httpx.Response":
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> "httpx.Response":
+        return await self.request("POST", url, **kwargs)
+
+    def after_fork(self):
+        """In a forked child: the parent's pool belongs to another process and event loop."""
+        self._client = None
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+def create_http_client() -> PooledHTTPClient:
+    """Build the shared client; HTTP_TIMEOUT_SECONDS, HTTP_RETRIES and HTTP_MAX_CONNECTIONS tune it."""
+    return PooledHTTPClient(
+        timeout=float(os.getenv("HTTP_TIMEOUT_SECONDS", "10")),
+        retries=int(os.getenv("HTTP_RETRIES", "2")),
+        max_connections=int(os.getenv("HTTP_MAX_CONNECTIONS", "100")),
+    )
@@ -0,0 +1,93 @@
+"""
+LinkedIn Profiles
+TTL cache of normalized LinkedIn profile data keyed by member id, kept in the skills store
+
+The OAuth token response carries an OpenID Connect id_token whose `sub` claim
+is the member id, so a reconnect can find its cached profile before making any
+profile call. Fresh entries skip the profile round trips entirely; stale ones
+are refreshed with a conditional userinfo request (If-None-Match on the stored
+ETag) and only re-parsed when LinkedIn reports a change.
+"""
+import base64
+import json
+import os
+import time
+from typing import Optional
+
+PROFILE_FIELDS = ("linkedin_id", "name", "first_name", "last_name", "email", "profile_picture")
+
+
+def member_id_from_token(token_json: dict) -> Optional[str]:
+    """
+    The `sub` claim of the id_token in a token response, or None. The signature
+    isn't checked: the token comes straight from LinkedIn's token endpoint and
+    is only used as a cache key, never to authenticate anyone.
+    """
+    id_token = token_json.get("id_token")
+    if not id_token:
+        return None
+    try:
+        payload = id_token.split(".")[1]
+        claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+        return str(claims["sub"]) or None
+    except (IndexError, KeyError, TypeError, ValueError):
+        return None
+
+
+def largest_profile_picture(picture_data: dict) -> str:
+    """URL of the widest image in a v2 profilePicture(displayImage~) projection, or ''."""
+    elements = picture_data.get("profilePicture", {}).get("displayImage~", {}).get("elements", [])
+    if not elements:
+        return ""
+    largest_image = max(elements, key=lambda x: x.get("data", {}).get("com.linkedin.digitalmedia.mediaartifact.StillImage", {}).get("storageSize", {}).get("width", 0))
+    return largest_image.get("identifiers", [{}])[0].get("identifier", "")
+
+
+class LinkedInProfileCache:
+    """Normalized profiles in the skills store with a freshness TTL; stale entries stay readable."""
+
+    def __init__(self, store, ttl_seconds: float = 86400):
+        self.store = store
+        self.ttl_seconds = ttl_seconds
+        self._stats = {"hits": 0, "stale": 0, "misses": 0, "not_modified": 0}
+
+    def get(self, member_id: str) -> Optional[dict]:
+        """Cached profile regardless of age, e.g. for backend jobs without a live token."""
+        return self.store.get_linkedin_profile(member_id)
+
+    def lookup(self, member_id: Optional[str]) -> Optional[dict]:
+        """Cached profile for a connect, counting it as a fresh hit, a stale hit or a miss."""
+        cached = self.get(member_id) if member_id else None
+        if cached is None:
+            self._stats["misses"] += 1
+        elif self.is_fresh(cached):
+            self._stats["hits"] += 1
+        else:
+            self._stats["stale"] += 1
+        return cached
+
+    def is_fresh(self, profile: dict) -> bool:
+        return time.time() - profile.get("fetched_at", 0) < self.ttl_seconds
+
+    def save(self, profile: dict, etag: Optional[str] = None) -> dict:
+        """Store a freshly fetched profile and return the cached document."""
+        doc = {field: profile.get(field, "") for field in PROFILE_FIELDS}
+        doc["etag"] = etag
+        doc["fetched_at"] = time.time()
+        self.store.save_linkedin_profile(doc["linkedin_id"], doc)
+        return doc
+
+    def mark_not_modified(self, cached: dict) -> dict:
+        """LinkedIn confirmed the cached profile is current; restart its TTL."""
+        self._stats["not_modified"] += 1
+        doc = {**cached, "fetched_at": time.time()}
+        self.store.save_linkedin_profile(doc["linkedin_id"], doc)
+        return doc
+
+    def stats(self) -> dict:
+        return {**self._stats, "ttl_seconds": self.ttl_seconds}
+
+
+def create_linkedin_profile_cache(store) -> LinkedInProfileCache:
+    """Build the profile cache; LINKEDIN_PROFILE_TTL_SECONDS sets how long a profile is fresh."""
+    return LinkedInProfileCache(store, ttl_seconds=float(os.getenv("LINKEDIN_PROFILE_TTL_SECONDS", "86400")))
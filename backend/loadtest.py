@@ -0,0 +1,503 @@
+#!/usr/bin/env python3
+"""
+Load Test
+Drive the real app through recorded user scenarios, with local fakes for Gemini, Firestore and LinkedIn
+
+Starts serve.py on a free port with the in-process fake Firestore and fake
+Gemini switched on (FIRESTORE_FAKE, GEMINI_FAKE) and LinkedIn pointed at a
+fake_linkedin.py server, each with the latency and error rate given on the
+command line, then replays these scenarios (the frontend's request sequences):
+
+    resume_upload       POST /api/resumes (generated PDF), then POST /api/skills/process on its text
+    recording_upload    POST /api/recordings (generated WAV; transcription needs ffmpeg and the Vosk model)
+    skill_processing    POST /api/skills/process
+    skills_save_get     POST /api/skills, then GET /api/skills/{user_id}
+    linkedin_connect    GET /api/linkedin/callback
+
+With --rate, scenarios arrive open loop as a seeded Poisson process and their
+latency is measured from the scheduled arrival, so time spent queueing behind a
+saturated server shows in the percentiles instead of slowing the load down.
+Without it, --concurrency virtual users run scenarios back to back.
+
+The report has throughput, errors and latency percentiles per endpoint and per
+scenario, and the server's admission stats, readiness and selected metrics.
+
+Usage:
+    python loadtest.py --duration 30 --concurrency 16
+    python loadtest.py --rate 20 --duration 60 --mix skills_save_get=6,skill_processing=3,resume_upload=1 \\
+        --gemini-latency-ms 900 --gemini-error-rate 0.05 --firestore-latency-ms 25 --report load.json
+    python loadtest.py --url http://localhost:8000 --duration 30    # a server started separately
+"""
+import argparse
+import asyncio
+import bisect
+import json
+import math
+import os
+import random
+import signal
+import socket
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import wave
+from collections import Counter, defaultdict
+from io import BytesIO
+from typing import Callable, Dict, List, Optional
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVER_READY_TIMEOUT = 180.0
+PERCENTILES = (50, 90, 95, 99)
+# /metrics series copied into the report
+REPORT_METRICS = (
+    "gemini_request_duration_seconds_count",
+    "gemini_fallbacks_total",
+    "admission_rejections_total",
+    "admission_wait_seconds_count",
+    "skills_store_operation_duration_seconds_count",
+    "cache_lookups_total",
+)
+
+RESUME_SKILLS = [
+    "Python", "JavaScript", "TypeScript", "Java", "Go", "React", "Node.js", "Django", "FastAPI",
+    "Docker", "Kubernetes", "AWS", "PostgreSQL", "Redis", "GraphQL", "Git", "Linux", "Terraform",
+    "Agile", "Communication", "Team Leadership", "Problem Solving",
+]
+LEVELS = ("Beginner", "Intermediate", "Advanced", "Expert")
+# upload_recording answers 200 with these when transcription fails
+TRANSCRIPTION_FAILURES = ("Transcription failed", "Error transcribing audio")
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def resume_text(rng: random.Random) -> str:
+    skills = rng.sample(RESUME_SKILLS, rng.randint(5, 10))
+    lines = [f"Candidate {rng.randint(1000, 9999)}", "Software Engineer", "", "Experience"]
+    for skill in skills:
+        lines.append(f"{rng.randint(1, 9)} years of experience with {skill} building production systems.")
+    lines += ["", "Summary", "Delivered services end to end with a focus on reliability and clear communication."]
+    return "\n".join(lines)
+
+
+def resume_pdf(text: str) -> bytes:
+    """A one-page PDF with the text in Helvetica, small enough to build per request."""
+    def escape(line: str) -> str:
+        return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+    content = "BT /F1 11 Tf 14 TL 50 770 Td " + " ".join(f"({escape(line)}) Tj T*" for line in text.splitlines()) + " ET"
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        "<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources << /Font << /F1 4 0 R >> >> /Contents 5 0 R >>",
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+        f"<< /Length {len(content)} >>\nstream\n{content}\nendstream",
+    ]
+    out = BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(out.tell())
+        out.write(f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1"))
+    xref = out.tell()
+    out.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode())
+    for offset in offsets:
+        out.write(f"{offset:010d} 00000 n \n".encode())
+    out.write(f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode())
+    return out.getvalue()
+
+
+def recording_wav(seconds: float, rate: int = 16000) -> bytes:
+    """16kHz mono 16-bit audio: a quiet 440Hz tone, the shape Vosk gets after ffmpeg."""
+    out = BytesIO()
+    with wave.open(out, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(b"".join(
+            struct.pack("<h", int(3000 * math.sin(2 * math.pi * 440 * i / rate))) for i in range(int(seconds * rate))
+        ))
+    return out.getvalue()
+
+
+class Recorder:
+    """Latencies and outcomes per endpoint and per scenario."""
+
+    def __init__(self):
+        self.latencies: Dict[str, Dict[str, List[float]]] = {"endpoints": defaultdict(list), "scenarios": defaultdict(list)}
+        self.errors: Dict[str, Counter] = {"endpoints": Counter(), "scenarios": Counter()}
+        self.statuses: Dict[str, Counter] = defaultdict(Counter)
+        self.dropped = 0
+
+    def record(self, kind: str, name: str, seconds: float, ok: bool):
+        self.latencies[kind][name].append(seconds * 1000)
+        if not ok:
+            self.errors[kind][name] += 1
+
+    async def request(
+        self,
+        client: httpx.AsyncClient,
+        endpoint: str,
+        url: str,
+        ok: Optional[Callable[[httpx.Response], bool]] = None,
+        **kwargs,
+    ) -> Optional[httpx.Response]:
+        """Send one request labelled endpoint ("METHOD /route/template"); None when it never got a response."""
+        method = endpoint.split(" ", 1)[0]
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.HTTPError as e:
+            self.statuses[endpoint][type(e).__name__] += 1
+            self.record("endpoints", endpoint, time.perf_counter() - started, False)
+            return None
+        self.statuses[endpoint][str(response.status_code)] += 1
+        success = response.status_code < 400 and (ok is None or ok(response))
+        self.record("endpoints", endpoint, time.perf_counter() - started, success)
+        return response if success else None
+
+    def summary(self, kind: str, elapsed: float) -> Dict[str, dict]:
+        summary = {}
+        for name, values in sorted(self.latencies[kind].items()):
+            values = sorted(values)
+            entry = {
+                "count": len(values),
+                "errors": self.errors[kind][name],
+                "error_rate": round(self.errors[kind][name] / len(values), 4),
+                "throughput_per_s": round(len(values) / elapsed, 2),
+                "latency_ms": {
+                    "min": round(values[0], 2),
+                    "mean": round(sum(values) / len(values), 2),
+                    **{f"p{p}": round(percentile(values, p), 2) for p in PERCENTILES},
+                    "max": round(values[-1], 2),
+                },
+            }
+            if kind == "endpoints":
+                entry["statuses"] = dict(self.statuses[name])
+            summary[name] = entry
+        return summary
+
+
+class Scenarios:
+    """The recorded scenarios; each is one user's sequence of requests."""
+
+    def __init__(self, recorder: Recorder, users: int, audio_seconds: float, seed: int):
+        self.recorder = recorder
+        self.users = users
+        self.rng = random.Random(seed)
+        self.audio = recording_wav(audio_seconds)
+        self.callbacks = 0
+
+    def user(self) -> str:
+        return f"load-user-{self.rng.randrange(self.users)}"
+
+    async def resume_upload(self, client: httpx.AsyncClient):
+        user = self.user()
+        pdf = resume_pdf(resume_text(self.rng))
+        response = await self.recorder.request(
+            client, "POST /api/resumes", "/api/resumes",
+            files={"resume": ("resume.pdf", pdf, "application/pdf")}, data={"user_id": user},
+            headers={"X-User-Id": user},
+        )
+        if response is None:
+            return False
+        text = response.json().get("text", "")
+        return await self.recorder.request(
+            client, "POST /api/skills/process", "/api/skills/process", json={"text": text, "user_id": user},
+        ) is not None
+
+    async def recording_upload(self, client: httpx.AsyncClient):
+        user = self.user()
+        return await self.recorder.request(
+            client, "POST /api/recordings", "/api/recordings",
+            files={"audio": ("recording.webm", self.audio, "audio/wav")}, headers={"X-User-Id": user},
+            ok=lambda r: not r.json().get("transcription", "").startswith(TRANSCRIPTION_FAILURES),
+        ) is not None
+
+    async def skill_processing(self, client: httpx.AsyncClient):
+        return await self.recorder.request(
+            client, "POST /api/skills/process", "/api/skills/process",
+            json={"text": resume_text(self.rng), "user_id": self.user()},
+        ) is not None
+
+    async def skills_save_get(self, client: httpx.AsyncClient):
+        user = self.user()
+        skills = [{"skill": skill, "level": self.rng.choice(LEVELS)} for skill in self.rng.sample(RESUME_SKILLS, 8)]
+        saved = await self.recorder.request(
+            client, "POST /api/skills", "/api/skills", json={"user_id": user, "skills": skills},
+        )
+        if saved is None:
+            return False
+        return await self.recorder.request(client, "GET /api/skills/{user_id}", f"/api/skills/{user}") is not None
+
+    async def linkedin_connect(self, client: httpx.AsyncClient):
+        self.callbacks += 1
+        return await self.recorder.request(
+            client, "GET /api/linkedin/callback", "/api/linkedin/callback", params={"code": f"load-{self.callbacks}"},
+            ok=lambda r: "Connected Successfully" in r.text,
+        ) is not None
+
+
+SCENARIO_NAMES = ("resume_upload", "recording_upload", "skill_processing", "skills_save_get", "linkedin_connect")
+DEFAULT_MIX = "skills_save_get=5,skill_processing=3,resume_upload=1,linkedin_connect=1"
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in SCENARIO_NAMES:
+            raise ValueError(f"Unknown scenario '{name}'. Use {', '.join(SCENARIO_NAMES)}.")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+async def run_load(base_url: str, args, recorder: Recorder) -> float:
+    """Run the load for args.duration seconds; returns the elapsed time including the drain."""
+    scenarios = Scenarios(recorder, args.users, args.audio_seconds, args.seed)
+    weights = parse_mix(args.mix)
+    names, cumulative = list(weights), []
+    total = 0.0
+    for name in names:
+        total += weights[name]
+        cumulative.append(total)
+    pick_rng = random.Random(args.seed + 1)
+
+    def pick() -> str:
+        point = pick_rng.random() * total
+        return names[bisect.bisect_right(cumulative, point)]
+
+    async def run_scenario(client, name: str, started: float):
+        try:
+            ok = await getattr(scenarios, name)(client)
+        except Exception as e:
+            print(f"Warning: scenario {name} failed: {e}", file=sys.stderr)
+            ok = False
+        recorder.record("scenarios", name, time.perf_counter() - started, ok)
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        started = time.perf_counter()
+        deadline = started + args.duration
+        if args.rate:
+            # Open loop: Poisson arrivals; at most --concurrency scenarios in flight, the rest are dropped
+            arrival_rng = random.Random(args.seed + 2)
+            in_flight = set()
+            arrival = started
+            while True:
+                arrival += arrival_rng.expovariate(args.rate)
+                if arrival >= deadline:
+                    break
+                await asyncio.sleep(max(0.0, arrival - time.perf_counter()))
+                if len(in_flight) >= args.concurrency:
+                    recorder.dropped += 1
+                    continue
+                task = asyncio.create_task(run_scenario(client, pick(), arrival))
+                in_flight.add(task)
+                task.add_done_callback(in_flight.discard)
+            if in_flight:
+                await asyncio.wait(in_flight)
+        else:
+            async def virtual_user():
+                while time.perf_counter() < deadline:
+                    await run_scenario(client, pick(), time.perf_counter())
+
+            await asyncio.gather(*(virtual_user() for _ in range(args.concurrency)))
+        return time.perf_counter() - started
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_fake_linkedin(args):
+    import uvicorn
+    from fake_linkedin import create_app
+
+    fake = create_app(args.linkedin_latency_ms, error_rate=args.linkedin_error_rate, seed=args.seed)
+    server = uvicorn.Server(uvicorn.Config(fake, host="127.0.0.1", port=_free_port(), log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return fake, server
+
+
+def start_server(args, linkedin_base: str, workdir: str):
+    """serve.py in a subprocess, wired to the fakes; returns (process, base_url, log path)."""
+    port = _free_port()
+    env = dict(os.environ)
+    env.update({
+        "FIRESTORE_FAKE": "1",
+        "FAKE_FIRESTORE_LATENCY_MS": str(args.firestore_latency_ms),
+        "FAKE_FIRESTORE_ERROR_RATE": str(args.firestore_error_rate),
+        "GEMINI_FAKE": "1",
+        "GEMINI_API_KEY": "fake",
+        "FAKE_GEMINI_LATENCY_MS": str(args.gemini_latency_ms),
+        "FAKE_GEMINI_ERROR_RATE": str(args.gemini_error_rate),
+        "FAKE_SEED": str(args.seed),
+        "LINKEDIN_CLIENT_ID": "fake-client",
+        "LINKEDIN_CLIENT_SECRET": "fake-secret",
+        "LINKEDIN_OAUTH_BASE": linkedin_base,
+        "LINKEDIN_API_BASE": linkedin_base,
+        "SKILLS_STORE": "firestore",
+        "RESUMES_DIR": os.path.join(workdir, "resumes"),
+        "RECORDINGS_DIR": os.path.join(workdir, "recordings"),
+        "SEARCH_INDEX_PATH": os.path.join(workdir, "search_index.db"),
+    })
+    for name in ("resumes", "recordings"):
+        os.makedirs(os.path.join(workdir, name), exist_ok=True)
+    log_path = os.path.join(workdir, "server.log")
+    log = open(log_path, "w")
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(BACKEND_DIR, "serve.py"), "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(args.workers), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT,
+    )
+    log.close()
+    return process, f"http://127.0.0.1:{port}", log_path
+
+
+def wait_ready(base_url: str, process: Optional[subprocess.Popen]):
+    deadline = time.time() + SERVER_READY_TIMEOUT
+    while time.time() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"Server exited with status {process.returncode}")
+        try:
+            if httpx.get(f"{base_url}/health/ready", timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Server at {base_url} not ready after {SERVER_READY_TIMEOUT:.0f}s")
+
+
+def server_snapshot(base_url: str) -> dict:
+    """Admission stats, readiness and the REPORT_METRICS series, read once the load has drained."""
+    snapshot = {}
+    with httpx.Client(base_url=base_url, timeout=10) as client:
+        for key, path in (("admission", "/api/admission/stats"), ("readiness", "/health/ready")):
+            try:
+                snapshot[key] = client.get(path).json()
+            except (httpx.HTTPError, ValueError) as e:
+                snapshot[key] = {"error": str(e)}
+        try:
+            metrics = {}
+            for line in client.get("/metrics").text.splitlines():
+                if line.startswith(REPORT_METRICS):
+                    series, _, value = line.rpartition(" ")
+                    metrics[series] = float(value)
+            snapshot["metrics"] = metrics
+        except httpx.HTTPError as e:
+            snapshot["metrics"] = {"error": str(e)}
+    return snapshot
+
+
+def print_summary(report: dict):
+    print(f"{report['totals']['scenarios']} scenarios, {report['totals']['requests']} requests in "
+          f"{report['elapsed_s']:.1f}s ({report['totals']['throughput_per_s']:.1f} req/s, "
+          f"{report['totals']['errors']} errors, {report['totals']['dropped']} dropped)")
+    for kind in ("endpoints", "scenarios"):
+        print(f"\n{kind[:-1]:<30}{'count':>7}{'err':>6}{'rps':>8}" + "".join(f"{f'p{p} ms':>10}" for p in PERCENTILES) + f"{'max ms':>10}")
+        for name, entry in report[kind].items():
+            latency = entry["latency_ms"]
+            print(f"{name:<30}{entry['count']:>7}{entry['errors']:>6}{entry['throughput_per_s']:>8.1f}"
+                  + "".join(f"{latency[f'p{p}']:>10.1f}" for p in PERCENTILES) + f"{latency['max']:>10.1f}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Load-test the API through recorded scenarios with local fakes")
+    parser.add_argument("--url", help="Target a running server instead of starting serve.py with the fakes")
+    parser.add_argument("--workers", type=int, default=1, help="serve.py workers")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds of load")
+    parser.add_argument("--concurrency", type=int, default=8,
+                        help="Virtual users (closed loop), or the most scenarios in flight with --rate")
+    parser.add_argument("--rate", type=float, help="Scenario arrivals per second (open loop, Poisson)")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Scenario weights, from {', '.join(SCENARIO_NAMES)}")
+    parser.add_argument("--users", type=int, default=200, help="Distinct user ids the scenarios draw from")
+    parser.add_argument("--audio-seconds", type=float, default=3.0, help="Length of the uploaded recordings")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Per-request client timeout in seconds")
+    parser.add_argument("--seed", type=int, default=1, help="Seed for arrivals, scenario picks, payloads and fakes")
+    parser.add_argument("--gemini-latency-ms", type=float, default=800.0)
+    parser.add_argument("--gemini-error-rate", type=float, default=0.0)
+    parser.add_argument("--firestore-latency-ms", type=float, default=20.0)
+    parser.add_argument("--firestore-error-rate", type=float, default=0.0)
+    parser.add_argument("--linkedin-latency-ms", type=float, default=80.0)
+    parser.add_argument("--linkedin-error-rate", type=float, default=0.0)
+    parser.add_argument("--report", help="Write the JSON report here ('-' prints it instead of the summary)")
+    args = parser.parse_args(argv)
+    try:
+        parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.concurrency < 1:
+        parser.error("--concurrency must be at least 1")
+
+    process = None
+    linkedin = None
+    workdir = tempfile.mkdtemp(prefix="loadtest-")
+    try:
+        if args.url:
+            base_url = args.url.rstrip("/")
+        else:
+            linkedin, linkedin_server = start_fake_linkedin(args)
+            process, base_url, log_path = start_server(
+                args, f"http://127.0.0.1:{linkedin_server.config.port}", workdir
+            )
+            print(f"Server log: {log_path}", file=sys.stderr)
+        wait_ready(base_url, process)
+
+        recorder = Recorder()
+        elapsed = asyncio.run(run_load(base_url, args, recorder))
+        endpoints = recorder.summary("endpoints", elapsed)
+        scenarios = recorder.summary("scenarios", elapsed)
+        requests = sum(entry["count"] for entry in endpoints.values())
+        report = {
+            "config": {key: value for key, value in vars(args).items() if key != "report"},
+            "elapsed_s": round(elapsed, 2),
+            "totals": {
+                "scenarios": sum(entry["count"] for entry in scenarios.values()),
+                "requests": requests,
+                "errors": sum(entry["errors"] for entry in endpoints.values()),
+                "dropped": recorder.dropped,
+                "throughput_per_s": round(requests / elapsed, 2),
+            },
+            "endpoints": endpoints,
+            "scenarios": scenarios,
+            "server": server_snapshot(base_url),
+        }
+        if linkedin is not None:
+            report["fakes"] = {"linkedin": {"calls": dict(linkedin.state.calls), "errors": dict(linkedin.state.errors)}}
+    finally:
+        if process is not None:
+            process.send_signal(signal.SIGTERM)
+            try:
+                process.wait(timeout=60)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    if args.report == "-":
+        print(json.dumps(report, indent=2))
+        return 0
+    print_summary(report)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.report}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,17 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File
+# Imported first: its import time is the start of the startup profile
+from startup_profile import StartupProfile
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Header
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi.responses import FileResponse, HTMLResponse, JSONResponse, RedirectResponse, Response, StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional, Dict
-import uvicorn
+from contextlib import asynccontextmanager
+from functools import lru_cache
+import asyncio
 import os
+import threading
+import time
 from datetime import datetime
 
 # Load environment variables from .env file if it exists
@@ -14,21 +21,88 @@ try:
 except ImportError:
     # python-dotenv not installed, skip loading .env file
     pass
-from vosk import Model, KaldiRecognizer
 import json
 import subprocess
 import tempfile
 import re
-import google.generativeai as genai
-import firebase_admin
-from firebase_admin import credentials, firestore
-import requests
 from urllib.parse import urlencode, parse_qs
-# Create FastAPI instance
+from admission import AdmissionMiddleware, cpu_share, create_admission_controller
+from http_client import create_http_client
+from profiling import ProfilingMiddleware, create_request_profiler
+from response_encoding import CompressionMiddleware, FastJSONResponse, compression_settings
+from readiness import CLOSED as CIRCUIT_CLOSED, create_circuit_breaker, create_probe, threadpool_stats
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, REGISTRY as METRICS, MetricsMiddleware, counter, histogram, instrument_methods
+from linkedin_profiles import PROFILE_FIELDS, create_linkedin_profile_cache, largest_profile_picture, member_id_from_token
+from search_index import KIND_RESUME, KIND_TRANSCRIPT, SearchIndex, upload_dirs
+from skills_store import create_skills_store
+from skills_cache import create_skills_cache
+from write_behind import create_skills_writer
+from skill_index import SKILL_LEVELS, SkillIndex
+from position_matcher import PositionMatcher, load_positions_file
+from skill_cooccurrence import MAX_NEIGHBORS, SkillCooccurrence
+from skills_export import DEFAULT_PAGE_SIZE as EXPORT_PAGE_SIZE, MAX_PAGE_SIZE as EXPORT_MAX_PAGE_SIZE, ndjson_lines
+from skill_analytics import SNAPSHOT_NAME as ANALYTICS_SNAPSHOT, SkillAnalytics, create_snapshot_lease, diff_counters
+from resume_dedup import (
+    attach_skills, changed_paragraphs, create_resume_index, minhash_signature,
+    reusable_skills, shingle_hashes
+)
+# Heavy modules (vosk, google.generativeai, firebase_admin, pdfplumber, httpx, pyarrow) are imported
+# on first use. numpy stays eager: the required "indexes" warmup phase needs it before the worker is
+# ready anyway, so deferring it only moves the cost. orjson takes under 1 ms.
+startup_profile = StartupProfile()
+startup_profile.mark("imports")
+
+# Warm up before serving requests and release shared resources when the server stops
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await run_in_threadpool(run_warmup)
+
+    global analytics_snapshot_task, metrics_flush_task, cooccurrence_refresh_task
+    analytics_snapshot_task = asyncio.create_task(snapshot_analytics_periodically())
+    cooccurrence_refresh_task = asyncio.create_task(refresh_cooccurrence_periodically())
+    if metrics_dir:
+        metrics_flush_task = asyncio.create_task(publish_metrics_periodically())
+
+    global positions_watch
+    with startup_profile.phase("positions"):
+        try:
+            client = get_firestore()
+            if client is not None:
+                positions_watch = await run_in_threadpool(position_matcher.watch_firestore, client)
+            print(f"Position matcher: {position_matcher.position_count} positions loaded")
+        except Exception as e:
+            print(f"Warning: Could not load positions: {e}")
+
+    startup_profile.set_ready()
+    print(f"Startup profile:\n{startup_profile.summary()}")
+    yield
+    await shutdown()
+
+# Create FastAPI instance; startup and shutdown run in lifespan()
 app = FastAPI(
     title="Fast Python API",
     description="A high-performance API built with FastAPI",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    # orjson-encoded when orjson is installed
+    default_response_class=FastJSONResponse,
+)
+
+# Admission control for CPU-heavy uploads. Added before CORS so it runs inside it
+# and its 503 responses carry the CORS headers the frontend needs to read Retry-After.
+transcription_admission = create_admission_controller("transcription", "TRANSCRIBE", cpu_share(), 4)
+resume_admission = create_admission_controller("resume parsing", "RESUME", cpu_share() * 2, 4)
+admission_wait_seconds = histogram("admission_wait_seconds", "Time admitted requests waited for a slot", ["endpoint"])
+admission_rejections = counter("admission_rejections_total", "Requests answered 503 by admission control", ["endpoint", "reason"])
+app.add_middleware(
+    AdmissionMiddleware,
+    routes={
+        ("POST", "/api/recordings"): transcription_admission,
+        ("POST", "/api/resumes"): resume_admission,
+        ("POST", "/api/resumes/pipeline"): resume_admission,
+    },
+    on_reject=lambda controller, e: admission_rejections.inc(endpoint=controller.name, reason=e.reason),
+    on_wait=lambda controller, seconds: admission_wait_seconds.observe(seconds, endpoint=controller.name),
 )
 
 # Configure CORS
@@ -40,6 +114,41 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Brotli/gzip for JSON and text responses of at least COMPRESSION_MIN_BYTES
+response_body_bytes = counter("http_response_body_bytes_total", "Response body bytes before compression", ["route", "encoding"])
+response_sent_bytes = counter("http_response_sent_bytes_total", "Response body bytes sent, after compression", ["route", "encoding"])
+
+def count_response_bytes(scope, encoding: str, body_bytes: int, sent_bytes: int):
+    route = getattr(scope.get("route"), "path", "unmatched")
+    response_body_bytes.labels(route, encoding).inc(body_bytes)
+    response_sent_bytes.labels(route, encoding).inc(sent_bytes)
+
+app.add_middleware(CompressionMiddleware, **compression_settings(), on_response=count_response_bytes)
+
+# Prometheus metrics for the hot paths, served at /metrics
+http_request_seconds = histogram("http_request_duration_seconds", "HTTP request latency by route", ["method", "route", "status"])
+gemini_request_seconds = histogram("gemini_request_duration_seconds", "Gemini generate_content latency", ["outcome"])
+gemini_fallbacks = counter("gemini_fallbacks_total", "Skill extractions that fell back to keyword matching", ["reason"])
+ffmpeg_decode_seconds = histogram(
+    "ffmpeg_decode_duration_seconds", "ffmpeg conversion of uploaded audio to 16kHz mono WAV",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+vosk_real_time_factor = histogram(
+    "vosk_real_time_factor", "Vosk recognition time divided by the audio duration",
+    buckets=(0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1, 1.5, 2, 5),
+)
+store_operation_seconds = histogram("skills_store_operation_duration_seconds", "Skills store call latency", ["backend", "op"])
+STORE_TIMED_METHODS = (
+    "get", "get_for_update", "save", "save_many", "apply_changes", "scan", "get_snapshot", "save_snapshot",
+    "get_linkedin_profile", "save_linkedin_profile", "list_items", "get_item", "create_item",
+    "update_item", "delete_item",
+)
+# Per-worker files summed by /metrics under serve.py; METRICS_FLUSH_SECONDS between writes
+metrics_dir = os.getenv("METRICS_DIR")
+metrics_flush_seconds = float(os.getenv("METRICS_FLUSH_SECONDS", "5"))
+metrics_flush_task = None
+app.add_middleware(MetricsMiddleware, metric=http_request_seconds)
+
 # Pydantic models for request/response validation
 class Item(BaseModel):
     id: Optional[int] = None
@@ -60,6 +169,24 @@ class SkillsRequest(BaseModel):
     user_id: str
     skills: List[SkillWithLevel]
 
+class SkillPatchOperation(BaseModel):
+    op: str  # "add", "remove" or "update_level"
+    skill: str
+    level: Optional[str] = None  # Required for "add" and "update_level"
+
+class SkillsPatchRequest(BaseModel):
+    operations: List[SkillPatchOperation]
+
+class SkillQueryTerm(BaseModel):
+    skill: str
+    min_level: Optional[str] = None  # Beginner, Intermediate, Advanced or Expert; defaults to any level
+
+class SkillSearchRequest(BaseModel):
+    all_of: List[SkillQueryTerm] = []  # Users must match every term
+    any_of: List[SkillQueryTerm] = []  # ...and at least one of these terms
+    limit: int = 50
+    cursor: Optional[str] = None  # next_cursor of the previous page
+
 class ProcessTextRequest(BaseModel):
     text: str
     user_id: str
@@ -72,72 +199,195 @@ class CategorizedSkill(BaseModel):
 class ProcessTextResponse(BaseModel):
     skills: List[CategorizedSkill]
     categories: Dict[str, List[str]]
+    reuse: Optional[dict] = None  # Near-duplicate reuse report, for resume text the user uploaded
 
 class SkillExtractionTestRequest(BaseModel):
     text: str
     expected_skills: Optional[List[str]] = None  # Optional list of expected skill names
     user_id: str = "test_user"
 
-# In-memory storage (replace with database in production)
-items_db = []
-next_id = 1
+# In-memory storage (replace with database in production); items live in the skills store
 skills_db = {}  # Dictionary to store skills by user_id (fallback)
+resume_index = create_resume_index()  # Recent resumes per user, for near-duplicate skill reuse
+
+# Firebase is on unless FIREBASE_ENABLED says otherwise
+def firebase_enabled() -> bool:
+    return os.getenv("FIREBASE_ENABLED", "1").strip().lower() not in ("0", "false", "no")
 
 # Initialize Firebase Admin SDK
-try:
-    # Check if Firebase is already initialized
-    if not firebase_admin._apps:
-        # Try to initialize with service account credentials from environment
-        firebase_creds = os.getenv("FIREBASE_CREDENTIALS")
-        if firebase_creds:
-            cred_dict = json.loads(firebase_creds)
-            cred = credentials.Certificate(cred_dict)
-            firebase_admin.initialize_app(cred)
-        else:
-            # Try to use default credentials or service account file
-            try:
-                cred = credentials.ApplicationDefault()
+def init_firestore():
+    """
+    Firestore client, or None when Firebase is unavailable. FIREBASE_ENABLED=0
+    skips it entirely, along with the application-default credentials probe.
+    """
+    if os.getenv("FIRESTORE_FAKE"):
+        # In-process stand-in for load tests (see loadtest.py)
+        from fake_firestore import create_fake_firestore
+        print("Using the fake Firestore (FIRESTORE_FAKE)")
+        return create_fake_firestore()
+    if not firebase_enabled():
+        print("Firebase disabled by FIREBASE_ENABLED. Firestore operations will use fallback.")
+        return None
+    try:
+        import firebase_admin
+        from firebase_admin import credentials, firestore
+
+        # Check if Firebase is already initialized
+        if not firebase_admin._apps:
+            # Try to initialize with service account credentials from environment
+            firebase_creds = os.getenv("FIREBASE_CREDENTIALS")
+            if firebase_creds:
+                cred_dict = json.loads(firebase_creds)
+                cred = credentials.Certificate(cred_dict)
                 firebase_admin.initialize_app(cred)
-            except:
-                # If no credentials found, Firestore operations will fail gracefully
-                print("Warning: Firebase Admin SDK not initialized. Firestore operations will use fallback.")
-    db = firestore.client()
-except Exception as e:
-    print(f"Warning: Could not initialize Firebase Admin SDK: {e}")
-    db = None
-
-# Initialize Gemini API
-try:
-    gemini_api_key = os.getenv("GEMINI_API_KEY")
-    if gemini_api_key:
-        genai.configure(api_key=gemini_api_key)
-    else:
-        print("Warning: GEMINI_API_KEY not found. Gemini features will not work.")
-except Exception as e:
-    print(f"Warning: Could not configure Gemini API: {e}")
+            else:
+                # Try to use default credentials or service account file
+                try:
+                    cred = credentials.ApplicationDefault()
+                    firebase_admin.initialize_app(cred)
+                except:
+                    # If no credentials found, Firestore operations will fail gracefully
+                    print("Warning: Firebase Admin SDK not initialized. Firestore operations will use fallback.")
+        return firestore.client()
+    except Exception as e:
+        print(f"Warning: Could not initialize Firebase Admin SDK: {e}")
+        return None
+
+# Firestore client and skills store, built by the "storage" warmup phase (or on first use)
+# rather than at import, so importing main never initializes Firebase or probes credentials
+_storage = None
+_storage_lock = threading.Lock()
+
+def init_storage():
+    """Connect Firebase and build the instrumented skills store, once per process."""
+    global _storage
+    with _storage_lock:
+        if _storage is None:
+            client = init_firestore()
+            # User skills storage backend, chosen by SKILLS_STORE (firestore, sqlite or memory)
+            store = create_skills_store(firestore_client=client, fallback_data=skills_db)
+            instrument_methods(store, STORE_TIMED_METHODS, store_operation_seconds, backend=store.name)
+            _storage = (client, store)
+    return _storage
+
+def get_firestore():
+    """Firestore client, or None when Firebase is unavailable."""
+    return init_storage()[0]
+
+class LazySkillsStore:
+    """Stands in for the skills store, building it with init_storage() on first attribute access."""
+
+    def __getattr__(self, name):
+        return getattr(init_storage()[1], name)
+
+skills_store = LazySkillsStore()
+# Storage reachability for /health/ready, checked at most every READY_PROBE_TTL_SECONDS
+storage_probe = create_probe("storage", lambda: skills_store.ping())
+# LRU/TTL cache in front of skills reads, invalidated on every save
+skills_cache = create_skills_cache()
+# Coalesces bursts of skill saves per user and commits them in batches; each committed
+# batch feeds the in-memory aggregates, in commit order
+skills_writer = create_skills_writer(
+    lambda docs: skills_store.save_many(docs), on_written=lambda docs: record_written_skills(docs)
+)
+# Inverted (skill, level) -> users index for candidate search, rebuilt on startup
+skill_index = SkillIndex()
+# Sparse position x skill matrix, kept in sync with the positions collection
+position_matcher = PositionMatcher()
+positions_watch = None
+# Skill co-occurrence over user skill sets and position requirements, for related skills
+skill_cooccurrence = SkillCooccurrence()
+position_matcher.add_listener(skill_cooccurrence.apply_change)
+cooccurrence_refresh_seconds = float(os.getenv("COOCCURRENCE_REFRESH_SECONDS", "1"))
+cooccurrence_refresh_task = None
+# Skill/category/level counters updated as deltas on every save, snapshotted into the store
+# by one worker per host
+skill_analytics = SkillAnalytics(lambda skill: categorize_skill(skill))
+analytics_lease = create_snapshot_lease()
+analytics_snapshot_seconds = float(os.getenv("ANALYTICS_SNAPSHOT_SECONDS", "300"))
+analytics_snapshot_task = None
+# Pooled keep-alive client for outbound API calls
+http_client = create_http_client()
+# Normalized LinkedIn profiles by member id, so reconnects skip the profile calls
+linkedin_profiles = create_linkedin_profile_cache(skills_store)
+
+# Cache hit/miss counters kept by the caches themselves, read at scrape time
+def collect_cache_metrics():
+    skills = skills_cache.stats()
+    profiles = linkedin_profiles.stats()
+    yield ("cache_lookups_total", "Cache lookups by cache and result", ("cache", "result"), [
+        (("skills", "hit"), skills["hits"]),
+        (("skills", "miss"), skills["misses"]),
+        (("linkedin_profiles", "hit"), profiles["hits"]),
+        (("linkedin_profiles", "stale"), profiles["stale"]),
+        (("linkedin_profiles", "miss"), profiles["misses"]),
+    ])
+
+METRICS.add_collector(collect_cache_metrics)
+
+# Gemini API client, imported and configured on first use (lazy loading)
+genai = None
+
+def get_genai():
+    """Import google.generativeai and configure it with GEMINI_API_KEY."""
+    global genai
+    if genai is None and os.getenv("GEMINI_FAKE"):
+        # In-process stand-in for load tests (see loadtest.py)
+        from fake_gemini import create_fake_genai
+        genai = create_fake_genai()
+    if genai is None:
+        import google.generativeai as gemini_module
+        gemini_api_key = os.getenv("GEMINI_API_KEY")
+        if gemini_api_key:
+            gemini_module.configure(api_key=gemini_api_key)
+        genai = gemini_module
+    return genai
+
+def warm_gemini():
+    """Gemini warmup phase; without an API key Gemini is never called, so skip the import."""
+    if os.getenv("GEMINI_API_KEY"):
+        get_genai()
+
+if not os.getenv("GEMINI_API_KEY"):
+    print("Warning: GEMINI_API_KEY not found. Gemini features will not work.")
+
+# Opens after GEMINI_BREAKER_FAILURES failed calls in a row; skills then come from keyword matching
+gemini_breaker = create_circuit_breaker("gemini", "GEMINI")
 
 # Create directories if they don't exist
 # Use absolute paths based on the script location
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-RECORDINGS_DIR = os.path.join(BASE_DIR, "recordings")
-RESUMES_DIR = os.path.join(BASE_DIR, "resumes")
-# Normalize paths (resolve ..)
-RECORDINGS_DIR = os.path.normpath(RECORDINGS_DIR)
-RESUMES_DIR = os.path.normpath(RESUMES_DIR)
+# RESUMES_DIR and RECORDINGS_DIR override them (shared with the search_index.py CLI)
+RESUMES_DIR, RECORDINGS_DIR = upload_dirs()
 os.makedirs(RECORDINGS_DIR, exist_ok=True)
 os.makedirs(RESUMES_DIR, exist_ok=True)
 
+# Full-text index over resume text and transcriptions (SQLite FTS5)
+search_index = SearchIndex()
+
+# Sampling profiles of requests sent with X-Profile-Token or slower than PROFILE_SLOW_MS
+request_profiler = create_request_profiler(BASE_DIR)
+app.add_middleware(ProfilingMiddleware, profiler=request_profiler)
+
+def index_document(path: str, kind: str, text: str):
+    """Add a saved text file to the search index without failing the upload."""
+    try:
+        search_index.add_document(path, kind, text)
+    except Exception as e:
+        print(f"Search index update failed for {path}: {e}")
+
 # Vosk model path - will download if not present
 VOSK_MODEL_DIR = os.path.join(BASE_DIR, "vosk-model")
 VOSK_MODEL_URL = "https://alphacephei.com/vosk/models/vosk-model-small-en-us-0.15.zip"
 VOSK_MODEL_NAME = "vosk-model-small-en-us-0.15"
 
-# Initialize Vosk model (lazy loading)
+# Initialize Vosk model (lazy loading); the last load failure is reported by /health/ready
 vosk_model = None
+vosk_model_error = None
 
 def get_vosk_model():
     """Load Vosk model, downloading if necessary."""
-    global vosk_model
+    global vosk_model, vosk_model_error
     if vosk_model is None:
         model_path = os.path.join(VOSK_MODEL_DIR, VOSK_MODEL_NAME)
         
@@ -147,10 +397,18 @@ def get_vosk_model():
             print("Please download a Vosk model from https://alphacephei.com/vosk/models")
             print(f"For example: wget {VOSK_MODEL_URL}")
             print(f"Then extract to: {VOSK_MODEL_DIR}")
+            vosk_model_error = f"Vosk model not found at {model_path}"
             raise Exception(f"Vosk model not found. Please download and extract to {model_path}")
         
-        print(f"Loading Vosk model from {model_path}...")
-        vosk_model = Model(model_path)
+        try:
+            from vosk import Model
+
+            print(f"Loading Vosk model from {model_path}...")
+            vosk_model = Model(model_path)
+        except Exception as e:
+            vosk_model_error = str(e)
+            raise
+        vosk_model_error = None
         print("Vosk model loaded successfully")
     
     return vosk_model
@@ -180,6 +438,7 @@ def transcribe_audio(audio_file_path: str) -> str:
                 # Convert to 16kHz mono WAV (required by Vosk)
                 # Add -y to overwrite, -loglevel error to reduce output, and increase timeout
                 # Use stderr=subprocess.DEVNULL to suppress warnings that might cause issues
+                decode_started = time.perf_counter()
                 result = subprocess.run(
                     ['ffmpeg', '-y', '-loglevel', 'error', '-i', audio_file_path, '-ar', '16000', '-ac', '1', '-f', 'wav', wav_path],
                     check=True,
@@ -187,6 +446,7 @@ def transcribe_audio(audio_file_path: str) -> str:
                     stderr=subprocess.PIPE,
                     timeout=60  # Increased timeout to 60 seconds
                 )
+                ffmpeg_decode_seconds.observe(time.perf_counter() - decode_started)
                 
                 # Verify the output file was created and has content
                 if not os.path.exists(wav_path) or os.path.getsize(wav_path) == 0:
@@ -213,11 +473,14 @@ def transcribe_audio(audio_file_path: str) -> str:
                 return "ffmpeg not found. Please install ffmpeg (brew install ffmpeg on macOS)"
         
         # Create recognizer with sample rate 16000
+        from vosk import KaldiRecognizer
+
         rec = KaldiRecognizer(model, 16000)
         rec.SetWords(True)  # Enable word timestamps
         
         # Read and process audio
         transcript_parts = []
+        recognition_started = time.perf_counter()
         
         with open(wav_path, 'rb') as wf:
             # Skip WAV header (44 bytes)
@@ -237,6 +500,10 @@ def transcribe_audio(audio_file_path: str) -> str:
             final_result = json.loads(rec.FinalResult())
             if 'text' in final_result and final_result['text']:
                 transcript_parts.append(final_result['text'])
+            # 16-bit mono samples at 16kHz after the 44-byte header
+            audio_seconds = (wf.tell() - 44) / 32000
+        if audio_seconds > 0:
+            vosk_real_time_factor.observe((time.perf_counter() - recognition_started) / audio_seconds)
         
         # Clean up temporary file if we created one
         if wav_path != audio_file_path and os.path.exists(wav_path):
@@ -337,9 +604,168 @@ def build_skill_conflict_map() -> Dict[str, List[str]]:
     
     return conflict_map
 
-# Pre-compute conflict map and valid skills set
-SKILL_CONFLICT_MAP = build_skill_conflict_map()
+# Pre-compute valid skills set; the conflict map is built on first use (or in the regex warmup)
 VALID_SKILLS_SET = get_all_valid_skills()
+SKILL_CONFLICT_MAP = None
+
+def get_skill_conflict_map() -> Dict[str, List[str]]:
+    global SKILL_CONFLICT_MAP
+    if SKILL_CONFLICT_MAP is None:
+        SKILL_CONFLICT_MAP = build_skill_conflict_map()
+    return SKILL_CONFLICT_MAP
+
+# Build the in-memory skill aggregates from the store. serve.py calls this once in the
+# parent before forking workers, so the workers share these pages copy-on-write.
+def preload_indexes():
+    """Rebuild the skill index, co-occurrence and analytics from the store and load file positions."""
+    started = time.perf_counter()
+    try:
+        users = skill_index.rebuild(skills_store.iter_all())
+        print(f"Skill index: {users} users loaded in {time.perf_counter() - started:.1f}s")
+        # Seeded from the index instead of a second scan; positions are added as they load
+        skill_cooccurrence.rebuild([[s["skill"] for s in skills] for _, skills in skill_index.iter_users()])
+        skill_cooccurrence.refresh()
+    except Exception as e:
+        print(f"Warning: Could not build skill index: {e}")
+
+    try:
+        skill_analytics.rebuild(skill_index.iter_users())
+        # The snapshot is only an export; the recount wins and the lease holder rewrites it
+        snapshot = skills_store.get_snapshot(ANALYTICS_SNAPSHOT)
+        if snapshot is not None:
+            recount = skill_analytics.counters()
+            drift = diff_counters(recount, {key: snapshot.get(key, {}) for key in recount})
+            if drift:
+                print(f"Warning: Skill analytics snapshot differs from the recount in {len(drift)} counters")
+    except Exception as e:
+        print(f"Warning: Could not build skill analytics: {e}")
+
+    try:
+        positions_file = os.getenv("POSITIONS_FILE")
+        if get_firestore() is None and positions_file:
+            position_matcher.load(load_positions_file(positions_file))
+    except Exception as e:
+        print(f"Warning: Could not load positions: {e}")
+
+# Warmup phases run before readiness is reported, in the order listed in WARMUP_PHASES.
+# Storage and the skill indexes are always set up; anything left out loads on first use instead.
+WARMUP_PHASES = ("regex", "gemini", "vosk")
+warmup_done = set()
+
+def configured_warmup_phases() -> List[str]:
+    """WARMUP_PHASES as a list (comma separated, empty for none), dropping unknown names."""
+    configured = os.getenv("WARMUP_PHASES")
+    if configured is None:
+        return list(WARMUP_PHASES)
+    phases = []
+    for name in (part.strip().lower() for part in configured.split(",")):
+        if name in WARMUP_PHASES:
+            phases.append(name)
+        elif name:
+            print(f"Warning: Unknown warmup phase '{name}'. Use {', '.join(WARMUP_PHASES)}.")
+    return phases
+
+def run_warmup(phases: Optional[List[str]] = None):
+    """
+    Set up storage, build the indexes and run the configured warmup phases, or
+    just the given ones, skipping any already done in this process (serve.py
+    warms up once in the parent). Only storage and the index build are required;
+    other failures are warnings.
+    """
+    steps = {
+        "storage": init_storage,
+        "indexes": preload_indexes,
+        "regex": warm_skill_patterns,
+        "gemini": warm_gemini,
+        "vosk": get_vosk_model,
+    }
+    for name in (["storage", "indexes"] + configured_warmup_phases() if phases is None else phases):
+        if name in warmup_done:
+            continue
+        with startup_profile.phase(name, required=name in ("storage", "indexes")):
+            steps[name]()
+        warmup_done.add(name)
+
+# Called in each pre-forked worker before it serves (see serve.py)
+def reinit_after_fork():
+    """Drop connections, sockets and pools inherited from the parent process."""
+    skills_store.after_fork()
+    search_index.after_fork()
+    skills_cache.after_fork()
+    http_client.after_fork()
+    storage_probe.after_fork()
+    analytics_lease.after_fork()
+    METRICS.after_fork()
+
+# Another worker saved this user's skills: catch the local aggregates up from the store
+def on_remote_skill_change(user_id: str):
+    try:
+        doc = skills_store.get(user_id)
+        if doc is not None:
+            record_skill_change(user_id, doc.get("skills", []))
+    except Exception as e:
+        print(f"Warning: Could not apply skill change from another worker: {e}")
+
+skills_cache.add_invalidation_listener(on_remote_skill_change)
+
+# Save the analytics counters every ANALYTICS_SNAPSHOT_SECONDS while something changed,
+# starting with a full snapshot of the startup recount; only the lease holder writes
+async def snapshot_analytics_periodically():
+    force = True
+    while True:
+        try:
+            if analytics_lease.held():
+                await run_in_threadpool(skill_analytics.snapshot, skills_store, force)
+                force = False
+        except Exception as e:
+            print(f"Warning: Could not snapshot skill analytics: {e}")
+        await asyncio.sleep(analytics_snapshot_seconds)
+
+# Recompute the related-skill lists that saves and position changes made stale, every
+# COOCCURRENCE_REFRESH_SECONDS, so /api/skills/related only reads ready lists
+async def refresh_cooccurrence_periodically():
+    while True:
+        await asyncio.sleep(cooccurrence_refresh_seconds)
+        try:
+            if skill_cooccurrence.dirty():
+                await run_in_threadpool(skill_cooccurrence.refresh)
+        except Exception as e:
+            print(f"Warning: Could not refresh related skills: {e}")
+
+# Write this worker's metrics for the others to sum, every METRICS_FLUSH_SECONDS
+async def publish_metrics_periodically():
+    while True:
+        await asyncio.sleep(metrics_flush_seconds)
+        try:
+            await run_in_threadpool(METRICS.write, metrics_dir)
+        except Exception as e:
+            print(f"Warning: Could not publish metrics: {e}")
+
+# Release shared resources when the server stops
+async def shutdown():
+    if positions_watch is not None:
+        positions_watch.unsubscribe()
+    # Flush coalesced skill saves before the store goes away
+    await skills_writer.close()
+    if analytics_snapshot_task is not None:
+        analytics_snapshot_task.cancel()
+    if cooccurrence_refresh_task is not None:
+        cooccurrence_refresh_task.cancel()
+    try:
+        if analytics_lease.held():
+            skill_analytics.snapshot(skills_store)
+    except Exception as e:
+        print(f"Warning: Could not snapshot skill analytics: {e}")
+    if metrics_flush_task is not None:
+        metrics_flush_task.cancel()
+        try:
+            METRICS.write(metrics_dir)
+        except Exception as e:
+            print(f"Warning: Could not publish metrics: {e}")
+    request_profiler.close()
+    skills_cache.close()
+    skills_store.close()
+    await http_client.close()
 
 # Root endpoint
 @app.get("/")
@@ -350,11 +776,82 @@ async def root():
         "docs": "/docs"
     }
 
-# Health check endpoint
+# Liveness check: the process is up (see /health/ready for whether it should get traffic)
 @app.get("/health")
 async def health_check():
     return {"status": "healthy"}
 
+# Prometheus metrics: the sum over every worker when METRICS_DIR is set
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    body = await run_in_threadpool(METRICS.render, metrics_dir)
+    return Response(body, media_type=METRICS_CONTENT_TYPE)
+
+# Startup probe: ready once warmup has finished, with the time spent in each startup phase
+@app.get("/health/startup")
+async def startup_health_check():
+    return JSONResponse(startup_profile.report(), status_code=200 if startup_profile.ready else 503)
+
+# Busy threadpool with more than this many calls waiting for a thread counts as saturated
+READY_POOL_MAX_WAITING = int(os.getenv("READY_POOL_MAX_WAITING", "40"))
+
+# Readiness probe: model, pool, queue, storage and Gemini state of this worker
+@app.get("/health/ready")
+async def readiness_check():
+    """
+    503 while the worker is starting, saturated (threadpool or an upload queue
+    full) or cannot reach its skills store, so the load balancer sends traffic
+    to other replicas. Lost optional dependencies (Vosk model, Firebase, Gemini)
+    only mark it degraded: every replica shares them and the API still answers.
+    """
+    not_ready = []
+    degraded = []
+    if not startup_profile.ready:
+        not_ready.append("starting up")
+
+    storage = await storage_probe.result()
+    if not storage["ok"]:
+        not_ready.append(f"{skills_store.name} store unreachable: {storage['error']}")
+    firebase = "connected" if get_firestore() is not None else "unavailable" if firebase_enabled() else "disabled"
+    if firebase == "unavailable":
+        degraded.append(f"Firebase unavailable, using the {skills_store.name} store")
+
+    pool = threadpool_stats()
+    if pool["busy"] >= pool["size"] and pool["waiting"] > READY_POOL_MAX_WAITING:
+        not_ready.append(f"threadpool saturated, {pool['waiting']} calls waiting")
+    admission = {"transcription": transcription_admission, "resume_parsing": resume_admission}
+    for controller in admission.values():
+        if controller.saturated():
+            not_ready.append(f"{controller.name} queue full")
+
+    vosk_state = "loaded" if vosk_model is not None else "failed" if vosk_model_error else "not_loaded"
+    if vosk_state == "failed":
+        degraded.append("Vosk model failed to load, transcription unavailable")
+    gemini_configured = bool(os.getenv("GEMINI_API_KEY"))
+    circuit = gemini_breaker.stats()
+    if not gemini_configured:
+        degraded.append("GEMINI_API_KEY not set, skills use keyword matching")
+    elif circuit["state"] != CIRCUIT_CLOSED:
+        degraded.append(f"Gemini circuit {circuit['state']}, skills use keyword matching")
+
+    report = {
+        "status": "not_ready" if not_ready else "degraded" if degraded else "ready",
+        "ready": not not_ready,
+        "not_ready_reasons": not_ready,
+        "degraded": degraded,
+        "models": {
+            "vosk": {"state": vosk_state, "error": vosk_model_error},
+            "gemini": {"configured": gemini_configured, "client_loaded": genai is not None, "circuit": circuit},
+        },
+        "storage": {"backend": skills_store.name, "firebase": firebase, "probe": storage},
+        "pools": {
+            "threadpool": pool,
+            "admission": {name: controller.stats() for name, controller in admission.items()},
+            "skills_writer_pending": skills_writer.stats()["pending"],
+        },
+    }
+    return JSONResponse(report, status_code=200 if not not_ready else 503)
+
 # Test endpoint for resumes API
 @app.get("/api/resumes/test")
 async def test_resumes_endpoint():
@@ -363,12 +860,12 @@ async def test_resumes_endpoint():
 # Get all items
 @app.get("/items", response_model=List[Item])
 async def get_items():
-    return items_db
+    return await run_in_threadpool(skills_store.list_items)
 
 # Get item by ID
 @app.get("/items/{item_id}", response_model=Item)
 async def get_item(item_id: int):
-    item = next((item for item in items_db if item["id"] == item_id), None)
+    item = await run_in_threadpool(skills_store.get_item, item_id)
     if item is None:
         raise HTTPException(status_code=404, detail="Item not found")
     return item
@@ -376,40 +873,21 @@ async def get_item(item_id: int):
 # Create new item
 @app.post("/items", response_model=Item, status_code=201)
 async def create_item(item: ItemCreate):
-    global next_id
-    new_item = {
-        "id": next_id,
-        "name": item.name,
-        "description": item.description,
-        "price": item.price
-    }
-    items_db.append(new_item)
-    next_id += 1
-    return new_item
+    return await run_in_threadpool(skills_store.create_item, item.model_dump())
 
 # Update item
 @app.put("/items/{item_id}", response_model=Item)
 async def update_item(item_id: int, item: ItemCreate):
-    item_index = next((i for i, item in enumerate(items_db) if item["id"] == item_id), None)
-    if item_index is None:
+    updated_item = await run_in_threadpool(skills_store.update_item, item_id, item.model_dump())
+    if updated_item is None:
         raise HTTPException(status_code=404, detail="Item not found")
-    
-    updated_item = {
-        "id": item_id,
-        "name": item.name,
-        "description": item.description,
-        "price": item.price
-    }
-    items_db[item_index] = updated_item
     return updated_item
 
 # Delete item
 @app.delete("/items/{item_id}", status_code=204)
 async def delete_item(item_id: int):
-    item_index = next((i for i, item in enumerate(items_db) if item["id"] == item_id), None)
-    if item_index is None:
+    if not await run_in_threadpool(skills_store.delete_item, item_id):
         raise HTTPException(status_code=404, detail="Item not found")
-    items_db.pop(item_index)
     return None
 
 # Upload audio recording
@@ -434,7 +912,8 @@ async def upload_recording(audio: UploadFile = File(...)):
         try:
             # Transcribe the audio file
             print(f"Starting transcription for: {file_path}")
-            transcription_text = transcribe_audio(file_path)
+            # ffmpeg and Vosk block for seconds; keep the event loop free for other requests
+            transcription_text = await run_in_threadpool(transcribe_audio, file_path)
             print(f"Transcription result: {transcription_text[:100]}...")  # Print first 100 chars
             
             # Always save transcription to file (even if it contains an error message)
@@ -442,6 +921,7 @@ async def upload_recording(audio: UploadFile = File(...)):
             with open(transcription_path, "w", encoding="utf-8") as f:
                 f.write(transcription_text)
             print(f"Transcription saved successfully")
+            index_document(transcription_path, KIND_TRANSCRIPT, transcription_text)
             
         except Exception as transcribe_error:
             # If transcription fails, still save the error message to file
@@ -469,66 +949,138 @@ async def upload_recording(audio: UploadFile = File(...)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error saving recording: {str(e)}")
 
+# Validate an uploaded resume and save it to RESUMES_DIR
+async def save_resume_upload(resume: UploadFile):
+    """
+    Validate an uploaded resume (name, type, size, format) and write it to disk.
+
+    Returns a tuple of (filename, file_path, content). Raises HTTPException(400)
+    for invalid uploads.
+    """
+    # Check if filename exists
+    if not resume.filename:
+        raise HTTPException(
+            status_code=400,
+            detail="No filename provided"
+        )
+    
+    # Validate file type
+    allowed_extensions = [".pdf", ".doc", ".docx"]
+    file_extension = os.path.splitext(resume.filename)[1].lower()
+    
+    if file_extension not in allowed_extensions:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid file type. Allowed types: {', '.join(allowed_extensions)}"
+        )
+    
+    # Validate file size (10MB max)
+    content = await resume.read()
+    max_size = 10 * 1024 * 1024  # 10MB
+    if len(content) > max_size:
+        raise HTTPException(
+            status_code=400,
+            detail="File size exceeds 10MB limit"
+        )
+
+    # Reject legacy binary .doc files before saving, since they can't be converted
+    from resume_analyzer import is_legacy_doc
+    if is_legacy_doc(content[:8]):
+        raise HTTPException(
+            status_code=400,
+            detail="Legacy Word 97-2003 (.doc) files are not supported. Please save as .docx or PDF."
+        )
+
+    # Generate filename with timestamp
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    original_name = os.path.splitext(resume.filename)[0]
+    # Sanitize filename to remove any problematic characters
+    original_name = "".join(c for c in original_name if c.isalnum() or c in (' ', '-', '_')).strip()
+    if not original_name:
+        original_name = "resume"
+    filename = f"{original_name}_{timestamp}{file_extension}"
+    file_path = os.path.join(RESUMES_DIR, filename)
+    
+    # Save the file
+    with open(file_path, "wb") as f:
+        f.write(content)
+    
+    return filename, file_path, content
+
+# Extract text from a saved resume and write it next to the original as .txt
+def convert_resume_to_text(filename: str, file_path: str):
+    """Extract resume text and save it as a .txt file. Returns (txt_filename, txt_path, text)."""
+    from resume_analyzer import extract_text_from_resume
+    
+    # Extract text from resume
+    resume_text = extract_text_from_resume(file_path)
+    
+    # Generate txt filename
+    resume_txt_filename = os.path.splitext(filename)[0] + ".txt"
+    resume_txt_path = os.path.join(RESUMES_DIR, resume_txt_filename)
+    
+    # Save resume text to txt file
+    with open(resume_txt_path, "w", encoding="utf-8") as f:
+        f.write(resume_text)
+    index_document(resume_txt_path, KIND_RESUME, resume_text)
+    
+    return resume_txt_filename, resume_txt_path, resume_text
+
+# Parse a comma-separated fields parameter, rejecting names that are not available
+def parse_fields(fields: Optional[str], available) -> Optional[List[str]]:
+    if not fields:
+        return None
+    wanted = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = [name for name in wanted if name not in available]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(unknown)}. Available: {', '.join(available)}"
+        )
+    return wanted
+
+# Keep only the requested top-level fields (comma separated) of a response body
+def select_fields(payload: dict, fields: Optional[str]) -> dict:
+    wanted = parse_fields(fields, payload)
+    return payload if wanted is None else {name: payload[name] for name in wanted}
+
+# Top-level fields of the POST /api/resumes response
+RESUME_RESPONSE_FIELDS = (
+    "message", "original_filename", "original_file_path", "txt_filename", "txt_file_path",
+    "size", "text_length", "text", "near_duplicate",
+)
+
 # Upload resume
 @app.post("/api/resumes")
-async def upload_resume(resume: UploadFile = File(...)):
+async def upload_resume(
+    resume: UploadFile = File(...),
+    user_id: Optional[str] = Form(None),
+    include_text: bool = True,
+    fields: Optional[str] = None,
+):
+    """
+    Save a resume and return its extracted text. include_text=false leaves the
+    text out; fields limits the response to the given comma-separated fields.
+    """
     try:
-        # Check if filename exists
-        if not resume.filename:
-            raise HTTPException(
-                status_code=400,
-                detail="No filename provided"
-            )
-        
-        # Validate file type
-        allowed_extensions = [".pdf", ".doc", ".docx"]
-        file_extension = os.path.splitext(resume.filename)[1].lower()
-        
-        if file_extension not in allowed_extensions:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Invalid file type. Allowed types: {', '.join(allowed_extensions)}"
-            )
-        
-        # Validate file size (10MB max)
-        content = await resume.read()
-        max_size = 10 * 1024 * 1024  # 10MB
-        if len(content) > max_size:
-            raise HTTPException(
-                status_code=400,
-                detail="File size exceeds 10MB limit"
-            )
-        
-        # Generate filename with timestamp
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        original_name = os.path.splitext(resume.filename)[0]
-        # Sanitize filename to remove any problematic characters
-        original_name = "".join(c for c in original_name if c.isalnum() or c in (' ', '-', '_')).strip()
-        if not original_name:
-            original_name = "resume"
-        filename = f"{original_name}_{timestamp}{file_extension}"
-        file_path = os.path.join(RESUMES_DIR, filename)
-        
-        # Save the file
-        with open(file_path, "wb") as f:
-            f.write(content)
-        
+        # Checked before the upload is saved, converted and indexed
+        available = [name for name in RESUME_RESPONSE_FIELDS if include_text or name != "text"]
+        wanted = parse_fields(fields, available)
+
+        filename, file_path, content = await save_resume_upload(resume)
+
         # Extract text from resume and convert to txt file
         try:
-            from resume_analyzer import extract_text_from_resume
-            
-            # Extract text from resume
-            resume_text = extract_text_from_resume(file_path)
-            
-            # Generate txt filename
-            resume_txt_filename = os.path.splitext(filename)[0] + ".txt"
-            resume_txt_path = os.path.join(RESUMES_DIR, resume_txt_filename)
-            
-            # Save resume text to txt file
-            with open(resume_txt_path, "w", encoding="utf-8") as f:
-                f.write(resume_text)
-            
-            return {
+            resume_txt_filename, resume_txt_path, resume_text = await run_in_threadpool(
+                convert_resume_to_text, filename, file_path
+            )
+
+            # Index the text so a later skill extraction can reuse results for near-duplicates
+            near_duplicate = None
+            if user_id:
+                near_duplicate = await run_in_threadpool(index_resume_text, user_id, filename, resume_text)
+
+            result = {
                 "message": "Resume converted to text successfully",
                 "original_filename": filename,
                 "original_file_path": file_path,
@@ -536,7 +1088,8 @@ async def upload_resume(resume: UploadFile = File(...)):
                 "txt_file_path": resume_txt_path,
                 "size": len(content),
                 "text_length": len(resume_text),
-                "text": resume_text
+                "text": resume_text,
+                "near_duplicate": near_duplicate
             }
         except Exception as conversion_error:
             # If conversion fails, raise an error
@@ -544,37 +1097,25 @@ async def upload_resume(resume: UploadFile = File(...)):
                 status_code=500,
                 detail=f"Error converting resume to text: {str(conversion_error)}"
             )
+        if not include_text:
+            del result["text"]
+        if wanted is not None:
+            result = {name: result[name] for name in wanted}
+        return FastJSONResponse(result)
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error saving resume: {str(e)}")
 
-# Helper function to extract years of experience mentioned near a skill
-def extract_experience_years(text: str, skill_name: str) -> Optional[float]:
-    """
-    Extract years of experience mentioned near a skill name in the text.
-    
-    Looks for patterns like:
-    - "X years/years of experience in [skill]"
-    - "[skill] for X years"
-    - "X year experience with [skill]"
-    - "coding in [skill] for X years"
-    - "X years of [skill]"
-    
-    Args:
-        text: The text to search in
-        skill_name: The skill name to look for
-        
-    Returns:
-        Number of years found, or None if not found
-    """
-    text_lower = text.lower()
-    skill_lower = skill_name.lower()
-    
-    # Pattern to match numbers (including decimals and ranges)
-    number_pattern = r'(\d+(?:\.\d+)?)'
-    
-    # Create a pattern that matches the skill name with word boundaries
+# Pattern to match numbers (including decimals and ranges)
+NUMBER_PATTERN = r'(\d+(?:\.\d+)?)'
+YEARS_RANGE_PATTERN = re.compile(rf'{NUMBER_PATTERN}\s*-\s*{NUMBER_PATTERN}')
+
+# Compiled patterns are cached per skill: there are more of them than re's own cache holds
+@lru_cache(maxsize=1024)
+def years_patterns(skill_lower: str) -> List[re.Pattern]:
+    """Compiled years-of-experience patterns around one (lowercase) skill name."""
+    number_pattern = NUMBER_PATTERN
     # Escape special regex characters in skill name
     skill_pattern = re.escape(skill_lower)
     
@@ -596,10 +1137,38 @@ def extract_experience_years(text: str, skill_name: str) -> Optional[float]:
         rf'{number_pattern}\+?\s+years?\s+{skill_pattern}',
         rf'{skill_pattern}\s+{number_pattern}\+?\s+years?',
     ]
+    return [re.compile(pattern, re.IGNORECASE) for pattern in patterns]
+
+@lru_cache(maxsize=4096)
+def word_pattern(term: str) -> re.Pattern:
+    """Compiled pattern matching term as a complete word."""
+    return re.compile(r'\b' + re.escape(term) + r'\b', re.IGNORECASE)
+
+# Helper function to extract years of experience mentioned near a skill
+def extract_experience_years(text: str, skill_name: str) -> Optional[float]:
+    """
+    Extract years of experience mentioned near a skill name in the text.
+    
+    Looks for patterns like:
+    - "X years/years of experience in [skill]"
+    - "[skill] for X years"
+    - "X year experience with [skill]"
+    - "coding in [skill] for X years"
+    - "X years of [skill]"
+    
+    Args:
+        text: The text to search in
+        skill_name: The skill name to look for
+        
+    Returns:
+        Number of years found, or None if not found
+    """
+    text_lower = text.lower()
+    skill_lower = skill_name.lower()
     
     # Also try without word boundaries for partial matches
-    for pattern in patterns:
-        matches = re.finditer(pattern, text_lower, re.IGNORECASE)
+    for pattern in years_patterns(skill_lower):
+        matches = pattern.finditer(text_lower)
         for match in matches:
             try:
                 years_str = match.group(1)
@@ -607,7 +1176,7 @@ def extract_experience_years(text: str, skill_name: str) -> Optional[float]:
                 # If it's a range like "3-5", take the average
                 if '-' in match.group(0):
                     # Try to find both numbers in the match
-                    range_match = re.search(rf'{number_pattern}\s*-\s*{number_pattern}', match.group(0))
+                    range_match = YEARS_RANGE_PATTERN.search(match.group(0))
                     if range_match:
                         years = (float(range_match.group(1)) + float(range_match.group(2))) / 2
                 return years
@@ -636,6 +1205,33 @@ def map_years_to_level(years: float) -> str:
     else:
         return "Expert"
 
+# Common skill name variations mapping
+SKILL_VARIATIONS = {
+    "javascript": ["js", "javascript", "ecmascript"],
+    "typescript": ["ts", "typescript"],
+    "python": ["python", "py", "python3"],
+    "node.js": ["node", "nodejs", "node.js"],
+    "react": ["react", "reactjs", "react.js"],
+    "vue.js": ["vue", "vuejs", "vue.js"],
+    "c++": ["c++", "cpp", "c plus plus"],
+    "c#": ["c#", "csharp", "c sharp"],
+    "postgresql": ["postgresql", "postgres", "pg"],
+    "mongodb": ["mongodb", "mongo"],
+    "aws": ["aws", "amazon web services", "amazon cloud"],
+}
+
+# Compile every pattern the skill matchers use, so the first resumes don't pay for it
+def warm_skill_patterns():
+    """Build the conflict map and compile the word and years patterns of every known skill."""
+    get_skill_conflict_map()
+    terms = set(VALID_SKILLS_SET)
+    for variations in SKILL_VARIATIONS.values():
+        terms.update(variations)
+    for skill in VALID_SKILLS_SET:
+        years_patterns(skill)
+    for term in terms:
+        word_pattern(term)
+
 # Helper function to check if a skill is mentioned in the text
 def skill_mentioned_in_text(text: str, skill_name: str) -> bool:
     """
@@ -657,13 +1253,12 @@ def skill_mentioned_in_text(text: str, skill_name: str) -> bool:
         return False
     
     # CONFLICT DETECTION: Check if a longer skill containing this skill is present in text
-    for longer_skill, conflicts in SKILL_CONFLICT_MAP.items():
+    for longer_skill, conflicts in get_skill_conflict_map().items():
         if skill_name in conflicts:
             # Check if the longer skill appears in the text
             longer_skill_lower = longer_skill.lower()
             # Use word boundaries to check if longer skill appears as complete word
-            pattern = r'\b' + re.escape(longer_skill_lower) + r'\b'
-            if re.search(pattern, text_lower, re.IGNORECASE):
+            if word_pattern(longer_skill_lower).search(text_lower):
                 # Longer skill is present, so don't match the shorter one
                 return False
     
@@ -685,41 +1280,23 @@ def skill_mentioned_in_text(text: str, skill_name: str) -> bool:
                 # Check if any conflicting skill appears in text
                 for conflict in conflicting_skills[skill_lower]:
                     # Use word boundaries to check if conflict appears as complete word
-                    conflict_pattern = r'\b' + re.escape(conflict) + r'\b'
-                    if re.search(conflict_pattern, text_lower, re.IGNORECASE):
+                    if word_pattern(conflict).search(text_lower):
                         # If conflicting skill is mentioned, don't match single letter
                         return False
             return True
         return False
     
-    # Common skill name variations mapping
-    skill_variations = {
-        "javascript": ["js", "javascript", "ecmascript"],
-        "typescript": ["ts", "typescript"],
-        "python": ["python", "py", "python3"],
-        "node.js": ["node", "nodejs", "node.js"],
-        "react": ["react", "reactjs", "react.js"],
-        "vue.js": ["vue", "vuejs", "vue.js"],
-        "c++": ["c++", "cpp", "c plus plus"],
-        "c#": ["c#", "csharp", "c sharp"],
-        "postgresql": ["postgresql", "postgres", "pg"],
-        "mongodb": ["mongodb", "mongo"],
-        "aws": ["aws", "amazon web services", "amazon cloud"],
-    }
-    
     # Check if skill has known variations
-    for canonical, variations in skill_variations.items():
+    for canonical, variations in SKILL_VARIATIONS.items():
         if skill_lower == canonical or skill_lower in variations:
             # Check if any variation appears in text with word boundaries
             for variation in variations:
-                pattern = r'\b' + re.escape(variation) + r'\b'
-                if re.search(pattern, text_lower, re.IGNORECASE):
+                if word_pattern(variation).search(text_lower):
                     return True
     
     # Use word boundaries to match skill name as a whole word
     # This prevents "Java" from matching in "JavaScript" or "R" from matching in "React"
-    pattern = r'\b' + re.escape(skill_lower) + r'\b'
-    if re.search(pattern, text_lower, re.IGNORECASE):
+    if word_pattern(skill_lower).search(text_lower):
         return True
     
     # For multi-word skills, check if they appear as complete phrases
@@ -762,10 +1339,11 @@ async def process_text_with_gemini(text: str) -> List[CategorizedSkill]:
     gemini_api_key = os.getenv("GEMINI_API_KEY")
     if not gemini_api_key:
         # Fallback to manual extraction
+        gemini_fallbacks.inc(reason="no_key")
         return extract_skills_fallback(text)
     
     try:
-        model = genai.GenerativeModel('gemini-pro')
+        model = get_genai().GenerativeModel('gemini-pro')
         
         # Build whitelist of all valid skills for the prompt
         all_valid_skills_list = []
@@ -810,7 +1388,20 @@ OUTPUT FORMAT (JSON array only, no markdown, no explanation):
 
 Return only explicitly mentioned skills from the whitelist. Do not infer or guess."""
         
-        response = model.generate_content(prompt)
+        # Gemini has been failing: answer from keywords at once instead of waiting on it again
+        if not gemini_breaker.allow():
+            gemini_fallbacks.inc(reason="circuit_open")
+            return extract_skills_fallback(text)
+        started = time.perf_counter()
+        try:
+            # The SDK call blocks for the whole round trip; keep it off the event loop
+            response = await run_in_threadpool(model.generate_content, prompt)
+        except Exception:
+            gemini_request_seconds.observe(time.perf_counter() - started, outcome="error")
+            gemini_breaker.record_failure()
+            raise
+        gemini_request_seconds.observe(time.perf_counter() - started, outcome="ok")
+        gemini_breaker.record_success()
         
         # Extract JSON from response
         response_text = response.text.strip()
@@ -841,16 +1432,9 @@ Return only explicitly mentioned skills from the whitelist. Do not infer or gues
             
             category = item.get("category", categorize_skill(skill_name))
             level = item.get("level", "Intermediate")
-            
-            # Extract years of experience from text and override level if found
-            years = extract_experience_years(text, skill_name)
-            if years is not None:
-                # Override level based on extracted years
-                level = map_years_to_level(years)
-            else:
-                # If no years found, use Gemini's level but ensure it's valid
-                if level not in ["Beginner", "Intermediate", "Advanced", "Expert"]:
-                    level = "Intermediate"
+            # Use Gemini's level unless the text states years of experience, but ensure it's valid
+            if level not in ["Beginner", "Intermediate", "Advanced", "Expert"]:
+                level = "Intermediate"
             
             categorized_skills.append(CategorizedSkill(
                 skill=skill_name,
@@ -858,53 +1442,70 @@ Return only explicitly mentioned skills from the whitelist. Do not infer or gues
                 level=level
             ))
         
-        # POST-PROCESSING FILTER: Remove skills that are substrings of other extracted skills
-        # Sort by length (longest first) to check longer skills first
-        filtered_skills = []
-        skill_names_lower = [s.skill.lower() for s in categorized_skills]
-        
-        for skill_obj in categorized_skills:
-            skill_lower = skill_obj.skill.lower()
-            is_substring = False
-            
-            # Check if this skill is a substring of any other extracted skill
-            for other_skill_lower in skill_names_lower:
-                if skill_lower == other_skill_lower:
-                    continue
-                
-                # Check if this skill appears as a substring in another skill
-                if skill_lower in other_skill_lower:
-                    # Verify it's actually embedded (not just a word boundary match)
-                    idx = other_skill_lower.find(skill_lower)
-                    if idx != -1:
-                        # Check if it's embedded (not at word boundaries)
-                        if idx == 0 and len(other_skill_lower) > len(skill_lower):
-                            # At start - check if next char is a letter
-                            next_char_idx = len(skill_lower)
-                            if next_char_idx < len(other_skill_lower) and other_skill_lower[next_char_idx].isalpha():
-                                is_substring = True
-                                break
-                        elif idx > 0:
-                            # In middle/end - check if preceded by a letter
-                            if other_skill_lower[idx - 1].isalpha():
-                                is_substring = True
-                                break
-            
-            # Only add if it's not a substring of another skill
-            if not is_substring:
-                filtered_skills.append(skill_obj)
-        
-        return filtered_skills
+        return finalize_extracted_skills(text, categorized_skills)
     
     except json.JSONDecodeError as e:
         # Fallback: try to extract skills manually
         print(f"JSON decode error: {e}")
+        gemini_fallbacks.inc(reason="bad_json")
         return extract_skills_fallback(text)
     except Exception as e:
         print(f"Gemini API error: {e}")
         # Fallback to manual extraction
+        gemini_fallbacks.inc(reason="error")
         return extract_skills_fallback(text)
 
+# Post-process extracted skills against the full text they came from
+def finalize_extracted_skills(text: str, categorized_skills: List[CategorizedSkill]) -> List[CategorizedSkill]:
+    """
+    Override levels with the years of experience the text states, then drop skills
+    embedded in another extracted skill ("Java" next to "JavaScript").
+    """
+    with_levels = []
+    for skill_obj in categorized_skills:
+        years = extract_experience_years(text, skill_obj.skill)
+        if years is not None:
+            skill_obj = skill_obj.model_copy(update={"level": map_years_to_level(years)})
+        with_levels.append(skill_obj)
+    categorized_skills = with_levels
+
+    # POST-PROCESSING FILTER: Remove skills that are substrings of other extracted skills
+    filtered_skills = []
+    skill_names_lower = [s.skill.lower() for s in categorized_skills]
+    
+    for skill_obj in categorized_skills:
+        skill_lower = skill_obj.skill.lower()
+        is_substring = False
+        
+        # Check if this skill is a substring of any other extracted skill
+        for other_skill_lower in skill_names_lower:
+            if skill_lower == other_skill_lower:
+                continue
+            
+            # Check if this skill appears as a substring in another skill
+            if skill_lower in other_skill_lower:
+                # Verify it's actually embedded (not just a word boundary match)
+                idx = other_skill_lower.find(skill_lower)
+                if idx != -1:
+                    # Check if it's embedded (not at word boundaries)
+                    if idx == 0 and len(other_skill_lower) > len(skill_lower):
+                        # At start - check if next char is a letter
+                        next_char_idx = len(skill_lower)
+                        if next_char_idx < len(other_skill_lower) and other_skill_lower[next_char_idx].isalpha():
+                            is_substring = True
+                            break
+                    elif idx > 0:
+                        # In middle/end - check if preceded by a letter
+                        if other_skill_lower[idx - 1].isalpha():
+                            is_substring = True
+                            break
+        
+        # Only add if it's not a substring of another skill
+        if not is_substring:
+            filtered_skills.append(skill_obj)
+    
+    return filtered_skills
+
 # Fallback function to extract skills without Gemini
 def extract_skills_fallback(text: str) -> List[CategorizedSkill]:
     """Fallback method to extract skills when Gemini is unavailable."""
@@ -923,6 +1524,66 @@ def extract_skills_fallback(text: str) -> List[CategorizedSkill]:
     
     return skills_found
 
+# MinHash signature of resume text for the near-duplicate index
+def resume_signature(text: str) -> tuple:
+    """CPU-bound (milliseconds for a few KB of text), so async callers run it in the threadpool."""
+    return minhash_signature(shingle_hashes(text))
+
+# Register uploaded resume text in the near-duplicate index
+def index_resume_text(user_id: str, name: str, text: str) -> dict:
+    """Index a user's resume text and report the closest earlier resume, if any."""
+    signature = resume_signature(text)
+    previous, similarity, lookup_ms = resume_index.find(user_id, signature)
+    resume_index.add(user_id, name, text, signature)
+    return {
+        "is_near_duplicate": previous is not None,
+        "duplicate_of": previous.name if previous else None,
+        "similarity": round(similarity, 3),
+        "lookup_ms": round(lookup_ms, 4)
+    }
+
+# Extract skills, reusing cached results when the text is a near-duplicate of an earlier resume
+async def extract_skills_with_reuse(user_id: str, text: str, signature: Optional[tuple] = None):
+    """
+    Extract skills from resume text, sending only changed paragraphs to Gemini when
+    this user already had a near-identical resume processed. Levels and the embedded
+    skill filter are then applied to the merged skills over the full text, as a full
+    extraction would.
+
+    Returns (skills, reuse_report).
+    """
+    if signature is None:
+        signature = await run_in_threadpool(resume_signature, text)
+    previous, similarity, lookup_ms = resume_index.find(user_id, signature, require_skills=True)
+
+    if previous is None:
+        llm_text = text
+        categorized_skills = await process_text_with_gemini(text)
+        reused_count = 0
+    else:
+        llm_text = "\n".join(changed_paragraphs(previous, text))
+        reused = [CategorizedSkill(**skill) for skill in reusable_skills(previous, text)]
+        fresh = await process_text_with_gemini(llm_text) if llm_text.strip() else []
+        # Freshly extracted skills win over cached ones (their level may have changed)
+        merged = {skill.skill.lower(): skill for skill in reused}
+        merged.update({skill.skill.lower(): skill for skill in fresh})
+        categorized_skills = finalize_extracted_skills(text, list(merged.values()))
+        kept = {s.skill.lower() for s in categorized_skills} - {f.skill.lower() for f in fresh}
+        reused_count = len([s for s in reused if s.skill.lower() in kept])
+
+    entry = resume_index.add(user_id, "text", text, signature)
+    attach_skills(entry, [skill.model_dump() for skill in categorized_skills], text, skill_mentioned_in_text)
+
+    return categorized_skills, {
+        "is_near_duplicate": previous is not None,
+        "similarity": round(similarity, 3),
+        "lookup_ms": round(lookup_ms, 4),
+        "reused_skills": reused_count,
+        "llm_chars": len(llm_text),
+        "total_chars": len(text),
+        "llm_work_saved": round(1 - len(llm_text) / len(text), 3) if text else 0.0
+    }
+
 # Test endpoint for process-text route
 @app.get("/api/skills/process/test")
 async def test_process_text():
@@ -1010,9 +1671,17 @@ async def process_text(request: ProcessTextRequest):
         if not request.text or not request.text.strip():
             raise HTTPException(status_code=400, detail="Text input is required")
         
-        # Process text with Gemini
-        categorized_skills = await process_text_with_gemini(request.text)
-        
+        # Process text with Gemini. Resume text the user uploaded reuses earlier results for
+        # near-duplicate resumes; free text is always extracted in full
+        reuse_report = None
+        signature = None
+        if request.user_id and resume_index.has_user(request.user_id):
+            signature = await run_in_threadpool(resume_signature, request.text)
+        if signature is not None and resume_index.has(request.user_id, signature):
+            categorized_skills, reuse_report = await extract_skills_with_reuse(request.user_id, request.text, signature)
+        else:
+            categorized_skills = await process_text_with_gemini(request.text)
+
         if not categorized_skills:
             raise HTTPException(
                 status_code=404, 
@@ -1030,7 +1699,8 @@ async def process_text(request: ProcessTextRequest):
         
         return ProcessTextResponse(
             skills=categorized_skills,
-            categories=categories_dict
+            categories=categories_dict,
+            reuse=reuse_report
         )
     
     except HTTPException:
@@ -1038,47 +1708,62 @@ async def process_text(request: ProcessTextRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing text: {str(e)}")
 
+# Build the stored skills document and write it through the write-behind queue
+async def store_user_skills(user_id: str, skills: List[SkillWithLevel]):
+    """
+    Persist a user's skills. Returns (skills_data, categories_dict) once the write is
+    durable; rapid saves for the same user are coalesced into one store write.
+    """
+    skills_data = [{"skill": skill.skill, "level": skill.level} for skill in skills]
+    
+    # Group skills by category for easier querying
+    categories_dict: Dict[str, List[str]] = {}
+    for skill_obj in skills:
+        category = categorize_skill(skill_obj.skill)
+        if category not in categories_dict:
+            categories_dict[category] = []
+        if skill_obj.skill not in categories_dict[category]:
+            categories_dict[category].append(skill_obj.skill)
+    
+    # Prepare data for Firestore
+    skills_doc = {
+        "skills": skills_data,
+        "categories": categories_dict,
+        "updated_at": datetime.now().isoformat()
+    }
+    
+    await skills_writer.submit(user_id, skills_doc)
+    skills_cache.invalidate(user_id)
+
+    return skills_data, categories_dict
+
+# Feed a committed write-behind batch into the in-memory skill aggregates
+def record_written_skills(docs: Dict[str, dict]):
+    """Apply each written document, the coalesced state that was persisted, to the aggregates."""
+    for user_id, doc in docs.items():
+        record_skill_change(user_id, doc.get("skills", []))
+
+# Feed a saved skill set into the in-memory skill aggregates
+def record_skill_change(user_id: str, skills: List[dict]):
+    """Update the skill index and apply the old -> new change to the co-occurrence and analytics counts."""
+    previous = skill_index.update_user(user_id, skills)
+    skill_analytics.apply_change(previous, skills)
+    skill_cooccurrence.apply_change(
+        [s["skill"] for s in previous] if previous is not None else None,
+        [s["skill"] for s in skills]
+    )
+
+# Read a user's stored skills document through the read cache
+def load_user_skills(user_id: str) -> Optional[dict]:
+    """Return the stored skills document for a user, or None if there is none."""
+    return skills_cache.get_or_load(user_id, skills_store.get)
+
 # Save user skills
 @app.post("/api/skills")
 async def save_skills(skills_request: SkillsRequest):
     try:
         user_id = skills_request.user_id
-        skills_data = [{"skill": skill.skill, "level": skill.level} for skill in skills_request.skills]
-        
-        # Group skills by category for easier querying
-        categories_dict: Dict[str, List[str]] = {}
-        for skill_obj in skills_request.skills:
-            category = categorize_skill(skill_obj.skill)
-            if category not in categories_dict:
-                categories_dict[category] = []
-            if skill_obj.skill not in categories_dict[category]:
-                categories_dict[category].append(skill_obj.skill)
-        
-        # Prepare data for Firestore
-        skills_doc = {
-            "skills": skills_data,
-            "categories": categories_dict,
-            "updated_at": datetime.now().isoformat()
-        }
-        
-        # Try to save to Firestore first
-        if db:
-            try:
-                user_ref = db.collection("users").document(user_id)
-                user_ref.set(skills_doc, merge=True)
-            except Exception as e:
-                print(f"Firestore save error: {e}, falling back to in-memory storage")
-                # Fallback to in-memory storage
-                skills_db[user_id] = {
-                    "user_id": user_id,
-                    **skills_doc
-                }
-        else:
-            # Fallback to in-memory storage if Firestore not available
-            skills_db[user_id] = {
-                "user_id": user_id,
-                **skills_doc
-            }
+        skills_data, categories_dict = await store_user_skills(user_id, skills_request.skills)
         
         return {
             "message": "Skills saved successfully",
@@ -1090,35 +1775,444 @@ async def save_skills(skills_request: SkillsRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error saving skills: {str(e)}")
 
+# Search users by skills and minimum level
+@app.post("/api/skills/search")
+async def search_users_by_skills(search_request: SkillSearchRequest):
+    """
+    Find users matching all of the all_of terms and at least one any_of term, e.g.
+    React at Advanced or above and also Docker. Pages through results with cursor.
+    """
+    for term in search_request.all_of + search_request.any_of:
+        if term.min_level and term.min_level not in SKILL_LEVELS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"min_level must be one of: {', '.join(SKILL_LEVELS)}"
+            )
+    if search_request.limit < 1:
+        raise HTTPException(status_code=400, detail="limit must be at least 1")
+
+    try:
+        return skill_index.search(
+            all_of=[term.model_dump() for term in search_request.all_of],
+            any_of=[term.model_dump() for term in search_request.any_of],
+            limit=search_request.limit,
+            cursor=search_request.cursor,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error searching skills: {str(e)}")
+
+# Related skills from co-occurrence (must come before /api/skills/{user_id})
+@app.get("/api/skills/related/{skill:path}")
+async def related_skills(skill: str, k: int = 10):
+    """
+    Skills that most often appear together with this one in users' skill sets and
+    position requirements, ranked by normalized PMI from precomputed neighbor lists.
+    """
+    if k < 1 or k > MAX_NEIGHBORS:
+        raise HTTPException(status_code=400, detail=f"k must be between 1 and {MAX_NEIGHBORS}")
+    related = skill_cooccurrence.related(skill, k=k)
+    if related is None:
+        raise HTTPException(status_code=404, detail=f"Unknown skill: {skill}")
+    return {"skill": skill_cooccurrence.skill_name(skill), "related": related}
+
+# Skill analytics dashboard
+@app.get("/api/analytics/skills")
+async def skill_analytics_view():
+    """
+    User, skill, level and category counts with top skills per category, served
+    from counters maintained on every save instead of scanning user documents.
+    """
+    return skill_analytics.view()
+
+# Streaming export of every user's skills
+@app.get("/api/export/skills")
+async def export_skills(cursor: Optional[str] = None, page_size: int = EXPORT_PAGE_SIZE, limit: int = 0):
+    """
+    Stream every user's skills as NDJSON, one {user_id, updated_at, skills} line
+    per user in user_id order. The store is read page by page, so memory stays
+    flat; to resume an interrupted export pass the last user_id received as cursor.
+    """
+    if page_size < 1 or page_size > EXPORT_MAX_PAGE_SIZE:
+        raise HTTPException(status_code=400, detail=f"page_size must be between 1 and {EXPORT_MAX_PAGE_SIZE}")
+    if limit < 0:
+        raise HTTPException(status_code=400, detail="limit must not be negative")
+    # Export what has been accepted, including saves still waiting in the write-behind buffer
+    await skills_writer.flush()
+    return StreamingResponse(
+        ndjson_lines(skills_store, cursor, page_size, limit),
+        media_type="application/x-ndjson"
+    )
+
+# Skills read cache statistics (must come before /api/skills/{user_id})
+@app.get("/api/skills/cache/stats")
+async def skills_cache_stats():
+    """Hit/miss counters, hit ratio and mean latency of the skills read cache."""
+    return skills_cache.stats()
+
+# Skills write-behind statistics (must come before /api/skills/{user_id})
+@app.get("/api/skills/writer/stats")
+async def skills_writer_stats():
+    """Submitted vs written saves, batches and the resulting write reduction."""
+    return skills_writer.stats()
+
+# Request profiles are only readable with the profiling token, when one is configured
+def check_profile_token(token: Optional[str]):
+    if request_profiler.token and (token or "").encode() != request_profiler.token:
+        raise HTTPException(status_code=403, detail="Missing or invalid X-Profile-Token")
+
+# List recent request profiles
+@app.get("/api/profiles")
+async def list_request_profiles(x_profile_token: Optional[str] = Header(None)):
+    """Captured request profiles, newest first, from the on-disk ring buffer."""
+    check_profile_token(x_profile_token)
+    captures = await run_in_threadpool(request_profiler.list_captures)
+    return {"profiles": captures, "count": len(captures)}
+
+# Download one request profile
+@app.get("/api/profiles/{capture_id}")
+async def get_request_profile(capture_id: str, format: str = "folded", x_profile_token: Optional[str] = Header(None)):
+    """
+    format=folded returns the folded stacks for flamegraph.pl or speedscope;
+    format=json returns the summary with the top functions by self and total samples.
+    """
+    check_profile_token(x_profile_token)
+    if format not in ("folded", "json"):
+        raise HTTPException(status_code=400, detail="format must be folded or json")
+    path = request_profiler.capture_path(capture_id, "." + format)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    media_type = "application/json" if format == "json" else "text/plain"
+    return FileResponse(path, media_type=media_type, filename=f"{capture_id}.{format}")
+
+# Admission control state for the upload endpoints
+@app.get("/api/admission/stats")
+async def admission_stats():
+    """Running and queued requests, rejections and measured service time per controller."""
+    return {
+        "transcription": transcription_admission.stats(),
+        "resume_parsing": resume_admission.stats(),
+    }
+
 # Get user skills
 @app.get("/api/skills/{user_id}")
-async def get_skills(user_id: str):
+async def get_skills(user_id: str, fields: Optional[str] = None):
     try:
-        # Try to get from Firestore first
-        if db:
-            try:
-                user_ref = db.collection("users").document(user_id)
-                user_doc = user_ref.get()
-                if user_doc.exists:
-                    return user_doc.to_dict()
-            except Exception as e:
-                print(f"Firestore read error: {e}, falling back to in-memory storage")
-        
-        # Fallback to in-memory storage
-        if user_id not in skills_db:
+        skills_doc = await run_in_threadpool(load_user_skills, user_id)
+        if skills_doc is None:
             raise HTTPException(status_code=404, detail="Skills not found for this user")
         
-        return skills_db[user_id]
+        # Returned as a response so the document skips FastAPI's jsonable_encoder pass
+        return FastJSONResponse(select_fields(skills_doc, fields))
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error retrieving skills: {str(e)}")
 
+SKILL_PATCH_OPS = {"add", "remove", "update_level"}
+# Patches and resume merges read-modify-write a user's document, so they run one at a time per user
+skill_patch_locks = [asyncio.Lock() for _ in range(64)]
+
+def user_skills_lock(user_id: str) -> asyncio.Lock:
+    return skill_patch_locks[hash(user_id) % len(skill_patch_locks)]
+
+# Turn PATCH operations into the minimal change set against the stored document
+def build_skill_changes(doc: Optional[dict], operations: List[SkillPatchOperation]) -> dict:
+    """
+    Apply operations in order to a copy of the stored skills and diff the result.
+    Skill names match case-insensitively; only newly added skills are categorized,
+    the rest keep the category already stored for them.
+    """
+    doc = doc or {}
+    original = {s["skill"].lower(): s for s in doc.get("skills", [])}
+    state = {key: {"skill": s["skill"], "level": s["level"]} for key, s in original.items()}
+
+    for operation in operations:
+        key = operation.skill.strip().lower()
+        if operation.op == "remove":
+            state.pop(key, None)
+        elif operation.op == "update_level" and key not in state:
+            raise HTTPException(status_code=404, detail=f"Skill not found for this user: {operation.skill}")
+        elif key in state:
+            state[key] = {"skill": state[key]["skill"], "level": operation.level}
+        else:
+            state[key] = {"skill": operation.skill.strip(), "level": operation.level}
+
+    category_of = {
+        skill: category
+        for category, members in doc.get("categories", {}).items()
+        for skill in members
+    }
+
+    def stored_category(skill: str) -> str:
+        return category_of.get(skill) or categorize_skill(skill)
+
+    added, removed, updated = [], [], []
+    for key, s in original.items():
+        if key not in state:
+            removed.append({"skill": s["skill"], "level": s["level"], "category": stored_category(s["skill"])})
+        elif state[key]["level"] != s["level"]:
+            updated.append({
+                "skill": s["skill"],
+                "old_level": s["level"],
+                "level": state[key]["level"],
+                "category": stored_category(s["skill"]),
+            })
+    for key, s in state.items():
+        if key not in original:
+            added.append({"skill": s["skill"], "level": s["level"], "category": categorize_skill(s["skill"])})
+
+    # Categories whose last skill is removed are deleted rather than left empty
+    remaining: Dict[str, int] = {}
+    for category, members in doc.get("categories", {}).items():
+        remaining[category] = len(members)
+    for c in removed:
+        remaining[c["category"]] = remaining.get(c["category"], 1) - 1
+    for c in added:
+        remaining[c["category"]] = remaining.get(c["category"], 0) + 1
+
+    return {
+        "added": added,
+        "removed": removed,
+        "updated": updated,
+        "emptied_categories": [c for c, count in remaining.items() if count <= 0],
+        "updated_at": datetime.now().isoformat(),
+        "skills": list(state.values()),
+    }
+
+# Incrementally update user skills
+@app.patch("/api/skills/{user_id}")
+async def patch_skills(user_id: str, patch_request: SkillsPatchRequest):
+    """
+    Add, remove or re-level individual skills. Only the changed skills are
+    categorized and only the changed fields are written to the store.
+    """
+    for operation in patch_request.operations:
+        if operation.op not in SKILL_PATCH_OPS:
+            raise HTTPException(status_code=400, detail=f"Unknown operation: {operation.op}")
+        if not operation.skill.strip():
+            raise HTTPException(status_code=400, detail="Skill name cannot be empty")
+        if operation.op != "remove" and not operation.level:
+            raise HTTPException(status_code=400, detail=f"Operation {operation.op} requires a level")
+
+    try:
+        async with user_skills_lock(user_id):
+            # A coalesced full save still waiting to be written would land on top of the patch
+            await skills_writer.flush_key(user_id)
+            doc = await run_in_threadpool(skills_store.get_for_update, user_id)
+            changes = build_skill_changes(doc, patch_request.operations)
+
+            if doc is None:
+                # Nothing to patch yet: only adds can create the document
+                if not changes["added"]:
+                    raise HTTPException(status_code=404, detail="Skills not found for this user")
+                await store_user_skills(
+                    user_id, [SkillWithLevel(**s) for s in changes["skills"]]
+                )
+            elif changes["added"] or changes["removed"] or changes["updated"]:
+                await run_in_threadpool(skills_store.apply_changes, user_id, changes)
+                skills_cache.invalidate(user_id)
+                await run_in_threadpool(record_skill_change, user_id, changes["skills"])
+
+        return {
+            "message": "Skills updated successfully",
+            "user_id": user_id,
+            "added": [c["skill"] for c in changes["added"]],
+            "removed": [c["skill"] for c in changes["removed"]],
+            "updated": [c["skill"] for c in changes["updated"]],
+            "skills_count": len(changes["skills"]),
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error updating skills: {str(e)}")
+
+# Merge newly extracted skills into a user's saved skills
+def merge_extracted_skills(existing: List[dict], extracted: List[CategorizedSkill]) -> List[SkillWithLevel]:
+    """
+    Add extracted skills the user doesn't have yet. Skills the user already saved
+    keep their level, since it may have been set by hand on the skills page.
+    """
+    merged = [SkillWithLevel(skill=s["skill"], level=s["level"]) for s in existing]
+    known = {s.skill.lower() for s in merged}
+    for skill_obj in extracted:
+        if skill_obj.skill.lower() not in known:
+            merged.append(SkillWithLevel(skill=skill_obj.skill, level=skill_obj.level))
+            known.add(skill_obj.skill.lower())
+    return merged
+
+# Resume-to-skills pipeline: upload -> text extraction -> skill extraction -> optional save
+@app.post("/api/resumes/pipeline")
+async def resume_pipeline(
+    resume: UploadFile = File(...),
+    user_id: Optional[str] = Form(None),
+    save: bool = Form(False),
+    include_text: bool = Form(False),
+):
+    """
+    Run the whole resume flow server-side and stream progress as NDJSON events.
+
+    Each stage emits one event with its status and elapsed time in milliseconds.
+    The final "complete" event carries the extracted skills, per-stage timings and,
+    only when include_text is set, the full resume text.
+    """
+    if save and not user_id:
+        raise HTTPException(status_code=400, detail="user_id is required when save is true")
+    
+    # Validate and store the upload before streaming so bad files still get a 400
+    upload_started = time.perf_counter()
+    filename, file_path, content = await save_resume_upload(resume)
+    upload_ms = (time.perf_counter() - upload_started) * 1000
+    
+    async def events():
+        timings = {"upload": round(upload_ms, 2)}
+        yield json.dumps({
+            "stage": "upload",
+            "status": "done",
+            "elapsed_ms": timings["upload"],
+            "filename": filename,
+            "size": len(content)
+        }) + "\n"
+        
+        stage = "extract"
+        try:
+            started = time.perf_counter()
+            txt_filename, txt_path, resume_text = await run_in_threadpool(
+                convert_resume_to_text, filename, file_path
+            )
+            timings[stage] = round((time.perf_counter() - started) * 1000, 2)
+            yield json.dumps({
+                "stage": stage,
+                "status": "done",
+                "elapsed_ms": timings[stage],
+                "txt_filename": txt_filename,
+                "text_length": len(resume_text)
+            }) + "\n"
+            
+            stage = "skills"
+            started = time.perf_counter()
+            reuse_report = None
+            if not resume_text.strip():
+                categorized_skills = []
+            elif user_id:
+                categorized_skills, reuse_report = await extract_skills_with_reuse(user_id, resume_text)
+            else:
+                categorized_skills = await process_text_with_gemini(resume_text)
+            categories_dict: Dict[str, List[str]] = {}
+            for skill_obj in categorized_skills:
+                categories_dict.setdefault(skill_obj.category, [])
+                if skill_obj.skill not in categories_dict[skill_obj.category]:
+                    categories_dict[skill_obj.category].append(skill_obj.skill)
+            timings[stage] = round((time.perf_counter() - started) * 1000, 2)
+            yield json.dumps({
+                "stage": stage,
+                "status": "done",
+                "elapsed_ms": timings[stage],
+                "skills_count": len(categorized_skills),
+                "reuse": reuse_report
+            }) + "\n"
+
+            saved_count = None
+            if save:
+                stage = "save"
+                started = time.perf_counter()
+                async with user_skills_lock(user_id):
+                    # Merge into the stored document, not a cached copy or one a pending save replaces
+                    await skills_writer.flush_key(user_id)
+                    existing = await run_in_threadpool(skills_store.get_for_update, user_id)
+                    merged = merge_extracted_skills((existing or {}).get("skills", []), categorized_skills)
+                    skills_data, _ = await store_user_skills(user_id, merged)
+                saved_count = len(skills_data)
+                timings[stage] = round((time.perf_counter() - started) * 1000, 2)
+                yield json.dumps({
+                    "stage": stage,
+                    "status": "done",
+                    "elapsed_ms": timings[stage],
+                    "skills_count": saved_count
+                }) + "\n"
+            
+            result = {
+                "stage": "complete",
+                "status": "done",
+                "timings": timings,
+                "total_ms": round(sum(timings.values()), 2),
+                "original_filename": filename,
+                "txt_filename": txt_filename,
+                "text_length": len(resume_text),
+                "skills": [skill.model_dump() for skill in categorized_skills],
+                "categories": categories_dict,
+                "saved_skills_count": saved_count
+            }
+            if include_text:
+                result["text"] = resume_text
+            yield json.dumps(result) + "\n"
+        except Exception as e:
+            yield json.dumps({"stage": stage, "status": "error", "detail": str(e)}) + "\n"
+    
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+# Rank all positions for a user by skill coverage
+@app.get("/api/positions/match/{user_id}")
+async def match_positions(user_id: str, k: int = 10, industry: Optional[str] = None):
+    """
+    Score the user's saved skills against every position at once and return the
+    top k by level-weighted coverage, each with its matching and missing skills.
+    """
+    if k < 1 or k > 100:
+        raise HTTPException(status_code=400, detail="k must be between 1 and 100")
+    try:
+        skills_doc = await run_in_threadpool(load_user_skills, user_id)
+        if skills_doc is None:
+            raise HTTPException(status_code=404, detail="Skills not found for this user")
+
+        started = time.perf_counter()
+        matches = position_matcher.top_matches(skills_doc.get("skills", []), k=k, industry=industry)
+        return {
+            "user_id": user_id,
+            "positions": position_matcher.position_count,
+            "matches": matches,
+            "took_ms": round((time.perf_counter() - started) * 1000, 3),
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error matching positions: {str(e)}")
+
+# Full-text search over resumes and transcriptions
+@app.get("/api/search")
+async def search_documents(q: str, kind: Optional[str] = None, limit: int = 20, offset: int = 0):
+    """
+    Search extracted resume text and transcriptions.
+
+    Supports FTS5 query syntax: plain terms (all must match), "quoted phrases",
+    OR/NOT and prefix* queries. Results are ranked by BM25 and include a snippet.
+    """
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="Query parameter q is required")
+    if kind is not None and kind not in (KIND_RESUME, KIND_TRANSCRIPT):
+        raise HTTPException(status_code=400, detail=f"kind must be '{KIND_RESUME}' or '{KIND_TRANSCRIPT}'")
+    limit = max(1, min(limit, 100))
+    try:
+        started = time.perf_counter()
+        results, total = await run_in_threadpool(search_index.search, q, kind, limit, max(0, offset))
+        return {
+            "query": q,
+            "total": total,
+            "results": results,
+            "took_ms": round((time.perf_counter() - started) * 1000, 2)
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error searching documents: {str(e)}")
+
 # LinkedIn OAuth Configuration
 LINKEDIN_CLIENT_ID = os.getenv("LINKEDIN_CLIENT_ID", "")
 LINKEDIN_CLIENT_SECRET = os.getenv("LINKEDIN_CLIENT_SECRET", "")
 LINKEDIN_REDIRECT_URI = os.getenv("LINKEDIN_REDIRECT_URI", "http://localhost:8000/api/linkedin/callback")
 LINKEDIN_SCOPE = "openid profile email"  # OpenID Connect scopes (required for email access)
+# Overridable so a local fake LinkedIn server can stand in during tests
+LINKEDIN_OAUTH_BASE = os.getenv("LINKEDIN_OAUTH_BASE", "https://www.linkedin.com").rstrip("/")
+LINKEDIN_API_BASE = os.getenv("LINKEDIN_API_BASE", "https://api.linkedin.com").rstrip("/")
 
 # LinkedIn OAuth - Get authorization URL
 @app.get("/api/linkedin/authorize")
@@ -1143,13 +2237,95 @@ async def linkedin_authorize():
         "scope": LINKEDIN_SCOPE,
     }
     
-    auth_url = f"https://www.linkedin.com/oauth/v2/authorization?{urlencode(params)}"
+    auth_url = f"{LINKEDIN_OAUTH_BASE}/oauth/v2/authorization?{urlencode(params)}"
     
     return {
         "auth_url": auth_url,
         "state": state
     }
 
+# Fetch and normalize a LinkedIn profile: OpenID Connect userinfo, falling back to the v2 API
+async def fetch_linkedin_profile(access_token: str, etag: Optional[str] = None):
+    """
+    Returns (status, profile, etag). status is "ok" with a normalized profile,
+    "not_modified" when userinfo answered 304 to the cached ETag, or "failed".
+    """
+    # Get user profile from LinkedIn using OpenID Connect userinfo endpoint
+    userinfo_url = f"{LINKEDIN_API_BASE}/v2/userinfo"
+    profile_headers = {"Authorization": f"Bearer {access_token}"}
+    userinfo_headers = {**profile_headers, "If-None-Match": etag} if etag else profile_headers
+    profile_response = await http_client.get(userinfo_url, headers=userinfo_headers)
+    if profile_response.status_code == 304:
+        return "not_modified", None, etag
+    email_url = f"{LINKEDIN_API_BASE}/v2/emailAddress?q=members&projection=(elements*(handle~))"
+    picture_url = f"{LINKEDIN_API_BASE}/v2/me?projection=(id,firstName,lastName,profilePicture(displayImage~:playableStreams))"
+    email_response = picture_response = None
+    new_etag = profile_response.headers.get("etag")
+
+    if profile_response.status_code != 200:
+        # Fallback to v2 API if OpenID Connect fails; email and picture don't depend on
+        # the profile, so all three lookups share one round trip
+        profile_url = f"{LINKEDIN_API_BASE}/v2/me"
+        profile_response, email_response, picture_response = await asyncio.gather(
+            http_client.get(profile_url, headers=profile_headers),
+            http_client.get(email_url, headers=profile_headers),
+            http_client.get(picture_url, headers=profile_headers),
+            return_exceptions=True
+        )
+        if isinstance(profile_response, Exception):
+            raise profile_response
+        if profile_response.status_code != 200:
+            return "failed", None, None
+        new_etag = None
+
+    profile_data = profile_response.json()
+
+    # Extract data from OpenID Connect response (or fallback to v2 format)
+    # OpenID Connect format: { "sub": "id", "name": "Full Name", "given_name": "First", "family_name": "Last", "email": "email@example.com", "picture": "url" }
+    # v2 format: { "id": "id", "firstName": { "localized": {...} }, "lastName": { "localized": {...} } }
+
+    if "email" in profile_data:
+        # OpenID Connect format
+        return "ok", {
+            "linkedin_id": profile_data.get("sub", ""),
+            "name": profile_data.get("name", ""),
+            "first_name": profile_data.get("given_name", ""),
+            "last_name": profile_data.get("family_name", ""),
+            "email": profile_data.get("email", ""),
+            "profile_picture": profile_data.get("picture", ""),
+        }, new_etag
+
+    # v2 API format (fallback)
+    first_name = profile_data.get("firstName", {}).get("localized", {}).get("en_US", "")
+    last_name = profile_data.get("lastName", {}).get("localized", {}).get("en_US", "")
+    if email_response is None:
+        email_response, picture_response = await asyncio.gather(
+            http_client.get(email_url, headers=profile_headers),
+            http_client.get(picture_url, headers=profile_headers),
+            return_exceptions=True
+        )
+
+    # Email from v2 API, if that lookup succeeded
+    email_address = ""
+    if not isinstance(email_response, Exception) and email_response.status_code == 200:
+        email_data = email_response.json()
+        if "elements" in email_data and len(email_data["elements"]) > 0:
+            email_address = email_data["elements"][0].get("handle~", {}).get("emailAddress", "")
+
+    # Profile picture from v2 API, if that lookup succeeded
+    profile_picture = ""
+    if not isinstance(picture_response, Exception) and picture_response.status_code == 200:
+        profile_picture = largest_profile_picture(picture_response.json())
+
+    return "ok", {
+        "linkedin_id": profile_data.get("id", ""),
+        "name": f"{first_name} {last_name}".strip(),
+        "first_name": first_name,
+        "last_name": last_name,
+        "email": email_address,
+        "profile_picture": profile_picture,
+    }, new_etag
+
 # LinkedIn OAuth - Handle callback
 @app.get("/api/linkedin/callback")
 async def linkedin_callback(code: str, state: Optional[str] = None):
@@ -1170,7 +2346,7 @@ async def linkedin_callback(code: str, state: Optional[str] = None):
             """)
         
         # Exchange authorization code for access token
-        token_url = "https://www.linkedin.com/oauth/v2/accessToken"
+        token_url = f"{LINKEDIN_OAUTH_BASE}/oauth/v2/accessToken"
         token_data = {
             "grant_type": "authorization_code",
             "code": code,
@@ -1179,7 +2355,7 @@ async def linkedin_callback(code: str, state: Optional[str] = None):
             "client_secret": LINKEDIN_CLIENT_SECRET,
         }
         
-        token_response = requests.post(token_url, data=token_data, headers={"Content-Type": "application/x-www-form-urlencoded"})
+        token_response = await http_client.post(token_url, data=token_data, headers={"Content-Type": "application/x-www-form-urlencoded"})
         
         if token_response.status_code != 200:
             error_msg = token_response.text
@@ -1213,16 +2389,13 @@ async def linkedin_callback(code: str, state: Optional[str] = None):
                 </html>
             """)
         
-        # Get user profile from LinkedIn using OpenID Connect userinfo endpoint
-        userinfo_url = "https://api.linkedin.com/v2/userinfo"
-        profile_headers = {"Authorization": f"Bearer {access_token}"}
-        profile_response = requests.get(userinfo_url, headers=profile_headers)
-        
-        if profile_response.status_code != 200:
-            # Fallback to v2 API if OpenID Connect fails
-            profile_url = "https://api.linkedin.com/v2/me"
-            profile_response = requests.get(profile_url, headers=profile_headers)
-            if profile_response.status_code != 200:
+        # Reconnects find their cached profile through the id_token's member id
+        cached = await run_in_threadpool(linkedin_profiles.lookup, member_id_from_token(token_json))
+        if cached is not None and linkedin_profiles.is_fresh(cached):
+            profile = cached
+        else:
+            status, fetched, etag = await fetch_linkedin_profile(access_token, cached.get("etag") if cached else None)
+            if status == "failed":
                 return HTMLResponse("""
                     <html>
                         <body>
@@ -1235,60 +2408,21 @@ async def linkedin_callback(code: str, state: Optional[str] = None):
                         </body>
                     </html>
                 """)
-        
-        profile_data = profile_response.json()
-        
-        # Extract data from OpenID Connect response (or fallback to v2 format)
-        # OpenID Connect format: { "sub": "id", "name": "Full Name", "given_name": "First", "family_name": "Last", "email": "email@example.com", "picture": "url" }
-        # v2 format: { "id": "id", "firstName": { "localized": {...} }, "lastName": { "localized": {...} } }
-        
-        if "email" in profile_data:
-            # OpenID Connect format
-            email_address = profile_data.get("email", "")
-            full_name = profile_data.get("name", "")
-            first_name = profile_data.get("given_name", "")
-            last_name = profile_data.get("family_name", "")
-            profile_picture = profile_data.get("picture", "")
-            linkedin_id = profile_data.get("sub", "")
-        else:
-            # v2 API format (fallback)
-            email_address = ""
-            first_name = profile_data.get("firstName", {}).get("localized", {}).get("en_US", "")
-            last_name = profile_data.get("lastName", {}).get("localized", {}).get("en_US", "")
-            full_name = f"{first_name} {last_name}".strip()
-            linkedin_id = profile_data.get("id", "")
-            
-            # Try to get email from v2 API
-            email_url = "https://api.linkedin.com/v2/emailAddress?q=members&projection=(elements*(handle~))"
-            email_response = requests.get(email_url, headers=profile_headers)
-            if email_response.status_code == 200:
-                email_data = email_response.json()
-                if "elements" in email_data and len(email_data["elements"]) > 0:
-                    email_address = email_data["elements"][0].get("handle~", {}).get("emailAddress", "")
-            
-            # Try to get profile picture from v2 API
-            picture_url = "https://api.linkedin.com/v2/me?projection=(id,firstName,lastName,profilePicture(displayImage~:playableStreams))"
-            picture_response = requests.get(picture_url, headers=profile_headers)
-            profile_picture = ""
-            if picture_response.status_code == 200:
-                picture_data = picture_response.json()
-                if "profilePicture" in picture_data:
-                    display_image = picture_data["profilePicture"].get("displayImage~", {})
-                    elements = display_image.get("elements", [])
-                    if elements:
-                        # Get the largest image
-                        largest_image = max(elements, key=lambda x: x.get("data", {}).get("com.linkedin.digitalmedia.mediaartifact.StillImage", {}).get("storageSize", {}).get("width", 0))
-                        profile_picture = largest_image.get("identifiers", [{}])[0].get("identifier", "")
+            try:
+                if status == "not_modified":
+                    profile = await run_in_threadpool(linkedin_profiles.mark_not_modified, cached)
+                elif fetched["linkedin_id"]:
+                    profile = await run_in_threadpool(linkedin_profiles.save, fetched, etag)
+                else:
+                    profile = fetched
+            except Exception as e:
+                print(f"Warning: Could not cache LinkedIn profile: {e}")
+                profile = fetched or cached
         
         # Prepare response data
         linkedin_data = {
             "access_token": access_token,
-            "linkedin_id": linkedin_id,
-            "name": full_name,
-            "first_name": first_name,
-            "last_name": last_name,
-            "email": email_address,
-            "profile_picture": profile_picture,
+            **{field: profile.get(field, "") for field in PROFILE_FIELDS},
             "connected_at": datetime.now().isoformat(),
         }
         
@@ -1329,5 +2463,9 @@ async def linkedin_callback(code: str, state: Optional[str] = None):
             </html>
         """)
 
+startup_profile.mark("module init")
+
 if __name__ == "__main__":
+    import uvicorn
+
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,329 @@
+"""
+Metrics
+Prometheus-format counters and histograms for the hot paths, served at /metrics
+
+Observations are a bisect and a locked increment on a per-label-set child, so
+instrumented code can look its child up once and time every call for well
+under a microsecond of overhead.
+
+Each process keeps its own values. With METRICS_DIR set (serve.py sets it),
+every worker also writes its values to METRICS_DIR/metrics-<pid>.json every
+few seconds, and /metrics sums all of those files, so whichever worker
+answers the scrape reports the totals for the whole server.
+"""
+import glob
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; request latencies from sub-millisecond cache hits to slow uploads
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class _CounterChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+    def reset(self):
+        with self._lock:
+            self.value = 0.0
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum", "_lock")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # Per bucket, not cumulative; the last is +Inf
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def reset(self):
+        with self._lock:
+            self.counts = [0] * len(self.counts)
+            self.sum = 0.0
+
+    @contextmanager
+    def time(self):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values, **labels):
+        """The child for one label set; hot paths should keep it rather than look it up per call."""
+        key = tuple(str(v) for v in values) if values else tuple(str(labels[name]) for name in self.labelnames)
+        if len(key) != len(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}")
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def reset(self):
+        """Zero every child in place; instrumented code may hold on to them."""
+        for child in list(self._children.values()):
+            child.reset()
+
+    def state(self) -> dict:
+        return {
+            "type": self.kind,
+            "help": self.documentation,
+            "labelnames": list(self.labelnames),
+            "samples": {json.dumps(key): self._child_state(child) for key, child in list(self._children.items())},
+        }
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0, **labels):
+        self.labels(**labels).inc(amount)
+
+    def _child_state(self, child: _CounterChild):
+        return child.value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(float(b) for b in buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float, **labels):
+        self.labels(**labels).observe(value)
+
+    def time(self, **labels):
+        return self.labels(**labels).time()
+
+    def _child_state(self, child: _HistogramChild):
+        with child._lock:
+            return {"counts": list(child.counts), "sum": child.sum}
+
+    def state(self) -> dict:
+        return {**super().state(), "buckets": list(self.buckets)}
+
+
+class MetricsRegistry:
+    """
+    Metrics plus collectors: callables returning counter values that some
+    other component already keeps (cache stats), read at scrape time as
+    (name, help, labelnames, [(label values, value)]).
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], Iterable[tuple]]] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        existing = self._metrics.get(metric.name)
+        if existing is not None:
+            # Re-importing a module (tests, reloads) gets the metric it registered the first time
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def add_collector(self, collector: Callable[[], Iterable[tuple]]):
+        self._collectors.append(collector)
+
+    def after_fork(self):
+        """In a forked worker: start from zero rather than count the parent's values once per worker."""
+        for metric in self._metrics.values():
+            metric.reset()
+
+    def state(self) -> Dict[str, dict]:
+        """Every metric's current values, in a form that can be written to disk and summed."""
+        states = {name: metric.state() for name, metric in self._metrics.items()}
+        for collector in self._collectors:
+            try:
+                for name, documentation, labelnames, samples in collector():
+                    states[name] = {
+                        "type": "counter",
+                        "help": documentation,
+                        "labelnames": list(labelnames),
+                        "samples": {json.dumps([str(v) for v in values]): value for values, value in samples},
+                    }
+            except Exception as e:
+                print(f"Warning: Metrics collector failed: {e}")
+        return states
+
+    def write(self, directory: str):
+        """Publish this process's values for the other workers' /metrics (see METRICS_DIR)."""
+        path = os.path.join(directory, f"metrics-{os.getpid()}.json")
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.state(), f)
+        os.replace(tmp_path, path)
+
+    def render(self, directory: Optional[str] = None) -> str:
+        """Prometheus text format; with a directory, the sum of every process's published values."""
+        if directory is None:
+            return render_states([self.state()])
+        self.write(directory)
+        states = []
+        for path in glob.glob(os.path.join(directory, "metrics-*.json")):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    states.append(json.load(f))
+            except (OSError, ValueError):
+                continue  # A worker is replacing its file right now
+        return render_states(states)
+
+
+def merge_states(states: List[Dict[str, dict]]) -> Dict[str, dict]:
+    """Sum counters and histogram buckets across processes."""
+    merged: Dict[str, dict] = {}
+    for state in states:
+        for name, metric in state.items():
+            target = merged.setdefault(name, {**metric, "samples": {}})
+            for key, sample in metric["samples"].items():
+                current = target["samples"].get(key)
+                if current is None:
+                    target["samples"][key] = json.loads(json.dumps(sample))
+                elif metric["type"] == "histogram":
+                    if len(current["counts"]) == len(sample["counts"]):
+                        current["counts"] = [a + b for a, b in zip(current["counts"], sample["counts"])]
+                        current["sum"] += sample["sum"]
+                else:
+                    target["samples"][key] = current + sample
+    return merged
+
+
+def render_states(states: List[Dict[str, dict]]) -> str:
+    lines = []
+    for name, metric in sorted(merge_states(states).items()):
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        labelnames = metric["labelnames"]
+        for key, sample in sorted(metric["samples"].items()):
+            values = json.loads(key)
+            if metric["type"] == "histogram":
+                cumulative = 0
+                for bound, count in zip(metric["buckets"] + ["+Inf"], sample["counts"]):
+                    cumulative += count
+                    le = 'le="{}"'.format(bound if bound == "+Inf" else _format_value(bound))
+                    lines.append(f"{name}_bucket{_label_text(labelnames, values, le)} {cumulative}")
+                lines.append(f"{name}_sum{_label_text(labelnames, values)} {_format_value(sample['sum'])}")
+                lines.append(f"{name}_count{_label_text(labelnames, values)} {cumulative}")
+            else:
+                lines.append(f"{name}{_label_text(labelnames, values)} {_format_value(sample)}")
+    return "\n".join(lines) + "\n"
+
+
+# The registry behind /metrics; modules declare their metrics on it at import time
+REGISTRY = MetricsRegistry()
+
+
+def counter(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, documentation, labelnames))
+
+
+def histogram(name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+
+def instrument_methods(obj, methods: Iterable[str], metric: Histogram, **labels):
+    """Time each named method of obj into metric, labelled with op=<method name>."""
+    for method in methods:
+        original = getattr(obj, method, None)
+        if original is None:
+            continue
+        child = metric.labels(**labels, op=method)
+
+        def timed(*args, _original=original, _child=child, **kwargs):
+            started = time.perf_counter()
+            try:
+                return _original(*args, **kwargs)
+            finally:
+                _child.observe(time.perf_counter() - started)
+
+        setattr(obj, method, timed)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware timing every HTTP request until its last body byte is
+    sent, labelled by method, route template and status.
+    """
+
+    def __init__(self, app, metric: Histogram):
+        self.app = app
+        self.metric = metric
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = [500]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # Route templates, not raw paths, keep the label set bounded
+            route = scope.get("route")
+            self.metric.labels(scope["method"], getattr(route, "path", "unmatched"), str(status[0])).observe(
+                time.perf_counter() - started
+            )
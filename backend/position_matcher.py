@@ -0,0 +1,364 @@
+"""
+Position Matcher
+Scores a user's skills against every position in one vectorized NumPy pass
+
+Skill names are interned to integer ids. Positions are a sparse position x
+skill matrix in coordinate form: one flat array of skill ids and a parallel
+array of row numbers. Scoring a user gathers the user's per-skill level
+weights for every nonzero and sums them per row with np.bincount, covering
+all positions in a single pass.
+
+Changes are incremental: an edited position retires its old entries (they are
+pointed at the reserved skill id 0, whose weight is always 0) and appends its
+new ones, so a Firestore change costs work proportional to that one position.
+The arrays are compacted once retired entries outnumber live ones.
+"""
+import argparse
+import json
+import random
+import statistics
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from skill_index import SKILL_LEVELS, level_rank, skill_key
+
+# Credit a required skill gets for each level the user has it at
+LEVEL_WEIGHTS = np.array([0.4, 0.6, 0.8, 1.0], dtype=np.float32)
+
+POSITION_FIELDS = ("title", "industry", "company")
+RETIRED_SKILL = 0  # Skill id of retired entries; never assigned to a real skill
+MIN_COMPACT_ENTRIES = 4096
+
+
+def _grow(array: np.ndarray, size: int, fill=0) -> np.ndarray:
+    """Return array with room for at least size items, doubling its capacity."""
+    if size <= len(array):
+        return array
+    grown = np.full(max(size, 2 * len(array)), fill, dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+
+class PositionMatcher:
+    """Sparse position x skill matrix with incremental row updates. Thread-safe."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._skill_ids: Dict[str, int] = {}
+        self._skill_names: List[str] = ["(retired)"]
+        self._industries: Dict[str, int] = {}
+
+        self._rows: Dict[str, int] = {}  # position id -> row
+        self._row_ids: List[Optional[str]] = []  # row -> position id (None once deleted)
+        self._row_meta: List[Optional[dict]] = []
+        self._row_skills: List[np.ndarray] = []  # row -> required skill ids
+        self._row_spans: List[Tuple[int, int]] = []  # row -> (first entry, entry count)
+        self._free_rows: List[int] = []
+        self._counts = np.zeros(64, dtype=np.float32)  # Required skills per row (0 = no position)
+        self._row_industry = np.full(64, -1, dtype=np.int32)
+
+        self._skills = np.zeros(1024, dtype=np.int32)  # Entry -> skill id
+        self._entry_rows = np.zeros(1024, dtype=np.int32)  # Entry -> row
+        self._entries = 0
+        self._retired = 0
+        self._listeners: List[Callable[[Optional[List[str]], Optional[List[str]]], None]] = []
+
+    def _skill_id(self, skill: str) -> int:
+        key = skill_key(skill)
+        skill_id = self._skill_ids.get(key)
+        if skill_id is None:
+            skill_id = len(self._skill_names)
+            self._skill_ids[key] = skill_id
+            self._skill_names.append(skill.strip())
+        return skill_id
+
+    def _industry_id(self, industry: str) -> int:
+        return self._industries.setdefault(industry.strip().lower(), len(self._industries))
+
+    @property
+    def position_count(self) -> int:
+        return len(self._rows)
+
+    def upsert(self, position_id: str, doc: dict):
+        """Add or replace one position ({title, industry, requiredSkills, ...})."""
+        with self._lock:
+            # Deduplicated, in the order the position lists them
+            ids = np.array(
+                list(dict.fromkeys(self._skill_id(s) for s in doc.get("requiredSkills") or [] if s and s.strip())),
+                dtype=np.int32,
+            )
+            row = self._rows.get(position_id)
+            if row is None:
+                row = self._allocate_row(position_id)
+                previous = None
+            else:
+                previous = self._required_names(row)
+                self._retire_row(row)
+
+            start = self._entries
+            self._entries += len(ids)
+            self._skills = _grow(self._skills, self._entries)
+            self._entry_rows = _grow(self._entry_rows, self._entries)
+            self._skills[start:self._entries] = ids
+            self._entry_rows[start:self._entries] = row
+
+            self._row_skills[row] = ids
+            self._row_spans[row] = (start, len(ids))
+            self._row_meta[row] = {field: doc.get(field) for field in POSITION_FIELDS}
+            self._counts[row] = len(ids)
+            self._row_industry[row] = self._industry_id(doc.get("industry") or "")
+            self._maybe_compact()
+            current = self._required_names(row)
+        self._notify(previous, current)
+
+    def remove(self, position_id: str):
+        with self._lock:
+            row = self._rows.pop(position_id, None)
+            if row is None:
+                return
+            previous = self._required_names(row)
+            self._retire_row(row)
+            self._row_ids[row] = None
+            self._row_meta[row] = None
+            self._row_skills[row] = np.empty(0, dtype=np.int32)
+            self._row_spans[row] = (0, 0)
+            self._counts[row] = 0
+            self._row_industry[row] = -1
+            self._free_rows.append(row)
+            self._maybe_compact()
+        self._notify(previous, None)
+
+    def add_listener(self, listener: Callable[[Optional[List[str]], Optional[List[str]]], None]):
+        """Call listener(old_required, new_required) after every change; None means added/removed."""
+        self._listeners.append(listener)
+
+    def _notify(self, previous: Optional[List[str]], current: Optional[List[str]]):
+        for listener in self._listeners:
+            try:
+                listener(previous, current)
+            except Exception as e:
+                print(f"Position change listener failed: {e}")
+
+    def _required_names(self, row: int) -> List[str]:
+        return [self._skill_names[i] for i in self._row_skills[row]]
+
+    def _allocate_row(self, position_id: str) -> int:
+        if self._free_rows:
+            row = self._free_rows.pop()
+            self._row_ids[row] = position_id
+        else:
+            row = len(self._row_ids)
+            self._row_ids.append(position_id)
+            self._row_meta.append(None)
+            self._row_skills.append(np.empty(0, dtype=np.int32))
+            self._row_spans.append((0, 0))
+            self._counts = _grow(self._counts, row + 1)
+            self._row_industry = _grow(self._row_industry, row + 1, fill=-1)
+        self._rows[position_id] = row
+        return row
+
+    def _retire_row(self, row: int):
+        start, length = self._row_spans[row]
+        self._skills[start:start + length] = RETIRED_SKILL
+        self._retired += length
+
+    def _maybe_compact(self):
+        """Drop retired entries once they outnumber live ones."""
+        if self._retired < MIN_COMPACT_ENTRIES or self._retired * 2 < self._entries:
+            return
+        self._entries, self._retired = 0, 0
+        for row, ids in enumerate(self._row_skills):
+            start = self._entries
+            self._entries += len(ids)
+            self._skills[start:self._entries] = ids
+            self._entry_rows[start:self._entries] = row
+            self._row_spans[row] = (start, len(ids))
+
+    def load(self, positions: Iterable[Tuple[str, dict]]) -> int:
+        """Bulk upsert (position_id, doc) pairs; returns the number of positions."""
+        for position_id, doc in positions:
+            self.upsert(position_id, doc)
+        return self.position_count
+
+    def encode_user(self, skills: List[dict]) -> np.ndarray:
+        """Per-skill-id level weight vector for a user (0 for skills no position requires)."""
+        weights = np.zeros(len(self._skill_names), dtype=np.float32)
+        for s in skills:
+            skill_id = self._skill_ids.get(skill_key(s.get("skill", "")))
+            if skill_id is not None:
+                weights[skill_id] = max(weights[skill_id], LEVEL_WEIGHTS[level_rank(s.get("level"))])
+        return weights
+
+    def _score_locked(self, weights: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        rows = len(self._row_ids)
+        counts = self._counts[:rows]
+        gathered = weights[self._skills[:self._entries]]
+        entry_rows = self._entry_rows[:self._entries]
+        weighted = np.bincount(entry_rows, weights=gathered, minlength=rows)
+        matched = np.bincount(entry_rows, weights=gathered > 0, minlength=rows)
+        has_skills = counts > 0
+        score = np.divide(weighted, counts, out=np.zeros(rows), where=has_skills)
+        coverage = np.divide(matched, counts, out=np.zeros(rows), where=has_skills)
+        return coverage, score, has_skills
+
+    def score(self, skills: List[dict]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (coverage, score) for every row: coverage is the share of required skills
+        the user has, score the same share weighted by the user's level.
+        """
+        with self._lock:
+            coverage, score, _ = self._score_locked(self.encode_user(skills))
+        return coverage, score
+
+    def top_matches(self, skills: List[dict], k: int = 10, industry: Optional[str] = None) -> List[dict]:
+        """Best k positions for a user by level-weighted coverage, with missing skills."""
+        with self._lock:
+            weights = self.encode_user(skills)
+            coverage, score, eligible = self._score_locked(weights)
+            if industry:
+                industry_id = self._industries.get(industry.strip().lower(), -2)
+                eligible &= self._row_industry[:len(self._row_ids)] == industry_id
+            candidates = np.flatnonzero(eligible)
+            if not len(candidates):
+                return []
+
+            k = min(k, len(candidates))
+            # Rank by score, then coverage; argpartition keeps this O(positions) before the final sort
+            ranking = score + coverage * 1e-3
+            top = candidates[np.argpartition(-ranking[candidates], k - 1)[:k]]
+            top = top[np.argsort(-ranking[top], kind="stable")]
+
+            matches = []
+            for row in top:
+                meta, required = self._row_meta[row], self._row_skills[row]
+                matches.append({
+                    "position_id": self._row_ids[row],
+                    **meta,
+                    "coverage": round(float(coverage[row]), 4),
+                    "score": round(float(score[row]), 4),
+                    "matching_skills": [self._skill_names[i] for i in required if weights[i] > 0],
+                    "missing_skills": [self._skill_names[i] for i in required if weights[i] == 0],
+                })
+            return matches
+
+    def watch_firestore(self, client):
+        """
+        Load the positions collection and keep the matrix in sync with it through a
+        Firestore snapshot listener; only changed documents are re-encoded.
+        Returns the watch, whose unsubscribe() stops the listener.
+        """
+        ready = threading.Event()
+
+        def on_snapshot(_, changes, __):
+            for change in changes:
+                if change.type.name == "REMOVED":
+                    self.remove(change.document.id)
+                else:
+                    self.upsert(change.document.id, change.document.to_dict() or {})
+            ready.set()
+
+        watch = client.collection("positions").on_snapshot(on_snapshot)
+        # The first snapshot delivers every existing position as ADDED
+        ready.wait(timeout=30)
+        return watch
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            live = self._entries - self._retired
+            return {
+                "positions": self.position_count,
+                "skills": len(self._skill_names) - 1,
+                "nonzeros": live,
+                "retired_entries": self._retired,
+                "avg_required_skills": round(live / self.position_count, 2) if self.position_count else 0.0,
+            }
+
+
+def load_positions_file(path: str) -> List[Tuple[str, dict]]:
+    """Read positions from a JSON list (or {id: doc} object) for running without Firestore."""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        return list(data.items())
+    return [(str(doc.get("id", i)), doc) for i, doc in enumerate(data)]
+
+
+# Benchmark with synthetic positions: python position_matcher.py --positions 10000
+def synthetic_positions(positions: int, skills: int, seed: int) -> Iterable[Tuple[str, dict]]:
+    rng = random.Random(seed)
+    names = [f"Skill{i}" for i in range(skills)]
+    weights = [1 / (i + 1) ** 0.7 for i in range(skills)]
+    industries = ["Software Engineering", "Data Science", "DevOps", "Security", "Design", "Product"]
+    for n in range(positions):
+        yield f"pos{n}", {
+            "title": f"Position {n}",
+            "industry": rng.choice(industries),
+            "requiredSkills": sorted(set(rng.choices(names, weights=weights, k=rng.randint(4, 12)))),
+        }
+
+
+def _naive_match(positions: List[Tuple[str, dict]], user_skills: List[str]) -> List[float]:
+    """The per-position loop the skill-gap pages run client-side, for comparison."""
+    user_lower = [s.lower().strip() for s in user_skills]
+    scores = []
+    for _, doc in positions:
+        required = doc["requiredSkills"]
+        matching = [s for s in required if s.lower().strip() in user_lower]
+        scores.append(len(matching) / len(required) if required else 0.0)
+    return scores
+
+
+def _bench(args):
+    positions = list(synthetic_positions(args.positions, args.skills, args.seed))
+    matcher = PositionMatcher()
+    started = time.perf_counter()
+    matcher.load(positions)
+    print(f"loaded {matcher.position_count} positions in {(time.perf_counter() - started) * 1000:.0f}ms")
+    print(matcher.stats())
+
+    rng = random.Random(args.seed + 1)
+    users = [
+        [{"skill": f"Skill{rng.randrange(args.skills)}", "level": rng.choice(SKILL_LEVELS)} for _ in range(rng.randint(5, 25))]
+        for _ in range(args.runs)
+    ]
+
+    def timed(fn) -> List[float]:
+        times = []
+        for user in users:
+            t0 = time.perf_counter()
+            fn(user)
+            times.append((time.perf_counter() - t0) * 1000)
+        return sorted(times)
+
+    def report(name: str, times: List[float]):
+        print(f"{name:28} p50={statistics.median(times):8.3f}ms p95={times[int(len(times) * 0.95) - 1]:8.3f}ms")
+
+    report("score all positions", timed(matcher.score))
+    report("top 10 with missing skills", timed(lambda u: matcher.top_matches(u, k=10)))
+    report("top 10 in one industry", timed(lambda u: matcher.top_matches(u, k=10, industry="DevOps")))
+    report("naive per-position loop", timed(lambda u: _naive_match(positions, [s["skill"] for s in u])))
+
+    # Incremental refresh: one position changes and is immediately visible to the next query
+    times = []
+    for n in range(args.runs):
+        position_id, doc = positions[rng.randrange(len(positions))]
+        t0 = time.perf_counter()
+        matcher.upsert(position_id, {**doc, "requiredSkills": doc["requiredSkills"][:-1] + [f"Skill{n}"]})
+        times.append((time.perf_counter() - t0) * 1000)
+    report("update one position", sorted(times))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the position matcher with synthetic positions")
+    parser.add_argument("--positions", type=int, default=10000)
+    parser.add_argument("--skills", type=int, default=2000, help="Taxonomy size")
+    parser.add_argument("--runs", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=11)
+    _bench(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,323 @@
+"""
+Request Profiling
+Opt-in sampling profiles of single requests, kept in a bounded on-disk ring buffer
+
+A request is profiled when it carries X-Profile-Token matching PROFILE_TOKEN,
+or once it has been running for PROFILE_SLOW_MS. One sampler thread sleeps
+until then, so requests that are neither flagged nor slow cost a dict insert
+and a delete. Slow captures start sampling when the threshold is crossed and
+show where the request is stuck, not its first PROFILE_SLOW_MS.
+
+Each sample is a wall-clock stack for the request:
+    - its frames on the event loop thread, while its task is the one running
+    - its coroutine await chain under [awaiting], while it is suspended
+    - busy threadpool threads running app code, under [threadpool] (blocking work the
+      request handed to run_in_threadpool; under concurrency this can include other requests')
+
+Captures are written as folded stacks (flamegraph.pl, speedscope, inferno) plus
+a JSON summary with the top functions by self and total samples.
+"""
+import asyncio
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+PROFILE_HEADER = b"x-profile-token"
+MAX_STACK_DEPTH = 128
+TOP_FUNCTIONS = 25
+
+# Frames from this directory are the app's own code (used to spot busy pool threads)
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+# Name of the threads run_in_threadpool runs blocking work on
+POOL_THREAD_NAME = "AnyIO worker thread"
+
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _frames_stack(frame) -> List[str]:
+    """Root-first labels for a thread's frame chain."""
+    stack = []
+    while frame is not None and len(stack) < MAX_STACK_DEPTH:
+        stack.append(_frame_label(frame.f_code))
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+def _await_chain(coro) -> List[str]:
+    """Outermost-first labels of a suspended coroutine and everything it awaits."""
+    stack = []
+    while coro is not None and len(stack) < MAX_STACK_DEPTH:
+        frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+        if frame is None:
+            break
+        stack.append(_frame_label(frame.f_code))
+        coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+    return stack
+
+
+def _is_app_frame(frame) -> bool:
+    while frame is not None:
+        if frame.f_code.co_filename.startswith(APP_DIR) and "site-packages" not in frame.f_code.co_filename:
+            return True
+        frame = frame.f_back
+    return False
+
+
+class ActiveRequest:
+    __slots__ = ("number", "created", "method", "path", "started", "sample_from", "forced",
+                 "task", "loop", "loop_thread", "samples", "sample_count")
+
+    def __init__(self, number: int, method: str, path: str, forced: bool, sample_from: float):
+        self.number = number
+        self.created = time.time()
+        self.method = method
+        self.path = path
+        self.started = time.perf_counter()
+        self.sample_from = self.started if forced else sample_from
+        self.forced = forced
+        self.task = asyncio.current_task()
+        self.loop = asyncio.get_running_loop()
+        self.loop_thread = threading.get_ident()
+        self.samples: Counter = Counter()
+        self.sample_count = 0
+
+    @property
+    def capture_id(self) -> str:
+        """Sortable by time; only formatted for requests that get captured."""
+        return f"{time.strftime('%Y%m%d_%H%M%S', time.localtime(self.created))}-{os.getpid()}-{self.number}"
+
+
+class RequestProfiler:
+    """Sampler thread plus the ring buffer of finished captures."""
+
+    def __init__(
+        self,
+        directory: str,
+        token: Optional[str] = None,
+        slow_ms: float = 0,
+        interval_ms: float = 5,
+        keep: int = 50,
+    ):
+        self.directory = directory
+        self.token = token.encode() if token else None
+        self.slow_seconds = slow_ms / 1000
+        self.interval = interval_ms / 1000
+        self.keep = keep
+        self._active: Dict[int, ActiveRequest] = {}
+        self._cond = threading.Condition()
+        self._ids = itertools.count(1)
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.token or self.slow_seconds)
+
+    def authorized(self, token: Optional[bytes]) -> bool:
+        return bool(self.token) and token == self.token
+
+    # Request side: called on the event loop thread by ProfilingMiddleware
+
+    def begin(self, method: str, path: str, forced: bool) -> ActiveRequest:
+        request = ActiveRequest(next(self._ids), method, path, forced, time.perf_counter() + self.slow_seconds)
+        with self._cond:
+            self._active[request.number] = request
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+                self._thread.start()
+            # The sampler only needs waking if it is idle or this request is sampled right away
+            if forced or len(self._active) == 1:
+                self._cond.notify()
+        return request
+
+    def end(self, request: ActiveRequest) -> bool:
+        """Stop sampling the request; True when it has samples worth saving."""
+        with self._cond:
+            self._active.pop(request.number, None)
+        return request.sample_count > 0
+
+    # Sampler thread
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._stopping:
+                        return
+                    now = time.perf_counter()
+                    due = [r for r in self._active.values() if r.sample_from <= now]
+                    if due:
+                        break
+                    upcoming = min((r.sample_from for r in self._active.values()), default=None)
+                    self._cond.wait(None if upcoming is None else upcoming - now)
+            try:
+                self._sample(due)
+            except Exception as e:
+                print(f"Warning: Request profiler sample failed: {e}")
+            time.sleep(self.interval)
+
+    def _sample(self, requests: List[ActiveRequest]):
+        frames = sys._current_frames()
+        pool_threads = {t.ident for t in threading.enumerate() if t.name == POOL_THREAD_NAME}
+        # Idle pool threads wait inside anyio; busy ones are running app code
+        pool_stacks = [
+            tuple(["[threadpool]"] + _frames_stack(frame))
+            for thread_id, frame in frames.items()
+            if thread_id in pool_threads and _is_app_frame(frame)
+        ]
+        for request in requests:
+            stack = None
+            if request.task is not None and asyncio.current_task(request.loop) is request.task:
+                loop_frame = frames.get(request.loop_thread)
+                if loop_frame is not None:
+                    stack = tuple(_frames_stack(loop_frame))
+            elif request.task is not None:
+                try:
+                    chain = _await_chain(request.task.get_coro())
+                except Exception:
+                    chain = []  # The loop resumed the task mid-walk
+                stack = tuple(["[awaiting]"] + chain)
+            if stack:
+                request.samples[stack] += 1
+            for pool_stack in pool_stacks:
+                request.samples[pool_stack] += 1
+            request.sample_count += 1
+
+    def close(self):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+
+    # Ring buffer
+
+    def save(self, request: ActiveRequest, status: int, duration: float) -> dict:
+        """Write the capture's folded stacks and summary, then drop the oldest captures past keep."""
+        os.makedirs(self.directory, exist_ok=True)
+        capture_id = request.capture_id
+        self_counts: Counter = Counter()
+        total_counts: Counter = Counter()
+        for stack, count in request.samples.items():
+            self_counts[stack[-1]] += count
+            for label in set(stack):
+                total_counts[label] += count
+        meta = {
+            "id": capture_id,
+            "method": request.method,
+            "path": request.path,
+            "status": status,
+            "trigger": "header" if request.forced else "slow",
+            "duration_ms": round(duration * 1000, 1),
+            "sampled_ms": round(max(0.0, request.started + duration - request.sample_from) * 1000, 1),
+            "samples": request.sample_count,
+            "interval_ms": self.interval * 1000,
+            "created_at": request.created,
+            "top_self": self_counts.most_common(TOP_FUNCTIONS),
+            "top_total": total_counts.most_common(TOP_FUNCTIONS),
+        }
+        base = os.path.join(self.directory, capture_id)
+        with open(base + ".folded", "w", encoding="utf-8") as f:
+            for stack, count in request.samples.most_common():
+                f.write(f"{';'.join(label.replace(';', ':') for label in stack)} {count}\n")
+        with open(base + ".json.tmp", "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(base + ".json.tmp", base + ".json")
+        self._prune()
+        return meta
+
+    def _prune(self):
+        metas = sorted(name for name in os.listdir(self.directory) if name.endswith(".json"))
+        for name in metas[:max(0, len(metas) - self.keep)]:
+            for suffix in (".json", ".folded"):
+                try:
+                    os.remove(os.path.join(self.directory, name[:-5] + suffix))
+                except FileNotFoundError:
+                    pass  # Another worker pruned it first
+
+    def list_captures(self) -> List[dict]:
+        """Summaries of the captures in the ring buffer, newest first."""
+        if not os.path.isdir(self.directory):
+            return []
+        captures = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.directory, name), "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                continue
+            captures.append({key: value for key, value in meta.items() if key not in ("top_self", "top_total")})
+        captures.sort(key=lambda meta: meta["created_at"], reverse=True)
+        return captures
+
+    def capture_path(self, capture_id: str, suffix: str) -> Optional[str]:
+        """Path of a capture file, or None; ids never contain path separators."""
+        if os.sep in capture_id or "/" in capture_id or capture_id.startswith("."):
+            return None
+        path = os.path.join(self.directory, capture_id + suffix)
+        return path if os.path.exists(path) else None
+
+
+class ProfilingMiddleware:
+    """ASGI middleware starting and saving request captures; profiled responses get X-Profile-Id."""
+
+    def __init__(self, app, profiler: RequestProfiler, exclude_prefixes=("/api/profiles", "/metrics", "/health")):
+        self.app = app
+        self.profiler = profiler
+        self.exclude_prefixes = exclude_prefixes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.profiler.enabled or scope["path"].startswith(self.exclude_prefixes):
+            await self.app(scope, receive, send)
+            return
+        token = dict(scope["headers"]).get(PROFILE_HEADER)
+        forced = token is not None and self.profiler.authorized(token)
+        if not forced and not self.profiler.slow_seconds:
+            await self.app(scope, receive, send)
+            return
+
+        request = self.profiler.begin(scope["method"], scope["path"], forced)
+        capture_id = request.capture_id if forced else None
+        status = [500]
+
+        async def send_with_capture_id(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                if forced:
+                    message = {**message, "headers": list(message.get("headers", [])) + [
+                        (b"x-profile-id", capture_id.encode())
+                    ]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_capture_id)
+        finally:
+            if self.profiler.end(request):
+                try:
+                    await asyncio.get_running_loop().run_in_executor(
+                        None, self.profiler.save, request, status[0], time.perf_counter() - request.started
+                    )
+                except Exception as e:
+                    print(f"Warning: Could not save request profile: {e}")
+
+
+def create_request_profiler(base_dir: str) -> RequestProfiler:
+    """
+    Build the profiler from PROFILE_TOKEN, PROFILE_SLOW_MS (0 disables slow
+    captures), PROFILE_INTERVAL_MS, PROFILE_KEEP and PROFILE_DIR.
+    """
+    return RequestProfiler(
+        directory=os.getenv("PROFILE_DIR", os.path.join(base_dir, "profiles")),
+        token=os.getenv("PROFILE_TOKEN") or None,
+        slow_ms=float(os.getenv("PROFILE_SLOW_MS", "0")),
+        interval_ms=float(os.getenv("PROFILE_INTERVAL_MS", "5")),
+        keep=int(os.getenv("PROFILE_KEEP", "50")),
+    )
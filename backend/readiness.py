@@ -0,0 +1,156 @@
+"""
+Readiness
+Circuit breakers, cached dependency probes and thread pool state behind /health/ready
+
+/health only says the process is up. /health/ready says whether this replica
+should get traffic right now: it answers 503 while the replica is saturated or
+cannot reach its storage backend, so the load balancer shifts traffic to the
+other replicas until it recovers. Probes are cached for a few seconds, so a
+load balancer polling every replica often does not multiply storage reads.
+"""
+import asyncio
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from anyio.to_thread import current_default_thread_limiter
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Closed until failure_threshold calls in a row fail, then open for
+    reset_seconds: allow() refuses calls so callers take their fallback at once
+    instead of waiting on a failing service. After that a single trial call is
+    let through (half open); its success closes the breaker, its failure opens
+    it again.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_seconds: float = 30.0):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_seconds = reset_seconds
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+        self._stats = {"successes": 0, "failures": 0, "rejected": 0, "opened": 0}
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self.state = HALF_OPEN
+                self._trial_running = False
+            if self.state == HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return True
+            self._stats["rejected"] += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._stats["successes"] += 1
+            self.consecutive_failures = 0
+            self.state = CLOSED
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._stats["failures"] += 1
+            self.consecutive_failures += 1
+            if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    self._stats["opened"] += 1
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+                self._trial_running = False
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            retry_in = None
+            if self.state == OPEN:
+                retry_in = round(max(0.0, self.reset_seconds - (time.monotonic() - self.opened_at)), 1)
+            return {
+                **self._stats,
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "failure_threshold": self.failure_threshold,
+                "retry_in_seconds": retry_in,
+            }
+
+
+class CachedProbe:
+    """
+    A blocking reachability check run at most once per ttl seconds, with the
+    outcome and latency of the last run reported in between. Checks run on the
+    event loop's default executor, not the request threadpool, so a saturated
+    pool cannot hold up the probe; one still running after timeout seconds
+    counts as failed, and is waited on rather than started again.
+    """
+
+    def __init__(self, name: str, check: Callable[[], None], ttl: float = 5.0, timeout: float = 2.0):
+        self.name = name
+        self.check = check
+        self.ttl = ttl
+        self.timeout = timeout
+        self._result: Optional[dict] = None
+        self._checked_at = 0.0
+        self._running: Optional[asyncio.Future] = None
+
+    def _run_check(self) -> dict:
+        started = time.perf_counter()
+        try:
+            self.check()
+        except Exception as e:
+            return {"ok": False, "latency_ms": round((time.perf_counter() - started) * 1000, 2), "error": str(e)}
+        return {"ok": True, "latency_ms": round((time.perf_counter() - started) * 1000, 2)}
+
+    async def result(self) -> dict:
+        """The cached outcome, checking again first when it is older than ttl."""
+        if self._result is None or time.monotonic() - self._checked_at >= self.ttl:
+            if self._running is None or self._running.done():
+                self._running = asyncio.get_running_loop().run_in_executor(None, self._run_check)
+            try:
+                self._result = await asyncio.wait_for(asyncio.shield(self._running), self.timeout)
+            except asyncio.TimeoutError:
+                self._result = {"ok": False, "latency_ms": None, "error": f"no answer within {self.timeout:g}s"}
+            self._checked_at = time.monotonic()
+        return {**self._result, "age_seconds": round(time.monotonic() - self._checked_at, 1)}
+
+    def after_fork(self):
+        """In a forked worker: the parent's result and executor future are not this process's."""
+        self._result = None
+        self._running = None
+
+
+def threadpool_stats() -> Dict[str, int]:
+    """Threads run_in_threadpool may use, how many are busy and how many calls wait for one."""
+    limiter = current_default_thread_limiter()
+    stats = limiter.statistics()
+    return {"size": int(limiter.total_tokens), "busy": stats.borrowed_tokens, "waiting": stats.tasks_waiting}
+
+
+def create_circuit_breaker(name: str, env_prefix: str) -> CircuitBreaker:
+    """Build a breaker from <env_prefix>_BREAKER_FAILURES and <env_prefix>_BREAKER_RESET_SECONDS."""
+    return CircuitBreaker(
+        name,
+        failure_threshold=int(os.getenv(f"{env_prefix}_BREAKER_FAILURES", "5")),
+        reset_seconds=float(os.getenv(f"{env_prefix}_BREAKER_RESET_SECONDS", "30")),
+    )
+
+
+def create_probe(name: str, check: Callable[[], None]) -> CachedProbe:
+    """Build a probe from READY_PROBE_TTL_SECONDS and READY_PROBE_TIMEOUT_SECONDS."""
+    return CachedProbe(
+        name,
+        check,
+        ttl=float(os.getenv("READY_PROBE_TTL_SECONDS", "5")),
+        timeout=float(os.getenv("READY_PROBE_TIMEOUT_SECONDS", "2")),
+    )
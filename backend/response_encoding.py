@@ -0,0 +1,213 @@
+"""
+Response Encoding
+Fast JSON rendering and Brotli/gzip compression of large responses
+
+FastJSONResponse renders with orjson when it is installed, falling back to
+the standard encoder otherwise. Endpoints that return it directly also skip
+FastAPI's jsonable_encoder pass, which on a skills document costs more than
+encoding it.
+
+CompressionMiddleware compresses JSON and text bodies of at least min_size
+bytes with the best encoding the client accepts (br when the brotli package
+is installed, then gzip). Streamed responses (NDJSON export, resume pipeline
+progress) are compressed chunk by chunk and flushed after each one, so every
+event still reaches the client when it is sent.
+"""
+import os
+import time
+import zlib
+from typing import Callable, Optional
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from metrics import histogram
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    try:
+        import brotlicffi as brotli
+    except ImportError:
+        brotli = None
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "application/javascript", "application/xml", "text/")
+
+json_render_seconds = histogram(
+    "json_render_duration_seconds", "Time to encode a JSON response body", ["encoder"],
+    buckets=(0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05),
+)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse encoded by orjson; types orjson does not know go through jsonable_encoder."""
+
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        started = time.perf_counter()
+        if orjson is None:
+            body = super().render(content)
+            json_render_seconds.labels("json").observe(time.perf_counter() - started)
+            return body
+        body = orjson.dumps(content, default=jsonable_encoder, option=orjson.OPT_NON_STR_KEYS)
+        json_render_seconds.labels("orjson").observe(time.perf_counter() - started)
+        return body
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """The preferred available encoding the client accepts ("br" or "gzip"), or None."""
+    explicit = {}
+    wildcard = 0.0
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        name = name.strip().lower()
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if name == "*":
+            wildcard = q
+        elif name:
+            explicit[name] = q
+    # In order of preference, so ties go to br (it compresses JSON better)
+    available = ("br", "gzip") if brotli is not None else ("gzip",)
+    best, best_q = None, 0.0
+    for candidate in available:
+        q = explicit.get(candidate, wildcard)
+        if q > best_q:
+            best, best_q = candidate, q
+    return best
+
+
+class _GzipEncoder:
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31: gzip header and trailer
+
+    def chunk(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush()
+
+
+class _BrotliEncoder:
+    def __init__(self, quality: int):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def chunk(self, data: bytes) -> bytes:
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._compressor.process(data) + self._compressor.finish()
+
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing compressible responses of at least min_size
+    bytes. on_response(scope, encoding, body_bytes, sent_bytes) is called once
+    each response is done, with encoding "identity" when it was sent as is.
+    """
+
+    def __init__(
+        self,
+        app,
+        min_size: int = 1024,
+        gzip_level: int = 6,
+        brotli_quality: int = 4,
+        on_response: Optional[Callable[[dict, str, int, int], None]] = None,
+    ):
+        self.app = app
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.on_response = on_response
+
+    def _encoder(self, encoding: str):
+        return _BrotliEncoder(self.brotli_quality) if encoding == "br" else _GzipEncoder(self.gzip_level)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        accept = b""
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accept = value
+                break
+        wanted = negotiate_encoding(accept.decode("latin-1")) if accept else None
+
+        start_message = None
+        encoder = None
+        encoding = "identity"
+        body_bytes = 0
+        sent_bytes = 0
+
+        async def send_compressed(message):
+            nonlocal start_message, encoder, encoding, body_bytes, sent_bytes
+            if message["type"] == "http.response.start":
+                # Held back until the first body message shows whether to compress
+                start_message = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            body_bytes += len(body)
+
+            if start_message is not None:
+                start, start_message = start_message, None
+                headers = list(start.get("headers", []))
+                if wanted and (more_body or len(body) >= self.min_size) and _compressible(headers):
+                    encoding = wanted
+                    encoder = self._encoder(wanted)
+                    body = encoder.chunk(body) if more_body else encoder.finish(body)
+                    headers = [(k, v) for k, v in headers if k.lower() != b"content-length"]
+                    headers.append((b"content-encoding", wanted.encode()))
+                    if not more_body:
+                        headers.append((b"content-length", str(len(body)).encode()))
+                    headers.append((b"vary", b"Accept-Encoding"))
+                    start = {**start, "headers": headers}
+                await send(start)
+            elif encoder is not None:
+                body = encoder.chunk(body) if more_body else encoder.finish(body)
+            if encoder is not None:
+                message = {**message, "body": body}
+            sent_bytes += len(body)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_compressed)
+        finally:
+            if self.on_response is not None:
+                self.on_response(scope, encoding, body_bytes, sent_bytes)
+
+
+def _compressible(headers) -> bool:
+    content_type = b""
+    for name, value in headers:
+        name = name.lower()
+        if name == b"content-encoding":
+            return False  # Already encoded (or deliberately identity)
+        if name == b"content-type":
+            content_type = value
+    content_type = content_type.decode("latin-1").lower()
+    return content_type.startswith(COMPRESSIBLE_TYPES) or "+json" in content_type
+
+
+def compression_settings() -> dict:
+    """CompressionMiddleware options from COMPRESSION_MIN_BYTES, COMPRESSION_GZIP_LEVEL and COMPRESSION_BROTLI_QUALITY."""
+    return {
+        "min_size": int(os.getenv("COMPRESSION_MIN_BYTES", "1024")),
+        "gzip_level": int(os.getenv("COMPRESSION_GZIP_LEVEL", "6")),
+        "brotli_quality": int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4")),
+    }
@@ -3,30 +3,162 @@ Resume Text Extractor Module
 Extracts plain text from PDF and Word document resumes
 """
 import os
-import pdfplumber
-from docx import Document
+import time
+import zipfile
+from typing import Iterator, List, Optional
+from xml.etree.ElementTree import iterparse
+
+from metrics import histogram
+
+pdf_pages_per_second = histogram(
+    "pdf_pages_per_second", "pdfplumber text extraction throughput per document",
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500),
+)
+
+
+# WordprocessingML namespace used by every tag in word/document.xml
+W_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+W_BODY = W_NS + "body"
+W_P = W_NS + "p"
+W_T = W_NS + "t"
+W_TAB = W_NS + "tab"
+W_R = W_NS + "r"
+W_PPR = W_NS + "pPr"
+W_BR = W_NS + "br"
+W_CR = W_NS + "cr"
+W_TYPE = W_NS + "type"
+W_TR = W_NS + "tr"
+W_TC = W_NS + "tc"
+
+# Magic numbers used to sniff the real format regardless of the file extension
+PDF_MAGIC = b"%PDF"
+ZIP_MAGIC = b"PK\x03\x04"
+OLE2_MAGIC = b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"  # Legacy Word 97-2003 (.doc)
+
+
+def detect_document_format(header: bytes) -> Optional[str]:
+    """
+    Sniff a document format from its first bytes.
+
+    Returns "pdf", "docx", "doc" (legacy OLE2 Word file) or None if unknown.
+    """
+    if header.startswith(PDF_MAGIC):
+        return "pdf"
+    if header.startswith(ZIP_MAGIC):
+        return "docx"
+    if header.startswith(OLE2_MAGIC):
+        return "doc"
+    return None
+
+
+def is_legacy_doc(header: bytes) -> bool:
+    """Check whether the bytes belong to a legacy binary .doc file."""
+    return detect_document_format(header) == "doc"
 
 
 def extract_text_from_pdf(file_path: str) -> str:
     """Extract text from PDF file using pdfplumber"""
     try:
+        import pdfplumber
+
         text = ""
+        started = time.perf_counter()
         with pdfplumber.open(file_path) as pdf:
             for page in pdf.pages:
                 page_text = page.extract_text()
                 if page_text:
                     text += page_text + "\n"
+            pages = len(pdf.pages)
+        elapsed = time.perf_counter() - started
+        if pages and elapsed > 0:
+            pdf_pages_per_second.observe(pages / elapsed)
         return text
     except Exception as e:
         raise Exception(f"Error extracting text from PDF: {str(e)}")
 
 
+def iter_docx_blocks(file_path: str) -> Iterator[str]:
+    """
+    Stream paragraph and table-row text from a .docx file in document order.
+
+    word/document.xml is read straight from the zip archive with an incremental
+    XML parser, and every finished top-level block is dropped from the tree, so
+    memory stays flat regardless of document size. Table cells in a row are
+    separated by tabs; nested tables are folded into their parent cell. Tabs and
+    breaks only count inside runs, so tab-stop definitions under w:pPr add nothing.
+    """
+    with zipfile.ZipFile(file_path) as archive:
+        with archive.open("word/document.xml") as xml_stream:
+            runs: List[str] = []  # Text runs of the paragraph being parsed
+            rows: List[List[str]] = []  # Stack of open table rows (cells so far)
+            cells: List[List[str]] = []  # Stack of open table cells (paragraphs so far)
+            body = None
+            depth = 0
+            body_depth = -1
+            open_runs = 0  # w:r elements enclosing the current element
+            open_props = 0  # w:pPr elements enclosing the current element
+
+            for event, elem in iterparse(xml_stream, events=("start", "end")):
+                tag = elem.tag
+
+                if event == "start":
+                    depth += 1
+                    if tag == W_BODY:
+                        body = elem
+                        body_depth = depth
+                    elif tag == W_TR:
+                        rows.append([])
+                    elif tag == W_TC:
+                        cells.append([])
+                    elif tag == W_R:
+                        open_runs += 1
+                    elif tag == W_PPR:
+                        open_props += 1
+                    continue
+
+                if tag == W_R:
+                    open_runs -= 1
+                elif tag == W_PPR:
+                    open_props -= 1
+                elif open_props:
+                    pass  # Paragraph properties (tab stops, run defaults) carry no text
+                elif tag == W_T:
+                    runs.append(elem.text or "")
+                elif tag == W_TAB:
+                    if open_runs:
+                        runs.append("\t")
+                elif open_runs and (tag == W_CR or (tag == W_BR and elem.get(W_TYPE, "textWrapping") == "textWrapping")):
+                    # Page and column breaks carry no text
+                    runs.append("\n")
+                elif tag == W_P:
+                    paragraph = "".join(runs)
+                    runs = []
+                    if cells:
+                        cells[-1].append(paragraph)
+                    else:
+                        yield paragraph
+                elif tag == W_TC:
+                    cell_text = " ".join(p.strip() for p in cells.pop() if p.strip())
+                    if rows:
+                        rows[-1].append(cell_text)
+                elif tag == W_TR:
+                    row_text = "\t".join(c for c in rows.pop() if c)
+                    if cells:
+                        # Nested table: keep its text inside the enclosing cell
+                        cells[-1].append(row_text)
+                    elif row_text:
+                        yield row_text
+
+                # Drop finished top-level blocks so the tree never grows
+                if body is not None and depth == body_depth + 1:
+                    body.remove(elem)
+                depth -= 1
+
+
 def extract_text_from_docx(file_path: str) -> str:
-    """Extract text from Word document using python-docx"""
+    """Extract paragraph and table text from a Word document by streaming its XML"""
     try:
-        doc = Document(file_path)
-        text = "\n".join([paragraph.text for paragraph in doc.paragraphs])
-        return text
+        return "\n".join(iter_docx_blocks(file_path))
     except Exception as e:
         raise Exception(f"Error extracting text from Word document: {str(e)}")
 
@@ -34,10 +166,17 @@ def extract_text_from_docx(file_path: str) -> str:
 def extract_text_from_resume(file_path: str) -> str:
     """Detect file type and extract text accordingly"""
     file_extension = os.path.splitext(file_path)[1].lower()
-    
+
     if file_extension == ".pdf":
         return extract_text_from_pdf(file_path)
     elif file_extension in [".doc", ".docx"]:
+        # A ".doc" name may still hold a .docx archive; only the binary format is unreadable
+        with open(file_path, "rb") as f:
+            if is_legacy_doc(f.read(len(OLE2_MAGIC))):
+                raise ValueError(
+                    "Legacy Word 97-2003 (.doc) files are not supported. "
+                    "Please save the resume as .docx or PDF and upload it again."
+                )
         return extract_text_from_docx(file_path)
     else:
         raise ValueError(f"Unsupported file type: {file_extension}")
@@ -0,0 +1,249 @@
+"""
+Resume Near-Duplicate Index
+MinHash/LSH index over shingled resume text, used to spot re-uploads of an
+almost identical resume and reuse the skills already extracted from it
+
+Bounded per user (the most recent resumes) and in users: the least recently
+active users are evicted past max_users, and users idle for ttl_seconds expire.
+"""
+import os
+import random
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+NUM_PERM = 64  # MinHash signature length
+BANDS = 8  # LSH bands; with 8 rows each, pairs above ~0.77 Jaccard collide
+ROWS = NUM_PERM // BANDS
+SHINGLE_SIZE = 5  # Words per shingle
+SIMILARITY_THRESHOLD = 0.8  # Estimated Jaccard needed to call two resumes near-duplicates
+MAX_ENTRIES_PER_USER = 5  # Older resumes of a user are evicted first
+MAX_USERS = 10000  # Least recently active users are evicted first
+USER_TTL_SECONDS = 7 * 24 * 3600  # Users without a resume for this long expire
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+# Fixed seed so signatures stay comparable across restarts and workers
+_rng = random.Random(20251108)
+_PERMUTATIONS = [
+    (_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+    for _ in range(NUM_PERM)
+]
+
+_WORD_RE = re.compile(r"\w[\w+#.]*")
+
+
+def split_paragraphs(text: str) -> List[str]:
+    """Split resume text into non-empty paragraphs (one per line of extracted text)."""
+    return [line.strip() for line in text.splitlines() if line.strip()]
+
+
+def paragraph_hash(paragraph: str) -> int:
+    """Hash a paragraph after normalizing case and whitespace."""
+    return zlib.crc32(" ".join(paragraph.lower().split()).encode("utf-8"))
+
+
+def shingle_hashes(text: str, size: int = SHINGLE_SIZE) -> Set[int]:
+    """Hash every run of `size` consecutive words into a 32-bit integer."""
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < size:
+        return {zlib.crc32(" ".join(words).encode("utf-8"))} if words else set()
+    return {
+        zlib.crc32(" ".join(words[i:i + size]).encode("utf-8"))
+        for i in range(len(words) - size + 1)
+    }
+
+
+def minhash_signature(shingles: Set[int]) -> Tuple[int, ...]:
+    """Compute a MinHash signature using universal hashing (a*x + b) mod p."""
+    if not shingles:
+        return tuple([_MAX_HASH] * NUM_PERM)
+    return tuple(
+        min(((a * x + b) % _MERSENNE_PRIME) & _MAX_HASH for x in shingles)
+        for a, b in _PERMUTATIONS
+    )
+
+
+def estimate_similarity(sig_a: Tuple[int, ...], sig_b: Tuple[int, ...]) -> float:
+    """Estimate Jaccard similarity as the fraction of matching signature slots."""
+    return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / NUM_PERM
+
+
+def _band_keys(signature: Tuple[int, ...]) -> List[Tuple[int, Tuple[int, ...]]]:
+    return [(band, signature[band * ROWS:(band + 1) * ROWS]) for band in range(BANDS)]
+
+
+class ResumeEntry:
+    """A previously processed resume: its signature, paragraphs and cached skills."""
+
+    def __init__(self, entry_id: int, name: str, signature: Tuple[int, ...], paragraphs: List[str]):
+        self.entry_id = entry_id
+        self.name = name
+        self.signature = signature
+        self.paragraph_hashes: Set[int] = {paragraph_hash(p) for p in paragraphs}
+        # skill dicts (skill/category/level) with the paragraphs that mention them
+        self.skills: Optional[List[dict]] = None
+        self.skill_paragraphs: Dict[str, Set[int]] = {}
+
+
+class ResumeDedupIndex:
+    """Per-user MinHash/LSH index of recently processed resumes, LRU/TTL-bounded in users."""
+
+    def __init__(
+        self,
+        threshold: float = SIMILARITY_THRESHOLD,
+        max_entries_per_user: int = MAX_ENTRIES_PER_USER,
+        max_users: int = MAX_USERS,
+        ttl_seconds: float = USER_TTL_SECONDS,
+    ):
+        self.threshold = threshold
+        self.max_entries_per_user = max_entries_per_user
+        self.max_users = max(1, max_users)
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._next_id = 1
+        self._entries: Dict[str, Dict[int, ResumeEntry]] = {}
+        self._buckets: Dict[str, Dict[Tuple[int, Tuple[int, ...]], Set[int]]] = {}
+        self._last_added: "OrderedDict[str, float]" = OrderedDict()  # user -> time of their last resume, oldest first
+
+    def _expire_locked(self, now: float):
+        while self._last_added:
+            user_id, added_at = next(iter(self._last_added.items()))
+            if len(self._last_added) <= self.max_users and now - added_at < self.ttl_seconds:
+                break
+            self._drop_user_locked(user_id)
+
+    def _drop_user_locked(self, user_id: str):
+        self._last_added.pop(user_id, None)
+        self._entries.pop(user_id, None)
+        self._buckets.pop(user_id, None)
+
+    def has_user(self, user_id: str) -> bool:
+        """Whether any resume is indexed for the user; cheap enough to check before signing a text."""
+        with self._lock:
+            self._expire_locked(time.monotonic())
+            return bool(self._entries.get(user_id))
+
+    def has(self, user_id: str, signature: Tuple[int, ...]) -> bool:
+        """Whether this exact resume text (same signature) is indexed for the user."""
+        with self._lock:
+            self._expire_locked(time.monotonic())
+            return any(entry.signature == signature for entry in self._entries.get(user_id, {}).values())
+
+    def find(
+        self, user_id: str, signature: Tuple[int, ...], require_skills: bool = False
+    ) -> Tuple[Optional[ResumeEntry], float, float]:
+        """
+        Look up the most similar earlier resume of this user.
+
+        Returns (entry, similarity, lookup_ms); entry is None when nothing is above
+        the threshold. With require_skills, only resumes whose skills were already
+        extracted are considered.
+        """
+        started = time.perf_counter()
+        best, best_similarity = None, 0.0
+        with self._lock:
+            self._expire_locked(time.monotonic())
+            entries = self._entries.get(user_id, {})
+            buckets = self._buckets.get(user_id, {})
+            candidates: Set[int] = set()
+            for key in _band_keys(signature):
+                candidates |= buckets.get(key, set())
+            for entry_id in candidates:
+                entry = entries[entry_id]
+                if require_skills and entry.skills is None:
+                    continue
+                similarity = estimate_similarity(signature, entry.signature)
+                if similarity > best_similarity:
+                    best, best_similarity = entry, similarity
+        lookup_ms = (time.perf_counter() - started) * 1000
+        if best_similarity < self.threshold:
+            return None, best_similarity, lookup_ms
+        return best, best_similarity, lookup_ms
+
+    def add(self, user_id: str, name: str, text: str, signature: Optional[Tuple[int, ...]] = None) -> ResumeEntry:
+        """
+        Register a resume for a user, evicting the oldest entry past the per-user limit.
+
+        A resume with a signature identical to an existing entry returns that entry,
+        so uploading and then processing the same text doesn't index it twice.
+        """
+        if signature is None:
+            signature = minhash_signature(shingle_hashes(text))
+        with self._lock:
+            now = time.monotonic()
+            self._expire_locked(now)
+            self._last_added[user_id] = now
+            self._last_added.move_to_end(user_id)
+            for existing in self._entries.get(user_id, {}).values():
+                if existing.signature == signature:
+                    return existing
+            entry = ResumeEntry(self._next_id, name, signature, split_paragraphs(text))
+            self._next_id += 1
+            entries = self._entries.setdefault(user_id, {})
+            buckets = self._buckets.setdefault(user_id, {})
+            entries[entry.entry_id] = entry
+            for key in _band_keys(signature):
+                buckets.setdefault(key, set()).add(entry.entry_id)
+
+            while len(entries) > self.max_entries_per_user:
+                oldest = min(entries)
+                self._remove_locked(user_id, entries.pop(oldest))
+            self._expire_locked(now)
+        return entry
+
+    def _remove_locked(self, user_id: str, entry: ResumeEntry):
+        buckets = self._buckets[user_id]
+        for key in _band_keys(entry.signature):
+            bucket = buckets.get(key)
+            if bucket:
+                bucket.discard(entry.entry_id)
+                if not bucket:
+                    del buckets[key]
+
+
+def create_resume_index() -> ResumeDedupIndex:
+    """Build the index; RESUME_DEDUP_MAX_USERS and RESUME_DEDUP_TTL_SECONDS bound how many users it remembers."""
+    return ResumeDedupIndex(
+        max_users=int(os.getenv("RESUME_DEDUP_MAX_USERS", str(MAX_USERS))),
+        ttl_seconds=float(os.getenv("RESUME_DEDUP_TTL_SECONDS", str(USER_TTL_SECONDS))),
+    )
+
+
+def changed_paragraphs(previous: ResumeEntry, text: str) -> List[str]:
+    """Return the paragraphs of text that don't appear in the previous resume."""
+    return [p for p in split_paragraphs(text) if paragraph_hash(p) not in previous.paragraph_hashes]
+
+
+def reusable_skills(previous: ResumeEntry, text: str) -> List[dict]:
+    """Cached skills of the previous resume still backed by an unchanged paragraph."""
+    if not previous.skills:
+        return []
+    current = {paragraph_hash(p) for p in split_paragraphs(text)}
+    return [
+        skill for skill in previous.skills
+        if previous.skill_paragraphs.get(skill["skill"], set()) & current
+    ]
+
+
+def attach_skills(entry: ResumeEntry, skills: List[dict], text: str, mentioned: Callable[[str, str], bool]):
+    """
+    Cache extracted skills on an entry, recording which paragraphs mention each one.
+
+    `mentioned(paragraph, skill)` decides whether a paragraph mentions a skill; skills
+    it can't place fall back to a plain case-insensitive substring match.
+    """
+    paragraphs = split_paragraphs(text)
+    skill_paragraphs: Dict[str, Set[int]] = {}
+    for skill in skills:
+        name = skill["skill"]
+        hashes = {paragraph_hash(p) for p in paragraphs if mentioned(p, name)}
+        if not hashes:
+            hashes = {paragraph_hash(p) for p in paragraphs if name.lower() in p.lower()}
+        skill_paragraphs[name] = hashes
+    entry.skills = list(skills)
+    entry.skill_paragraphs = skill_paragraphs
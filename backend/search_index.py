@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Full-Text Search Index
+Embedded SQLite FTS5 index over extracted resume text and recording transcriptions.
+
+Usage:
+    python search_index.py rebuild               # Re-index RESUMES_DIR and RECORDINGS_DIR
+    python search_index.py search '"machine learning" python'
+    python search_index.py bench --docs 100000   # Latency numbers on a synthetic corpus
+"""
+import argparse
+import glob
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_INDEX_PATH = os.getenv("SEARCH_INDEX_PATH", os.path.join(BASE_DIR, "search_index.db"))
+
+
+def upload_dirs() -> Tuple[str, str]:
+    """The (resumes, recordings) upload directories: RESUMES_DIR and RECORDINGS_DIR, else next to this file."""
+    return (
+        os.path.normpath(os.getenv("RESUMES_DIR", os.path.join(BASE_DIR, "resumes"))),
+        os.path.normpath(os.getenv("RECORDINGS_DIR", os.path.join(BASE_DIR, "recordings"))),
+    )
+
+KIND_RESUME = "resume"
+KIND_TRANSCRIPT = "transcript"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    kind TEXT NOT NULL,
+    indexed_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_documents_kind ON documents(kind);
+CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+    content,
+    tokenize = 'porter unicode61 tokenchars ''+#'''
+);
+"""
+
+
+class SearchIndex:
+    """SQLite FTS5 index of text documents, ranked with BM25."""
+
+    def __init__(self, db_path: str = DEFAULT_INDEX_PATH):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        with self._connect() as conn:
+            conn.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        """One connection per thread; WAL lets readers run alongside the writer."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def after_fork(self):
+        """In a forked child: abandon the parent's connections, SQLite ones must not cross a fork."""
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+
+    def add_document(self, path: str, kind: str, text: str):
+        """Index (or re-index) the text stored at path."""
+        with self._write_lock:
+            conn = self._connect()
+            with conn:
+                self._upsert(conn, path, kind, text)
+
+    def add_documents(self, docs: List[Tuple[str, str, str]]):
+        """Index many (path, kind, text) documents in one transaction."""
+        with self._write_lock:
+            conn = self._connect()
+            with conn:
+                for path, kind, text in docs:
+                    self._upsert(conn, path, kind, text)
+
+    def _upsert(self, conn: sqlite3.Connection, path: str, kind: str, text: str):
+        row = conn.execute("SELECT id FROM documents WHERE path = ?", (path,)).fetchone()
+        if row:
+            conn.execute("DELETE FROM documents_fts WHERE rowid = ?", (row[0],))
+            conn.execute(
+                "UPDATE documents SET kind = ?, indexed_at = ? WHERE id = ?",
+                (kind, datetime.now().isoformat(), row[0]),
+            )
+            doc_id = row[0]
+        else:
+            cursor = conn.execute(
+                "INSERT INTO documents (path, kind, indexed_at) VALUES (?, ?, ?)",
+                (path, kind, datetime.now().isoformat()),
+            )
+            doc_id = cursor.lastrowid
+        conn.execute("INSERT INTO documents_fts (rowid, content) VALUES (?, ?)", (doc_id, text))
+
+    def remove_document(self, path: str):
+        """Drop a document from the index."""
+        with self._write_lock:
+            conn = self._connect()
+            with conn:
+                row = conn.execute("SELECT id FROM documents WHERE path = ?", (path,)).fetchone()
+                if row:
+                    conn.execute("DELETE FROM documents_fts WHERE rowid = ?", (row[0],))
+                    conn.execute("DELETE FROM documents WHERE id = ?", (row[0],))
+
+    def count(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+    def search(
+        self, query: str, kind: Optional[str] = None, limit: int = 20, offset: int = 0
+    ) -> Tuple[List[Dict], int]:
+        """
+        Run an FTS5 query (terms, "quoted phrases", AND/OR/NOT, prefix*) ranked by BM25.
+
+        Returns (results, total_matches). Input that isn't valid FTS5 syntax is
+        retried as a plain AND of its quoted terms.
+        """
+        try:
+            return self._search(query, kind, limit, offset)
+        except sqlite3.OperationalError:
+            terms = [t.replace('"', "") for t in query.split()]
+            escaped = " ".join(f'"{t}"' for t in terms if t)
+            if not escaped:
+                return [], 0
+            return self._search(escaped, kind, limit, offset)
+
+    def _search(self, match: str, kind: Optional[str], limit: int, offset: int) -> Tuple[List[Dict], int]:
+        conn = self._connect()
+        kind_clause = "AND d.kind = ?" if kind else ""
+        params: list = [match] + ([kind] if kind else [])
+
+        rows = conn.execute(
+            f"""
+            SELECT d.path, d.kind, bm25(documents_fts) AS score,
+                   snippet(documents_fts, 0, '<mark>', '</mark>', '…', 16)
+            FROM documents_fts CROSS JOIN documents d ON d.id = documents_fts.rowid
+            WHERE documents_fts MATCH ? {kind_clause}
+            ORDER BY score
+            LIMIT ? OFFSET ?
+            """,
+            params + [limit, offset],
+        ).fetchall()
+        total = conn.execute(
+            f"""
+            SELECT COUNT(*) FROM documents_fts CROSS JOIN documents d ON d.id = documents_fts.rowid
+            WHERE documents_fts MATCH ? {kind_clause}
+            """,
+            params,
+        ).fetchone()[0]
+
+        results = [
+            {
+                "path": path,
+                "filename": os.path.basename(path),
+                "kind": doc_kind,
+                # bm25() is lower-is-better; flip it so larger means more relevant
+                "score": round(-score, 4),
+                "snippet": snippet,
+            }
+            for path, doc_kind, score, snippet in rows
+        ]
+        return results, total
+
+    def rebuild(self, resumes_dir: str, recordings_dir: str) -> Dict[str, int]:
+        """Re-index every resume .txt and transcription file from scratch."""
+        docs: List[Tuple[str, str, str]] = []
+        for path in sorted(glob.glob(os.path.join(resumes_dir, "*.txt"))):
+            docs.append((path, KIND_RESUME, _read_text(path)))
+        for path in sorted(glob.glob(os.path.join(recordings_dir, "transcription_*.txt"))):
+            docs.append((path, KIND_TRANSCRIPT, _read_text(path)))
+
+        with self._write_lock:
+            conn = self._connect()
+            with conn:
+                conn.execute("DELETE FROM documents_fts")
+                conn.execute("DELETE FROM documents")
+                for path, kind, text in docs:
+                    self._upsert(conn, path, kind, text)
+            conn.execute("INSERT INTO documents_fts (documents_fts) VALUES ('optimize')")
+        return {
+            KIND_RESUME: sum(1 for d in docs if d[1] == KIND_RESUME),
+            KIND_TRANSCRIPT: sum(1 for d in docs if d[1] == KIND_TRANSCRIPT),
+        }
+
+
+def _read_text(path: str) -> str:
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        return f.read()
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))]
+
+
+def run_benchmark(num_docs: int, repeats: int = 50):
+    """Build a synthetic index of num_docs documents and time typical queries."""
+    rng = random.Random(42)
+    skills = [
+        "python", "javascript", "react", "docker", "kubernetes", "postgresql", "aws",
+        "django", "flask", "typescript", "terraform", "graphql", "redis", "linux", "git",
+    ]
+    vocabulary = [f"word{i}" for i in range(20000)] + ["machine", "learning", "team", "lead", "project"]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index = SearchIndex(os.path.join(tmp, "bench.db"))
+        started = time.perf_counter()
+        batch = []
+        for i in range(num_docs):
+            words = rng.choices(vocabulary, k=250) + rng.sample(skills, 4)
+            if i % 50 == 0:
+                words += ["machine", "learning"]
+            rng.shuffle(words)
+            kind = KIND_RESUME if i % 3 else KIND_TRANSCRIPT
+            batch.append((f"/synthetic/doc_{i}.txt", kind, " ".join(words)))
+            if len(batch) == 5000:
+                index.add_documents(batch)
+                batch = []
+        if batch:
+            index.add_documents(batch)
+        build_s = time.perf_counter() - started
+        size_mb = os.path.getsize(index.db_path) / 1e6
+        print(f"Indexed {num_docs} documents in {build_s:.1f}s ({num_docs / build_s:.0f} docs/s), {size_mb:.0f} MB")
+
+        queries = [
+            ("rare term", "word123", None),
+            ("common term", "python", None),
+            ("two terms AND", "docker kubernetes", None),
+            ("phrase", '"machine learning"', None),
+            ("phrase + term", '"machine learning" python', None),
+            ("prefix", "post*", None),
+            ("term, kind filter", "react", KIND_TRANSCRIPT),
+        ]
+        print(f"\n{'query':<20}{'matches':>9}{'p50 (ms)':>10}{'p95 (ms)':>10}")
+        for name, query, kind in queries:
+            timings = []
+            for _ in range(repeats):
+                t0 = time.perf_counter()
+                _, total = index.search(query, kind=kind, limit=20)
+                timings.append((time.perf_counter() - t0) * 1000)
+            print(f"{name:<20}{total:>9}{_percentile(timings, 50):>10.2f}{_percentile(timings, 95):>10.2f}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Manage the resume/transcript full-text index")
+    parser.add_argument("--db", default=DEFAULT_INDEX_PATH, help="Index database path")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("rebuild", help="Re-index the resumes and recordings directories")
+    search_parser = sub.add_parser("search", help="Run a query against the index")
+    search_parser.add_argument("query")
+    search_parser.add_argument("--kind", choices=[KIND_RESUME, KIND_TRANSCRIPT])
+    search_parser.add_argument("--limit", type=int, default=10)
+    bench_parser = sub.add_parser("bench", help="Benchmark query latency on a synthetic corpus")
+    bench_parser.add_argument("--docs", type=int, default=100000)
+    args = parser.parse_args(argv)
+
+    if args.command == "bench":
+        run_benchmark(args.docs)
+        return 0
+
+    index = SearchIndex(args.db)
+    if args.command == "rebuild":
+        started = time.perf_counter()
+        counts = index.rebuild(*upload_dirs())
+        print(f"Indexed {counts[KIND_RESUME]} resumes and {counts[KIND_TRANSCRIPT]} transcripts "
+              f"in {time.perf_counter() - started:.2f}s")
+    elif args.command == "search":
+        results, total = index.search(args.query, kind=args.kind, limit=args.limit)
+        print(f"{total} matches")
+        for result in results:
+            print(f"[{result['score']:.2f}] {result['kind']}: {result['filename']}")
+            print(f"    {result['snippet']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
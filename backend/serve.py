@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Pre-fork Server
+Production serving mode: load the app, the Vosk model and the skill indexes once,
+then fork worker processes that share those pages copy-on-write
+
+Workers accept on one listening socket bound by the parent. Per-worker state is
+kept in shared stores: skills and items in the skills store (SQLite or
+Firestore), cache invalidations and skill index updates over the invalidation
+bus, so every worker sees every save.
+
+Signals to the parent:
+    SIGHUP          graceful restart: rebuild the preloaded indexes from the store,
+                    then replace workers one at a time (code changes need a full restart)
+    SIGUSR1         print the memory report
+    SIGTERM/SIGINT  drain and stop all workers
+
+Usage:
+    python serve.py --workers 4 --port 8000
+    python serve.py --workers 4 --memory-report
+"""
+import argparse
+import gc
+import os
+import select
+import signal
+import socket
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+# gRPC (Firestore) channels created before the fork must be told about it
+os.environ.setdefault("GRPC_ENABLE_FORK_SUPPORT", "1")
+
+WORKER_READY_TIMEOUT = 120.0
+
+
+def memory_usage(pid: int) -> Dict[str, int]:
+    """Rss, Pss and private (USS) memory of a process in kB, from /proc/<pid>/smaps_rollup."""
+    usage = {}
+    with open(f"/proc/{pid}/smaps_rollup", "r") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                usage[parts[0][:-1]] = int(parts[1])
+    return {
+        "rss": usage.get("Rss", 0),
+        "pss": usage.get("Pss", 0),
+        "private": usage.get("Private_Clean", 0) + usage.get("Private_Dirty", 0),
+    }
+
+
+def _current_rss_kb() -> int:
+    return memory_usage(os.getpid())["rss"]
+
+
+class PreforkServer:
+    """Parent process: preloads the app, forks workers, restarts and reports on them."""
+
+    def __init__(self, host: str, port: int, workers: int, graceful_timeout: float, log_level: str):
+        self.host = host
+        self.port = port
+        self.worker_count = workers
+        self.graceful_timeout = graceful_timeout
+        self.log_level = log_level
+        self.workers: Dict[int, float] = {}  # pid -> start time
+        self.preloaded_kb: Dict[str, int] = {}
+        self._stopping = False
+        self._restart_requested = False
+        self._report_requested = False
+
+    def preload(self):
+        """Import the app and run the warmup once, for every worker to share."""
+        before = _current_rss_kb()
+        import main
+        self.main = main
+        after_import = _current_rss_kb()
+        # The Vosk model is always preloaded here; workers would each load their own copy
+        main.run_warmup(["vosk"])
+        after_model = _current_rss_kb()
+        main.run_warmup(["storage", "indexes"])
+        after_indexes = _current_rss_kb()
+        # The remaining WARMUP_PHASES, so workers start warm and share the results
+        main.run_warmup()
+        self.preloaded_kb = {
+            "app": after_import - before,
+            "vosk model": after_model - after_import,
+            "indexes": after_indexes - after_model,
+        }
+        if main.skills_store.name == "memory":
+            print("Warning: the memory skills store is per worker; set SKILLS_STORE=sqlite or use Firestore")
+
+    def _prepare_fork(self):
+        # No helper threads may run in the parent while it forks; the bus is reopened per worker
+        self.main.skills_cache.bus.close()
+        self.main.skills_store.close()
+        # Keep the garbage collector from writing to (and so un-sharing) every preloaded object
+        gc.collect()
+        gc.freeze()
+
+    def _spawn(self) -> int:
+        ready_read, ready_write = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(ready_read)
+            self._run_worker(ready_write)
+        os.close(ready_write)
+        self.workers[pid] = time.time()
+        # Wait for the worker's startup to finish so restarts never drop below N ready workers
+        ready, _, _ = select.select([ready_read], [], [], WORKER_READY_TIMEOUT)
+        if not ready or not os.read(ready_read, 1):
+            print(f"Warning: worker {pid} did not report ready")
+        os.close(ready_read)
+        return pid
+
+    def _run_worker(self, ready_fd: int):
+        for sig in (signal.SIGHUP, signal.SIGUSR1, signal.SIGTERM, signal.SIGINT, signal.SIGCHLD):
+            signal.signal(sig, signal.SIG_DFL)
+        exit_code = 0
+        try:
+            import uvicorn
+
+            self.main.reinit_after_fork()
+
+            class WorkerServer(uvicorn.Server):
+                async def startup(self, sockets=None):
+                    await super().startup(sockets=sockets)
+                    os.write(ready_fd, b"1" if self.started else b"")
+                    os.close(ready_fd)
+
+            config = uvicorn.Config(
+                self.main.app,
+                lifespan="on",
+                log_level=self.log_level,
+                timeout_graceful_shutdown=self.graceful_timeout,
+            )
+            WorkerServer(config).run(sockets=[self.sock])
+        except BaseException as e:
+            print(f"Worker {os.getpid()} failed: {e}")
+            exit_code = 1
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(exit_code)
+
+    def _stop_workers(self, pids: List[int]):
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        deadline = time.time() + self.graceful_timeout + 5
+        remaining = set(pids)
+        while remaining and time.time() < deadline:
+            for pid in list(remaining):
+                try:
+                    done, _ = os.waitpid(pid, os.WNOHANG)
+                except ChildProcessError:
+                    done = pid
+                if done:
+                    remaining.discard(pid)
+                    self.workers.pop(pid, None)
+            time.sleep(0.05)
+        for pid in remaining:
+            print(f"Warning: worker {pid} did not drain in time, killing it")
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+            self.workers.pop(pid, None)
+
+    def _graceful_restart(self):
+        print("SIGHUP: rebuilding preloaded indexes and replacing workers")
+        gc.unfreeze()
+        self.main.preload_indexes()
+        self._prepare_fork()
+        for old_pid in list(self.workers):
+            self._spawn()
+            self._stop_workers([old_pid])
+        print(f"Restarted {self.worker_count} workers")
+
+    def _reap(self):
+        """Respawn workers that exited without being asked to."""
+        while self.workers:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            if self.workers.pop(pid, None) is not None and not self._stopping:
+                print(f"Worker {pid} exited with status {status}, starting a replacement")
+                self._spawn()
+
+    def memory_report(self) -> str:
+        lines = ["Preloaded in the parent (RSS growth): " + ", ".join(
+            f"{name} {kb / 1024:.1f} MB" for name, kb in self.preloaded_kb.items()
+        )]
+        lines.append(f"{'process':<16}{'RSS MB':>10}{'PSS MB':>10}{'private MB':>12}")
+        parent = memory_usage(os.getpid())
+        lines.append(f"{'parent':<16}{parent['rss'] / 1024:>10.1f}{parent['pss'] / 1024:>10.1f}{parent['private'] / 1024:>12.1f}")
+        private = []
+        for pid in sorted(self.workers):
+            try:
+                usage = memory_usage(pid)
+            except OSError:
+                continue
+            private.append(usage["private"])
+            lines.append(f"{f'worker {pid}':<16}{usage['rss'] / 1024:>10.1f}{usage['pss'] / 1024:>10.1f}{usage['private'] / 1024:>12.1f}")
+        shared = self.preloaded_kb.get("vosk model", 0) + self.preloaded_kb.get("indexes", 0)
+        if private and shared:
+            mean_private = sum(private) / len(private)
+            lines.append(
+                f"Each extra worker adds {mean_private / 1024:.1f} MB private memory, "
+                f"{mean_private / shared:.0%} of the {shared / 1024:.1f} MB model + indexes it shares"
+            )
+        return "\n".join(lines)
+
+    def run(self, memory_report: bool = False) -> int:
+        self.preload()
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((self.host, self.port))
+        self.sock.listen(2048)
+        self.sock.set_inheritable(True)
+
+        self._prepare_fork()
+        for _ in range(self.worker_count):
+            self._spawn()
+        print(f"Serving on http://{self.host}:{self.port} with {self.worker_count} workers (parent {os.getpid()})")
+        if memory_report:
+            print(self.memory_report())
+
+        signal.signal(signal.SIGHUP, lambda *_: setattr(self, "_restart_requested", True))
+        signal.signal(signal.SIGUSR1, lambda *_: setattr(self, "_report_requested", True))
+        signal.signal(signal.SIGTERM, lambda *_: setattr(self, "_stopping", True))
+        signal.signal(signal.SIGINT, lambda *_: setattr(self, "_stopping", True))
+        while not self._stopping:
+            time.sleep(0.2)
+            if self._restart_requested:
+                self._restart_requested = False
+                self._graceful_restart()
+            if self._report_requested:
+                self._report_requested = False
+                print(self.memory_report())
+            self._reap()
+
+        print("Stopping workers")
+        self._stop_workers(list(self.workers))
+        self.sock.close()
+        return 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Serve the API with N pre-forked workers sharing preloaded models")
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("SERVE_WORKERS", str(os.cpu_count() or 1))))
+    parser.add_argument("--graceful-timeout", type=float, default=float(os.getenv("SERVE_GRACEFUL_TIMEOUT", "30")),
+                        help="Seconds a stopping worker may spend finishing in-flight requests")
+    parser.add_argument("--log-level", default="info")
+    parser.add_argument("--memory-report", action="store_true", help="Print per-process memory once workers are up")
+    args = parser.parse_args(argv)
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+
+    # Admission control splits the host's CPUs between the workers
+    os.environ["SERVE_WORKERS"] = str(args.workers)
+    # Workers keep their caches and skill indexes in sync over the invalidation bus
+    os.environ.setdefault("SKILLS_CACHE_BUS_DIR", tempfile.mkdtemp(prefix="skills-bus-"))
+    # ...and publish their metrics there for /metrics to sum
+    os.environ.setdefault("METRICS_DIR", tempfile.mkdtemp(prefix="metrics-"))
+    server = PreforkServer(args.host, args.port, args.workers, args.graceful_timeout, args.log_level)
+    return server.run(memory_report=args.memory_report)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
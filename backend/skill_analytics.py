@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Skill Analytics
+Materialized skill counters (per category, per level, per skill) kept up to
+date as deltas on every save, so dashboards never scan user documents
+
+Each save applies old skill set -> new skill set as -1/+1 deltas. The counters
+are an in-memory aggregate: the user documents are the source of truth, every
+process recounts from them at startup, and workers catch up on each other's
+saves over the cache invalidation bus. The snapshot in the skills store is an
+export for dashboards and `verify`, written periodically and on shutdown by a
+single writer per host (SnapshotLease), never read back into the counters.
+
+Usage:
+    python skill_analytics.py verify     # recount from the store and diff against the snapshot
+    python skill_analytics.py rebuild    # recount from the store and overwrite the snapshot
+"""
+import argparse
+import fcntl
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from skill_index import SKILL_LEVELS, level_rank, skill_key
+
+SNAPSHOT_NAME = "skill_analytics"
+TOP_SKILLS = 10
+
+
+def normalize_skills(skills: Iterable[dict]) -> Dict[str, Tuple[str, str]]:
+    """skill_key -> (name, level) with canonical level names; the last entry wins on duplicates."""
+    normalized = {}
+    for s in skills:
+        name = (s.get("skill") or "").strip()
+        if name:
+            normalized[skill_key(name)] = (name, SKILL_LEVELS[level_rank(s.get("level"))])
+    return normalized
+
+
+class SkillAnalytics:
+    """Counters of users, skills, levels and categories maintained as deltas. Thread-safe."""
+
+    def __init__(self, categorize: Callable[[str], str]):
+        # Categorization walks the whole taxonomy, so remember it per skill
+        self._categorize = lru_cache(maxsize=65536)(categorize)
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._users = 0
+        self._skills = 0
+        self._levels: Counter = Counter()
+        self._category_skills: Counter = Counter()
+        self._category_users: Counter = Counter()
+        self._category_levels: Dict[str, Counter] = {}
+        self._skill_users: Counter = Counter()
+        self._skill_names: Dict[str, str] = {}
+        self._skill_categories: Dict[str, str] = {}
+        self._deltas = 0
+        self._deltas_at_snapshot = 0
+        self._view: Optional[dict] = None
+
+    def _apply(self, skills: Dict[str, Tuple[str, str]], sign: int):
+        categories = set()
+        for key, (name, level) in skills.items():
+            category = self._skill_categories.get(key)
+            if category is None:
+                category = self._skill_categories[key] = self._categorize(key)
+                self._skill_names[key] = name
+            categories.add(category)
+            self._skills += sign
+            self._levels[level] += sign
+            self._category_skills[category] += sign
+            self._category_levels.setdefault(category, Counter())[level] += sign
+            self._skill_users[key] += sign
+        for category in categories:
+            self._category_users[category] += sign
+
+    def apply_change(self, old_skills: Optional[List[dict]], new_skills: List[dict]):
+        """Apply one user's save; old_skills None means the user had no stored skills yet."""
+        with self._lock:
+            if old_skills is None:
+                self._users += 1
+            else:
+                self._apply(normalize_skills(old_skills), -1)
+            self._apply(normalize_skills(new_skills), 1)
+            self._deltas += 1
+            self._view = None
+
+    def rebuild(self, users: Iterable[Tuple[str, List[dict]]]) -> int:
+        """Recount from (user_id, skills) pairs; returns the number of users."""
+        with self._lock:
+            self._reset()
+            for _, skills in users:
+                self._users += 1
+                self._apply(normalize_skills(skills), 1)
+            return self._users
+
+    def counters(self) -> dict:
+        """All counters as a JSON-friendly dict (also the snapshot format)."""
+        with self._lock:
+            return self._counters_locked()
+
+    def _counters_locked(self) -> dict:
+        return {
+            "users": self._users,
+            "skills": self._skills,
+            "levels": {level: self._levels[level] for level in SKILL_LEVELS},
+            "categories": {
+                category: {
+                    "skills": self._category_skills[category],
+                    "users": self._category_users[category],
+                    "levels": {level: self._category_levels[category][level] for level in SKILL_LEVELS},
+                }
+                for category in sorted(self._category_skills)
+                if self._category_skills[category]
+            },
+            "skill_users": {
+                self._skill_names[key]: count for key, count in sorted(self._skill_users.items()) if count
+            },
+        }
+
+    def view(self) -> dict:
+        """
+        Dashboard view: counters plus top skills per category. Rendered once per
+        change and then served as is, so reads don't depend on the number of users.
+        """
+        with self._lock:
+            if self._view is None:
+                counters = self._counters_locked()
+                by_category: Dict[str, Counter] = {}
+                for key, count in self._skill_users.items():
+                    if count:
+                        by_category.setdefault(self._skill_categories[key], Counter())[self._skill_names[key]] = count
+                for category, stats in counters["categories"].items():
+                    stats["top_skills"] = [
+                        {"skill": name, "users": count}
+                        for name, count in by_category.get(category, Counter()).most_common(TOP_SKILLS)
+                    ]
+                del counters["skill_users"]
+                counters["deltas_applied"] = self._deltas
+                self._view = counters
+            return self._view
+
+    def snapshot(self, store, force: bool = False) -> bool:
+        """Save the counters into the store if anything changed since the last snapshot."""
+        with self._lock:
+            if not force and self._deltas == self._deltas_at_snapshot:
+                return False
+            doc = {**self._counters_locked(), "saved_at": datetime.now().isoformat(), "deltas_applied": self._deltas}
+            deltas = self._deltas
+        store.save_snapshot(SNAPSHOT_NAME, doc)
+        with self._lock:
+            self._deltas_at_snapshot = deltas
+        return True
+
+
+class SnapshotLease:
+    """
+    Elects one snapshot writer among the workers on a host: whoever holds an
+    exclusive flock on a shared lock file. The lock is released when its holder
+    exits, and another worker takes it over at its next snapshot. Without a
+    path there is no other worker and the lease is always held.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self._fd: Optional[int] = None
+
+    def held(self) -> bool:
+        if self.path is None or self._fd is not None:
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        self._fd = fd
+        return True
+
+    def after_fork(self):
+        """In a forked worker: a lock taken by the parent is not this process's to hold."""
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+def create_snapshot_lease() -> SnapshotLease:
+    """A lease on a lock file in SKILLS_CACHE_BUS_DIR, the directory the workers of one host share."""
+    bus_dir = os.getenv("SKILLS_CACHE_BUS_DIR")
+    return SnapshotLease(os.path.join(bus_dir, f"{SNAPSHOT_NAME}.lock") if bus_dir else None)
+
+
+def diff_counters(expected: dict, actual: dict, prefix: str = "") -> List[str]:
+    """Paths where two counter dicts disagree, as 'path: expected != actual' lines."""
+    differences = []
+    for key in sorted(set(expected) | set(actual)):
+        path = f"{prefix}{key}"
+        a, b = expected.get(key, 0), actual.get(key, 0)
+        if isinstance(a, dict) or isinstance(b, dict):
+            differences.extend(diff_counters(a or {}, b or {}, path + "."))
+        elif a != b:
+            differences.append(f"{path}: {a} != {b}")
+    return differences
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Verify or rebuild the skill analytics counters")
+    parser.add_argument("command", choices=["verify", "rebuild"])
+    args = parser.parse_args(argv)
+
+    import main as app_main
+
+    started = time.perf_counter()
+    analytics = SkillAnalytics(app_main.categorize_skill)
+    users = analytics.rebuild(
+        (user_id, doc.get("skills", [])) for user_id, doc in app_main.skills_store.iter_all()
+    )
+    print(f"Recounted {users} users in {time.perf_counter() - started:.1f}s")
+
+    if args.command == "rebuild":
+        analytics.snapshot(app_main.skills_store, force=True)
+        print(f"Wrote snapshot '{SNAPSHOT_NAME}'")
+        return 0
+
+    snapshot = app_main.skills_store.get_snapshot(SNAPSHOT_NAME)
+    if snapshot is None:
+        print(f"No snapshot '{SNAPSHOT_NAME}' to verify")
+        return 1
+    print(f"Snapshot saved at {snapshot.get('saved_at')} after {snapshot.get('deltas_applied')} deltas")
+    recount = analytics.counters()
+    differences = diff_counters(recount, {key: snapshot.get(key, {}) for key in recount})
+    if differences:
+        print(f"{len(differences)} counters differ (recount != snapshot):")
+        for line in differences[:50]:
+            print(f"  {line}")
+        return 1
+    print("Snapshot matches the recount")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
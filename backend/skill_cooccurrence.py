@@ -0,0 +1,277 @@
+"""
+Skill Co-occurrence
+Related-skill recommendations from how often skills appear together
+
+Every user's skill set and every position's requiredSkills is a "basket".
+Pair counts over the interned skill vocabulary are kept sparse, as one dict of
+co-occurring skill ids per skill, next to per-skill basket counts; memory grows
+with the pairs actually seen, not with the square of the vocabulary (skill
+names are free text, so the vocabulary is client-controlled). Relatedness is
+normalized PMI (NPMI, -1..1), which unlike raw counts doesn't just favour the
+most common skills.
+
+Top-k neighbor lists are precomputed, so a query only slices a ready list.
+Changing a basket marks the lists of the changed skills dirty, and refresh()
+recomputes dirty lists outside the lock, from a background task rather than on
+the request path; until then queries get the previous list. Other lists drift
+slightly as the basket total changes and are all marked dirty once enough
+changes have accumulated.
+"""
+import argparse
+import random
+import statistics
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from skill_index import skill_key
+
+MAX_NEIGHBORS = 50
+MIN_PAIR_COUNT = 2  # Pairs seen fewer times than this are noise, not a relationship
+FULL_REFRESH_RATIO = 0.01  # Refresh every list after changes touching 1% of the baskets
+REBUILD_CHUNK_BASKETS = 200_000  # Baskets whose pairs are counted in one vectorized pass
+
+
+class SkillCooccurrence:
+    """Sparse skill pair counts with precomputed NPMI neighbor lists. Thread-safe."""
+
+    def __init__(self, max_neighbors: int = MAX_NEIGHBORS, min_count: int = MIN_PAIR_COUNT):
+        self.max_neighbors = max_neighbors
+        self.min_count = min_count
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._skill_ids: Dict[str, int] = {}
+        self._skill_names: List[str] = []
+        self._own: List[int] = []  # Baskets containing each skill
+        self._pairs: List[Dict[int, int]] = []  # Symmetric: _pairs[a][b] == _pairs[b][a]
+        self._baskets = 0
+        self._neighbors: Dict[int, List[Tuple[str, float, int]]] = {}
+        self._dirty: Set[int] = set()
+        self._changes_since_refresh = 0
+
+    def _skill_id(self, skill: str) -> int:
+        key = skill_key(skill)
+        skill_id = self._skill_ids.get(key)
+        if skill_id is None:
+            skill_id = len(self._skill_names)
+            self._skill_ids[key] = skill_id
+            self._skill_names.append(skill.strip())
+            self._own.append(0)
+            self._pairs.append({})
+        return skill_id
+
+    def _basket_ids(self, skills: Iterable[str]) -> List[int]:
+        return sorted({self._skill_id(s) for s in skills if s and s.strip()})
+
+    def _count_basket(self, ids: List[int], delta: int):
+        for i, a in enumerate(ids):
+            self._own[a] += delta
+            row = self._pairs[a]
+            for b in ids[i + 1:]:
+                count = row.get(b, 0) + delta
+                if count:
+                    row[b] = count
+                    self._pairs[b][a] = count
+                else:
+                    del row[b]
+                    del self._pairs[b][a]
+
+    def apply_change(self, old_skills: Optional[Iterable[str]], new_skills: Optional[Iterable[str]]):
+        """
+        Replace one basket's skills: old_skills None means a new basket, new_skills
+        None a deleted one. Only the neighbor lists of skills whose pairs changed
+        are marked dirty; refresh() recomputes them.
+        """
+        with self._lock:
+            old = self._basket_ids(old_skills or []) if old_skills is not None else None
+            new = self._basket_ids(new_skills or []) if new_skills is not None else None
+            if old is not None and new is not None and old == new:
+                return
+            if old is not None:
+                self._count_basket(old, -1)
+                self._baskets -= 1
+            if new is not None:
+                self._count_basket(new, 1)
+                self._baskets += 1
+
+            self._changes_since_refresh += 1
+            if self._changes_since_refresh >= max(100, self._baskets * FULL_REFRESH_RATIO):
+                self._dirty.update(range(len(self._skill_names)))
+                self._changes_since_refresh = 0
+            else:
+                self._dirty.update(old or ())
+                self._dirty.update(new or ())
+
+    def rebuild(self, baskets: Iterable[Iterable[str]]) -> int:
+        """
+        Recount everything from scratch. Baskets of the same size are stacked so
+        their pairs are enumerated with numpy, and each chunk's distinct pairs are
+        counted with np.unique before being added to the sparse rows. Every
+        neighbor list is left dirty for refresh(). Returns the number of baskets.
+        """
+        with self._lock:
+            self._reset()
+            by_size: Dict[int, List[List[int]]] = defaultdict(list)
+            for basket in baskets:
+                ids = self._basket_ids(basket)
+                self._baskets += 1
+                if ids:
+                    by_size[len(ids)].append(ids)
+            vocabulary = len(self._skill_names)
+            own = np.zeros(vocabulary, dtype=np.int64)
+            for size, group in by_size.items():
+                first, second = np.triu_indices(size, 1)
+                for start in range(0, len(group), REBUILD_CHUNK_BASKETS):
+                    block = np.array(group[start:start + REBUILD_CHUNK_BASKETS], dtype=np.int64)
+                    own += np.bincount(block.ravel(), minlength=vocabulary)
+                    if size < 2:
+                        continue
+                    codes, counts = np.unique(block[:, first] * vocabulary + block[:, second], return_counts=True)
+                    for code, count in zip(codes.tolist(), counts.tolist()):
+                        a, b = divmod(code, vocabulary)
+                        total = self._pairs[a].get(b, 0) + count
+                        self._pairs[a][b] = total
+                        self._pairs[b][a] = total
+            self._own = own.tolist()
+            self._dirty = set(range(vocabulary))
+            return self._baskets
+
+    def _row_snapshot_locked(self, skill_id: int):
+        """Copy what one neighbor list is computed from, so the math can run without the lock."""
+        own = self._own[skill_id]
+        if own == 0 or self._baskets == 0:
+            return None
+        row = self._pairs[skill_id]
+        candidates = sorted(b for b, count in row.items() if count >= self.min_count)
+        if not candidates:
+            return None
+        return (
+            own,
+            self._baskets,
+            [self._skill_names[b] for b in candidates],
+            [row[b] for b in candidates],
+            [self._own[b] for b in candidates],
+        )
+
+    def _compute_neighbors(self, snapshot) -> List[Tuple[str, float, int]]:
+        if snapshot is None:
+            return []
+        own, baskets, names, together, others = snapshot
+        total = float(baskets)
+        together = np.array(together, dtype=np.float64)
+        others = np.array(others, dtype=np.float64)
+        pmi = np.log(together * total / (own * others))
+        # NPMI divides by -log p(a, b); a pair present in every basket scores 1
+        denominator = -np.log(together / total)
+        npmi = np.divide(pmi, denominator, out=np.ones_like(pmi), where=denominator > 0)
+
+        order = np.lexsort((-together, -npmi))[:self.max_neighbors]
+        return [(names[i], round(float(npmi[i]), 4), int(together[i])) for i in order]
+
+    def refresh(self) -> int:
+        """
+        Recompute the dirty neighbor lists; returns how many were recomputed. The
+        lock is only held to copy one skill's row and to install its list, so
+        queries and changes are not held up by the computation. A skill changed
+        again meanwhile stays dirty for the next refresh.
+        """
+        with self._lock:
+            pending = sorted(self._dirty)
+            self._dirty.clear()
+        for skill_id in pending:
+            with self._lock:
+                if skill_id in self._dirty:
+                    continue
+                snapshot = self._row_snapshot_locked(skill_id)
+            neighbors = self._compute_neighbors(snapshot)
+            with self._lock:
+                if neighbors:
+                    self._neighbors[skill_id] = neighbors
+                else:
+                    self._neighbors.pop(skill_id, None)
+        return len(pending)
+
+    def related(self, skill: str, k: int = 10) -> Optional[List[dict]]:
+        """Top k related skills from the precomputed list; None for an unknown skill."""
+        with self._lock:
+            skill_id = self._skill_ids.get(skill_key(skill))
+            if skill_id is None:
+                return None
+            neighbors = self._neighbors.get(skill_id, [])
+        return [{"skill": name, "score": score, "count": count} for name, score, count in neighbors[:k]]
+
+    def dirty(self) -> bool:
+        with self._lock:
+            return bool(self._dirty)
+
+    def skill_name(self, skill: str) -> Optional[str]:
+        skill_id = self._skill_ids.get(skill_key(skill))
+        return self._skill_names[skill_id] if skill_id is not None else None
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "baskets": self._baskets,
+                "skills": len(self._skill_names),
+                "pairs": sum(len(row) for row in self._pairs) // 2,
+                "neighbor_lists": len(self._neighbors),
+                "dirty_neighbor_lists": len(self._dirty),
+                "changes_since_refresh": self._changes_since_refresh,
+            }
+
+
+# Benchmark with synthetic users: python skill_cooccurrence.py --users 1000000
+def _bench(args):
+    from skill_index import synthetic_users
+
+    baskets = [[s["skill"] for s in doc["skills"]] for _, doc in synthetic_users(args.users, args.skills, args.seed)]
+    model = SkillCooccurrence()
+    started = time.perf_counter()
+    model.rebuild(baskets)
+    print(f"rebuilt from {len(baskets)} baskets in {time.perf_counter() - started:.1f}s")
+    started = time.perf_counter()
+    model.refresh()
+    print(f"neighbor lists computed in {(time.perf_counter() - started) * 1000:.0f}ms: {model.stats()}")
+
+    rng = random.Random(args.seed + 1)
+    names = [f"Skill{rng.randrange(args.skills)}" for _ in range(args.runs)]
+    times = []
+    for name in names:
+        t0 = time.perf_counter()
+        model.related(name, k=10)
+        times.append((time.perf_counter() - t0) * 1000)
+    times.sort()
+    print(f"related k=10      p50={statistics.median(times):.4f}ms p95={times[int(len(times) * 0.95) - 1]:.4f}ms")
+
+    times = []
+    for _ in range(args.runs):
+        i = rng.randrange(len(baskets))
+        new = baskets[i][:-1] + [f"Skill{rng.randrange(args.skills)}"]
+        t0 = time.perf_counter()
+        model.apply_change(baskets[i], new)
+        times.append((time.perf_counter() - t0) * 1000)
+        baskets[i] = new
+    times.sort()
+    print(f"apply_change      p50={statistics.median(times):.3f}ms p95={times[int(len(times) * 0.95) - 1]:.3f}ms")
+    started = time.perf_counter()
+    refreshed = model.refresh()
+    print(f"refresh           {refreshed} lists in {(time.perf_counter() - started) * 1000:.1f}ms")
+    print(f"Skill0 -> {[(r['skill'], r['score']) for r in model.related('Skill0', k=5)]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the skill co-occurrence model with synthetic users")
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--skills", type=int, default=300, help="Taxonomy size")
+    parser.add_argument("--runs", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=7)
+    _bench(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
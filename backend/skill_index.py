@@ -0,0 +1,385 @@
+"""
+Skill Index
+Inverted index from (skill, level) to users, for "who knows React at Advanced or
+above and also Docker" style candidate searches
+
+Users are interned to dense integer ordinals in first-seen order. Each (skill,
+level) posting list holds the ordinals of the users with that skill at exactly
+that level. Sparse lists are sorted array('I') values; once a list covers more
+than 1/DENSE_RATIO of all users it becomes a bitmap stored in a Python int,
+so AND/OR of popular skills are single big-int operations.
+
+Ordinals are never reused, so a cursor (the next ordinal to return) stays valid
+while users are added or updated between pages.
+"""
+import argparse
+import bisect
+import random
+import re
+import resource
+import statistics
+import threading
+import time
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+SKILL_LEVELS = ["Beginner", "Intermediate", "Advanced", "Expert"]
+LEVEL_RANKS = {level.lower(): rank for rank, level in enumerate(SKILL_LEVELS)}
+DENSE_RATIO = 32  # A list turns into a bitmap above 1/32 of all users (where a bitmap becomes smaller)
+MIN_DENSE_SIZE = 256  # Small lists stay arrays even in a small index
+MAX_PAGE_SIZE = 1000
+
+_NONZERO_BYTE = re.compile(rb"[^\x00]")
+
+Posting = Union[array, int]  # Sorted ordinals, or a bitmap
+Result = Union[List[int], array, int]
+
+
+def level_rank(level: Optional[str]) -> int:
+    """Rank of a level name (Beginner=0 ... Expert=3); unknown levels count as Beginner."""
+    return LEVEL_RANKS.get((level or "").strip().lower(), 0)
+
+
+def skill_key(skill: str) -> str:
+    return skill.strip().lower()
+
+
+def to_bitmap(ordinals: Iterable[int]) -> int:
+    """Build a bitmap from ordinals in one pass over a bytearray."""
+    ordinals = list(ordinals)
+    if not ordinals:
+        return 0
+    buf = bytearray((max(ordinals) >> 3) + 1)
+    for ordinal in ordinals:
+        buf[ordinal >> 3] |= 1 << (ordinal & 7)
+    return int.from_bytes(buf, "little")
+
+
+def iter_bitmap(bitmap: int, start: int = 0) -> Iterator[int]:
+    """Yield the set bits of bitmap at or after start, in increasing order."""
+    data = bitmap.to_bytes((bitmap.bit_length() + 7) // 8, "little")
+    for match in _NONZERO_BYTE.finditer(data, start >> 3):
+        position = match.start()
+        byte = data[position]
+        for bit in range(8):
+            if byte >> bit & 1:
+                ordinal = (position << 3) | bit
+                if ordinal >= start:
+                    yield ordinal
+
+
+def _size(result: Result) -> int:
+    return result.bit_count() if isinstance(result, int) else len(result)
+
+
+def union(results: List[Result]) -> Result:
+    """OR of several results; stays a sorted list if every input is sparse."""
+    dense = [r for r in results if isinstance(r, int)]
+    sparse = [r for r in results if not isinstance(r, int) and len(r)]
+    if not dense:
+        if len(sparse) == 1:
+            return sparse[0]
+        return sorted(set().union(*sparse))
+    bitmap = 0
+    for r in dense:
+        bitmap |= r
+    for r in sparse:
+        bitmap |= to_bitmap(r)
+    return bitmap
+
+
+def intersect(results: List[Result]) -> Result:
+    """
+    AND of several results. Bitmaps are ANDed directly; if any input is sparse,
+    the smallest sparse input is filtered against the others instead.
+    """
+    dense = [r for r in results if isinstance(r, int)]
+    sparse = sorted((r for r in results if not isinstance(r, int)), key=len)
+    if not sparse:
+        bitmap = dense[0]
+        for r in dense[1:]:
+            bitmap &= r
+        return bitmap
+
+    candidates = list(sparse[0])
+    for other in sparse[1:]:
+        if not candidates:
+            break
+        members = set(other)
+        candidates = [o for o in candidates if o in members]
+    for bitmap in dense:
+        if not candidates:
+            break
+        data = bitmap.to_bytes((bitmap.bit_length() + 7) // 8, "little")
+        size = len(data)
+        candidates = [o for o in candidates if (o >> 3) < size and data[o >> 3] >> (o & 7) & 1]
+    return candidates
+
+
+class SkillIndex:
+    """
+    Inverted (skill, level) -> users index, kept up to date by update_user on every
+    save and rebuilt from the store on startup. Thread-safe.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self._user_ids: List[str] = []  # ordinal -> user id
+        self._ordinals: Dict[str, int] = {}
+        self._skill_ids: Dict[str, int] = {}  # skill_key -> skill id
+        self._skill_names: List[str] = []  # skill id -> display name
+        self._postings: List[List[Posting]] = []  # skill id -> posting per level rank
+        self._user_codes: List[Optional[array]] = []  # ordinal -> skill_id * 4 + rank per skill
+
+    @property
+    def user_count(self) -> int:
+        return len(self._user_ids)
+
+    def _skill_id(self, skill: str) -> int:
+        key = skill_key(skill)
+        skill_id = self._skill_ids.get(key)
+        if skill_id is None:
+            skill_id = len(self._skill_names)
+            self._skill_ids[key] = skill_id
+            self._skill_names.append(skill.strip())
+            self._postings.append([array("I") for _ in SKILL_LEVELS])
+        return skill_id
+
+    def _encode(self, skills: List[dict]) -> array:
+        """Encode a user's skills as sorted skill_id * 4 + rank codes (last level wins on duplicates)."""
+        by_skill: Dict[int, int] = {}
+        for s in skills:
+            if s.get("skill", "").strip():
+                by_skill[self._skill_id(s["skill"])] = level_rank(s.get("level"))
+        return array("I", sorted(skill_id * 4 + rank for skill_id, rank in by_skill.items()))
+
+    def update_user(self, user_id: str, skills: List[dict]) -> Optional[List[dict]]:
+        """
+        Replace a user's postings with skills; only the changed (skill, level) pairs are
+        touched. Returns the user's previous skills (None for a new user), so other
+        aggregates can apply the same change as a delta.
+        """
+        with self._lock:
+            ordinal = self._ordinals.get(user_id)
+            if ordinal is None:
+                ordinal = len(self._user_ids)
+                self._ordinals[user_id] = ordinal
+                self._user_ids.append(user_id)
+                self._user_codes.append(None)
+
+            old = set(self._user_codes[ordinal] or ())
+            codes = self._encode(skills)
+            new = set(codes)
+            for code in old - new:
+                self._remove(code >> 2, code & 3, ordinal)
+            for code in new - old:
+                self._add(code >> 2, code & 3, ordinal)
+            previous = self._user_codes[ordinal]
+            self._user_codes[ordinal] = codes
+            return self._decode(previous) if previous is not None else None
+
+    def _decode(self, codes: array) -> List[dict]:
+        return [{"skill": self._skill_names[code >> 2], "level": SKILL_LEVELS[code & 3]} for code in codes]
+
+    def iter_users(self) -> Iterator[Tuple[str, List[dict]]]:
+        """Yield (user_id, skills) for every indexed user, e.g. to seed other aggregates."""
+        with self._lock:
+            users = list(zip(self._user_ids, self._user_codes))
+        for user_id, codes in users:
+            if codes is not None:
+                yield user_id, self._decode(codes)
+
+    def _add(self, skill_id: int, rank: int, ordinal: int):
+        postings = self._postings[skill_id]
+        posting = postings[rank]
+        if isinstance(posting, int):
+            postings[rank] = posting | (1 << ordinal)
+            return
+        i = bisect.bisect_left(posting, ordinal)
+        if i == len(posting) or posting[i] != ordinal:
+            posting.insert(i, ordinal)
+        if len(posting) > MIN_DENSE_SIZE and len(posting) * DENSE_RATIO > len(self._user_ids):
+            postings[rank] = to_bitmap(posting)
+
+    def _remove(self, skill_id: int, rank: int, ordinal: int):
+        postings = self._postings[skill_id]
+        posting = postings[rank]
+        if isinstance(posting, int):
+            postings[rank] = posting & ~(1 << ordinal)
+            return
+        i = bisect.bisect_left(posting, ordinal)
+        if i < len(posting) and posting[i] == ordinal:
+            del posting[i]
+
+    def rebuild(self, docs: Iterable[Tuple[str, dict]]) -> int:
+        """
+        Rebuild the whole index from (user_id, doc) pairs, e.g. SkillsStore.iter_all().
+        Postings are collected as plain lists and converted once at the end, which is
+        much faster than inserting users one by one. Returns the number of users.
+        """
+        with self._lock:
+            self._reset()
+            lists: List[List[List[int]]] = []
+            for user_id, doc in docs:
+                ordinal = self._ordinals.get(user_id)
+                if ordinal is None:
+                    ordinal = len(self._user_ids)
+                    self._ordinals[user_id] = ordinal
+                    self._user_ids.append(user_id)
+                    self._user_codes.append(None)
+                codes = self._encode(doc.get("skills", []))
+                self._user_codes[ordinal] = codes
+                while len(lists) < len(self._skill_names):
+                    lists.append([[] for _ in SKILL_LEVELS])
+                for code in codes:
+                    lists[code >> 2][code & 3].append(ordinal)
+
+            users = len(self._user_ids)
+            for skill_id, per_rank in enumerate(lists):
+                for rank, ordinals in enumerate(per_rank):
+                    # Duplicate user ids in the input can leave ordinals out of order
+                    ordinals = sorted(set(ordinals))
+                    if len(ordinals) > MIN_DENSE_SIZE and len(ordinals) * DENSE_RATIO > users:
+                        self._postings[skill_id][rank] = to_bitmap(ordinals)
+                    else:
+                        self._postings[skill_id][rank] = array("I", ordinals)
+            return users
+
+    def _term_postings(self, term: dict) -> List[Posting]:
+        """Non-empty postings of a {"skill", "min_level"} term, one per qualifying level."""
+        skill_id = self._skill_ids.get(skill_key(term["skill"]))
+        if skill_id is None:
+            return []
+        # Empty arrays and zero bitmaps are both falsy
+        return [p for p in self._postings[skill_id][level_rank(term.get("min_level")):] if p]
+
+    def search(
+        self,
+        all_of: Optional[List[dict]] = None,
+        any_of: Optional[List[dict]] = None,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+    ) -> dict:
+        """
+        Users matching every term of all_of and at least one term of any_of. Terms
+        are {"skill": ..., "min_level": ...}; min_level defaults to Beginner.
+        Results come in ordinal order; pass next_cursor back to get the next page.
+        """
+        all_of, any_of = all_of or [], any_of or []
+        if not all_of and not any_of:
+            raise ValueError("At least one skill term is required")
+        start = int(cursor) if cursor else 0
+        if start < 0:
+            raise ValueError("Invalid cursor")
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+        started = time.perf_counter()
+        with self._lock:
+            parts = [union(self._term_postings(t)) for t in all_of]
+            if any_of:
+                # One flat union over every posting of every term avoids merging twice
+                parts.append(union([p for t in any_of for p in self._term_postings(t)]))
+            result = intersect(parts) if len(parts) > 1 else parts[0]
+
+            total = _size(result)
+            if isinstance(result, int):
+                page = []
+                for ordinal in iter_bitmap(result, start):
+                    page.append(ordinal)
+                    if len(page) > limit:
+                        break
+            else:
+                i = bisect.bisect_left(result, start)
+                page = list(result[i:i + limit + 1])
+
+            next_cursor = str(page[limit - 1] + 1) if len(page) > limit else None
+            user_ids = [self._user_ids[o] for o in page[:limit]]
+
+        return {
+            "user_ids": user_ids,
+            "total": total,
+            "next_cursor": next_cursor,
+            "took_ms": round((time.perf_counter() - started) * 1000, 3),
+        }
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            postings = [p for per_rank in self._postings for p in per_rank]
+            bitmaps = [p for p in postings if isinstance(p, int)]
+            arrays = [p for p in postings if not isinstance(p, int)]
+            return {
+                "users": len(self._user_ids),
+                "skills": len(self._skill_names),
+                "bitmap_postings": len(bitmaps),
+                "array_postings": sum(1 for p in arrays if len(p)),
+                "posting_bytes": sum((p.bit_length() + 7) // 8 for p in bitmaps)
+                + sum(p.itemsize * len(p) for p in arrays),
+            }
+
+
+# Benchmark with synthetic users: python skill_index.py --users 1000000
+def synthetic_users(users: int, skills: int, seed: int) -> Iterator[Tuple[str, dict]]:
+    rng = random.Random(seed)
+    names = [f"Skill{i}" for i in range(skills)]
+    # Zipf-like popularity: a few skills are common, most are rare
+    weights = [1 / (i + 1) for i in range(skills)]
+    for n in range(users):
+        picked = set(rng.choices(names, weights=weights, k=rng.randint(6, 15)))
+        yield f"user{n}", {"skills": [{"skill": s, "level": rng.choice(SKILL_LEVELS)} for s in picked]}
+
+
+def _bench(args):
+    index = SkillIndex()
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    index.rebuild(synthetic_users(args.users, args.skills, args.seed))
+    build_s = time.perf_counter() - started
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"built {index.user_count} users in {build_s:.1f}s, max RSS +{(rss_after - rss_before) / 1024:.0f} MiB")
+    print(index.stats())
+
+    queries = {
+        "AND popular+popular@Advanced": {"all_of": [{"skill": "Skill0", "min_level": "Advanced"}, {"skill": "Skill1"}]},
+        "AND popular+rare": {"all_of": [{"skill": "Skill2", "min_level": "Intermediate"}, {"skill": "Skill150"}]},
+        "AND three terms": {"all_of": [{"skill": "Skill0"}, {"skill": "Skill3"}, {"skill": "Skill9", "min_level": "Expert"}]},
+        "OR five rare": {"any_of": [{"skill": f"Skill{i}"} for i in range(100, 105)]},
+        "AND + OR": {"all_of": [{"skill": "Skill1", "min_level": "Advanced"}], "any_of": [{"skill": "Skill4"}, {"skill": "Skill40"}]},
+    }
+    for name, query in queries.items():
+        times, cursor, total = [], None, 0
+        for _ in range(args.runs):
+            t0 = time.perf_counter()
+            page = index.search(limit=50, cursor=cursor, **query)
+            times.append((time.perf_counter() - t0) * 1000)
+            total = page["total"]
+            cursor = page["next_cursor"]
+        times.sort()
+        print(f"{name:30} total={total:>8} p50={statistics.median(times):7.2f}ms "
+              f"p95={times[int(len(times) * 0.95) - 1]:7.2f}ms")
+
+    rng = random.Random(args.seed + 1)
+    times = []
+    for _ in range(args.runs):
+        user_id = f"user{rng.randrange(args.users)}"
+        skills = [{"skill": f"Skill{rng.randrange(args.skills)}", "level": rng.choice(SKILL_LEVELS)} for _ in range(10)]
+        t0 = time.perf_counter()
+        index.update_user(user_id, skills)
+        times.append((time.perf_counter() - t0) * 1000)
+    times.sort()
+    print(f"{'update_user':30} p50={statistics.median(times):7.3f}ms p95={times[int(len(times) * 0.95) - 1]:7.3f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the skill index with synthetic users")
+    parser.add_argument("--users", type=int, default=1_000_000)
+    parser.add_argument("--skills", type=int, default=300, help="Taxonomy size")
+    parser.add_argument("--runs", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=7)
+    _bench(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+"""
+Skills Read Cache
+Bounded LRU cache with TTL in front of the user skills read path, plus a small
+invalidation bus so several workers on one host can drop stale entries
+"""
+import os
+import socket
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+_MISSING = object()
+
+
+class LocalInvalidationBus:
+    """In-process bus: publish is a no-op because there is no other worker to tell."""
+
+    def publish(self, key: str):
+        pass
+
+    def subscribe(self, callback: Callable[[str], None]):
+        pass
+
+    def after_fork(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class UnixSocketInvalidationBus:
+    """
+    Local stand-in for a pub/sub channel between workers on one host.
+
+    Every worker binds a Unix datagram socket in a shared directory. Publishing
+    sends the key to every other socket there; a daemon thread receives keys
+    and hands them to the subscriber. Sockets of dead workers are removed.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._callback: Optional[Callable[[str], None]] = None
+        self._open()
+
+    def _open(self):
+        self.path = os.path.join(self.directory, f"{os.getpid()}.sock")
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._sock.bind(self.path)
+        self._send_sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self._closed = False
+        self._thread = threading.Thread(target=self._listen, name="skills-cache-bus", daemon=True)
+        self._thread.start()
+
+    def publish(self, key: str):
+        payload = key.encode("utf-8")
+        for name in os.listdir(self.directory):
+            peer = os.path.join(self.directory, name)
+            if peer == self.path or not name.endswith(".sock"):
+                continue
+            try:
+                self._send_sock.sendto(payload, peer)
+            except (ConnectionRefusedError, FileNotFoundError):
+                # The worker that owned this socket is gone
+                try:
+                    os.unlink(peer)
+                except OSError:
+                    pass
+            except OSError as e:
+                print(f"Skills cache invalidation to {peer} failed: {e}")
+
+    def subscribe(self, callback: Callable[[str], None]):
+        self._callback = callback
+
+    def _listen(self):
+        while not self._closed:
+            try:
+                payload = self._sock.recv(4096)
+            except OSError:
+                break
+            if self._callback is not None:
+                self._callback(payload.decode("utf-8"))
+
+    def after_fork(self):
+        """In a forked child: drop the parent's sockets (its listener thread didn't survive) and bind our own."""
+        self._closed = True
+        self._sock.close()
+        self._send_sock.close()
+        self._open()
+
+    def close(self):
+        self._closed = True
+        try:
+            self._sock.close()
+            self._send_sock.close()
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+
+class ReadThroughCache:
+    """
+    LRU cache with per-entry TTL that loads missing keys through a loader function.
+
+    Cached values are shared between callers and must be treated as read-only.
+    Only found values are cached; a loader returning None is not remembered.
+
+    Loads run outside the lock. Each key being loaded has a generation that
+    invalidate bumps, and a load only stores its value if the generation is
+    unchanged when it finishes, so a value read before a concurrent save is
+    never cached for the full TTL.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl_seconds: float = 30.0, bus=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.bus = bus or LocalInvalidationBus()
+        self.bus.subscribe(self._on_remote_invalidation)
+        self._listeners: List[Callable[[str], None]] = []
+        self._entries: "OrderedDict[str, Tuple[float, object]]" = OrderedDict()
+        # Keys with loads in flight: [loads in flight, generation]
+        self._loading: Dict[str, List[int]] = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "invalidations": 0,
+            "remote_invalidations": 0,
+            "stale_loads": 0,
+        }
+        self._hit_seconds = 0.0
+        self._miss_seconds = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def get_or_load(self, key: str, loader: Callable[[str], Optional[object]]) -> Optional[object]:
+        """Return the cached value for key, or load, cache and return it."""
+        started = time.perf_counter()
+        if not self.enabled:
+            return loader(key)
+
+        value = self._lookup(key)
+        if value is not _MISSING:
+            with self._lock:
+                self._stats["hits"] += 1
+                self._hit_seconds += time.perf_counter() - started
+            return value
+
+        with self._lock:
+            loading = self._loading.setdefault(key, [0, 0])
+            loading[0] += 1
+            generation = loading[1]
+        value = None
+        try:
+            value = loader(key)
+        finally:
+            with self._lock:
+                loading[0] -= 1
+                if not loading[0]:
+                    del self._loading[key]
+                self._stats["misses"] += 1
+                self._miss_seconds += time.perf_counter() - started
+                if loading[1] != generation:
+                    # Invalidated while loading: the value may predate the change
+                    self._stats["stale_loads"] += 1
+                elif value is not None:
+                    self._store_locked(key, value)
+        return value
+
+    def _lookup(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _MISSING
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self._stats["expirations"] += 1
+                return _MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def _store_locked(self, key: str, value: object):
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def _drop_locked(self, key: str) -> bool:
+        loading = self._loading.get(key)
+        if loading is not None:
+            loading[1] += 1
+        return self._entries.pop(key, None) is not None
+
+    def invalidate(self, key: str):
+        """Drop key here and tell the other workers to drop it too."""
+        with self._lock:
+            if self._drop_locked(key):
+                self._stats["invalidations"] += 1
+        self.bus.publish(key)
+
+    def add_invalidation_listener(self, listener: Callable[[str], None]):
+        """Also call listener(key) when another worker invalidates a key, e.g. to refresh derived state."""
+        self._listeners.append(listener)
+
+    def _on_remote_invalidation(self, key: str):
+        with self._lock:
+            if self._drop_locked(key):
+                self._stats["remote_invalidations"] += 1
+        for listener in self._listeners:
+            listener(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            for loading in self._loading.values():
+                loading[1] += 1
+
+    def stats(self) -> Dict[str, object]:
+        """Counters, hit ratio and mean hit/miss latency."""
+        with self._lock:
+            hits, misses = self._stats["hits"], self._stats["misses"]
+            lookups = hits + misses
+            return {
+                **self._stats,
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+                "avg_hit_us": round(self._hit_seconds / hits * 1e6, 2) if hits else 0.0,
+                "avg_miss_ms": round(self._miss_seconds / misses * 1e3, 3) if misses else 0.0,
+            }
+
+    def after_fork(self):
+        self.bus.after_fork()
+
+    def close(self):
+        self.bus.close()
+
+
+def create_skills_cache() -> ReadThroughCache:
+    """
+    Build the skills cache from SKILLS_CACHE_SIZE (0 disables it), SKILLS_CACHE_TTL
+    (seconds) and SKILLS_CACHE_BUS_DIR (enables cross-worker invalidation).
+    """
+    bus_dir = os.getenv("SKILLS_CACHE_BUS_DIR")
+    bus = UnixSocketInvalidationBus(bus_dir) if bus_dir else LocalInvalidationBus()
+    return ReadThroughCache(
+        max_entries=int(os.getenv("SKILLS_CACHE_SIZE", "10000")),
+        ttl_seconds=float(os.getenv("SKILLS_CACHE_TTL", "30")),
+        bus=bus,
+    )
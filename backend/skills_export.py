@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+Skills Export
+Streams every user's skills out of the skills store for offline analysis
+
+The store is read in user_id order, one page at a time, so memory stays flat
+however many users there are. NDJSON output has one line per user; Parquet
+output (when pyarrow is installed) has one row per (user, skill) and is
+written as a directory of part files.
+
+A checkpoint next to the output records the last exported user_id after each
+page (and, for NDJSON, the file size at that point), so an interrupted export
+resumes from its cursor instead of starting over.
+
+Usage:
+    python skills_export.py --out skills.ndjson
+    python skills_export.py --out skills_parquet --format parquet --page-size 5000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+DEFAULT_PAGE_SIZE = 1000
+MAX_PAGE_SIZE = 10000
+PART_USERS = 100_000  # Users per Parquet part file
+
+PARQUET_SCHEMA = [
+    ("user_id", "string"),
+    ("skill", "string"),
+    ("level", "string"),
+    ("category", "string"),
+    ("updated_at", "string"),
+]
+
+
+def load_pyarrow():
+    """Import pyarrow on first Parquet use, so importing this module for NDJSON doesn't pay for it."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)") from None
+    return pa, pq
+
+
+def iter_pages(store, cursor: Optional[str] = None, page_size: int = DEFAULT_PAGE_SIZE) -> Iterator[Tuple[List[Tuple[str, dict]], Optional[str]]]:
+    """Yield (page, next_cursor) until the store is exhausted; resume by passing the last cursor."""
+    while True:
+        page, cursor = store.scan(cursor, page_size)
+        if page or cursor is not None:
+            yield page, cursor
+        if cursor is None:
+            return
+
+
+def user_record(user_id: str, doc: dict) -> dict:
+    """One export record per user, with each skill's category inlined."""
+    categories = {}
+    for category, skills in (doc.get("categories") or {}).items():
+        for skill in skills:
+            categories[skill] = category
+    return {
+        "user_id": user_id,
+        "updated_at": doc.get("updated_at"),
+        "skills": [
+            {"skill": s.get("skill"), "level": s.get("level"), "category": categories.get(s.get("skill"))}
+            for s in doc.get("skills", [])
+        ],
+    }
+
+
+def ndjson_page(page: List[Tuple[str, dict]]) -> str:
+    return "".join(json.dumps(user_record(user_id, doc)) + "\n" for user_id, doc in page)
+
+
+def ndjson_lines(store, cursor: Optional[str] = None, page_size: int = DEFAULT_PAGE_SIZE, limit: int = 0) -> Iterator[str]:
+    """NDJSON for every user after cursor, one chunk per page; limit > 0 stops after that many users."""
+    started = time.perf_counter()
+    exported = rows = 0
+    for page, _ in iter_pages(store, cursor, page_size):
+        if limit:
+            page = page[:limit - exported]
+        yield ndjson_page(page)
+        exported += len(page)
+        rows += sum(len(doc.get("skills", [])) for _, doc in page)
+        if limit and exported >= limit:
+            break
+    elapsed = time.perf_counter() - started
+    print(f"Skills export: {exported} users, {rows} rows in {elapsed:.1f}s ({rows / elapsed if elapsed else 0:.0f} rows/s)")
+
+
+def load_checkpoint(path: str) -> Optional[dict]:
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_checkpoint(path: str, checkpoint: dict):
+    """Replace the checkpoint atomically so an interruption never leaves it half written."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class NdjsonWriter:
+    """Appends pages to one NDJSON file; resuming truncates anything past the checkpoint."""
+
+    def __init__(self, path: str, checkpoint: Optional[dict]):
+        self.out = open(path, "r+b" if checkpoint and os.path.exists(path) else "wb")
+        if checkpoint:
+            self.out.truncate(checkpoint["bytes"])
+            self.out.seek(checkpoint["bytes"])
+
+    def write_page(self, page: List[Tuple[str, dict]]) -> int:
+        self.out.write(ndjson_page(page).encode("utf-8"))
+        return sum(len(doc.get("skills", [])) for _, doc in page)
+
+    def commit(self) -> dict:
+        self.out.flush()
+        os.fsync(self.out.fileno())
+        return {"bytes": self.out.tell()}
+
+    def close(self):
+        self.out.close()
+
+    def abort(self):
+        self.out.close()
+
+
+class ParquetWriter:
+    """
+    Writes a directory of part files with one row group per page. A part only
+    gets its final name once it is closed, so a resumed export never reads a
+    torn file; the part in progress at an interruption is written again.
+    """
+
+    def __init__(self, path: str, checkpoint: Optional[dict]):
+        self.pa, self.pq = load_pyarrow()
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.schema = self.pa.schema([(name, getattr(self.pa, kind)()) for name, kind in PARQUET_SCHEMA])
+        self.part = checkpoint["part"] if checkpoint else 0
+        self.part_users = 0
+        self.writer = None
+        # Parts past the checkpoint are from an earlier run and are about to be rewritten
+        for name in os.listdir(path):
+            if name.startswith("part-") and int(name[5:10]) >= self.part:
+                os.remove(os.path.join(path, name))
+
+    def _part_path(self) -> str:
+        return os.path.join(self.path, f"part-{self.part:05d}.parquet")
+
+    def write_page(self, page: List[Tuple[str, dict]]) -> int:
+        columns: Dict[str, list] = {name: [] for name, _ in PARQUET_SCHEMA}
+        for user_id, doc in page:
+            record = user_record(user_id, doc)
+            for s in record["skills"]:
+                columns["user_id"].append(user_id)
+                columns["skill"].append(s["skill"])
+                columns["level"].append(s["level"])
+                columns["category"].append(s["category"])
+                columns["updated_at"].append(record["updated_at"])
+        if self.writer is None:
+            self.writer = self.pq.ParquetWriter(self._part_path() + ".tmp", self.schema)
+        self.writer.write_table(self.pa.table(columns, schema=self.schema))
+        self.part_users += len(page)
+        return len(columns["user_id"])
+
+    def commit(self) -> Optional[dict]:
+        """Close the part once it is full; returns None while the current part is still open."""
+        if self.part_users < PART_USERS:
+            return None
+        self._close_part()
+        return {"part": self.part}
+
+    def _close_part(self):
+        if self.writer is not None:
+            self.writer.close()
+            os.replace(self._part_path() + ".tmp", self._part_path())
+            self.writer = None
+            self.part += 1
+            self.part_users = 0
+
+    def close(self):
+        self._close_part()
+
+    def abort(self):
+        """Release the part in progress without publishing it; a resume writes it again."""
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+
+def run(store, out_path: str, fmt: str, page_size: int, restart: bool) -> Tuple[int, int]:
+    """Export every user to out_path, resuming from its checkpoint; returns (users, rows)."""
+    checkpoint_path = out_path.rstrip("/\\") + ".checkpoint.json"
+    checkpoint = None if restart or not os.path.exists(out_path) else load_checkpoint(checkpoint_path)
+    if checkpoint and checkpoint.get("format") != fmt:
+        raise ValueError(f"Checkpoint {checkpoint_path} is for a {checkpoint.get('format')} export")
+    if checkpoint and checkpoint.get("done"):
+        print(f"{out_path} is already complete ({checkpoint['users']} users); use --restart to export again", file=sys.stderr)
+        return checkpoint["users"], checkpoint["rows"]
+    if checkpoint:
+        print(f"Resuming after user {checkpoint['cursor']!r} ({checkpoint['users']} users already exported)", file=sys.stderr)
+
+    writer = NdjsonWriter(out_path, checkpoint) if fmt == "ndjson" else ParquetWriter(out_path, checkpoint)
+    state = checkpoint or {"format": fmt, "cursor": None, "users": 0, "rows": 0, "bytes": 0, "part": 0}
+    # Parquet parts are only durable once closed, so progress is counted from the last closed part
+    pending = {"users": 0, "rows": 0, "cursor": state["cursor"]}
+    started = time.perf_counter()
+    exported_users = exported_rows = 0
+    try:
+        for page, cursor in iter_pages(store, state["cursor"], page_size):
+            rows = writer.write_page(page)
+            exported_users += len(page)
+            exported_rows += rows
+            pending["users"] += len(page)
+            pending["rows"] += rows
+            if cursor is not None:
+                pending["cursor"] = cursor
+            committed = writer.commit()
+            if committed is not None:
+                state.update(committed, cursor=pending["cursor"])
+                state["users"] += pending["users"]
+                state["rows"] += pending["rows"]
+                pending["users"] = pending["rows"] = 0
+                save_checkpoint(checkpoint_path, state)
+            elapsed = time.perf_counter() - started
+            print(
+                f"\r{state['users'] + pending['users']} users, {state['rows'] + pending['rows']} rows "
+                f"({exported_rows / elapsed if elapsed else 0:.0f} rows/s)", end="", file=sys.stderr
+            )
+    except BaseException:
+        writer.abort()
+        raise
+    writer.close()
+    state.update(users=state["users"] + pending["users"], rows=state["rows"] + pending["rows"], done=True)
+    save_checkpoint(checkpoint_path, state)
+
+    elapsed = time.perf_counter() - started
+    print(
+        f"\nExported {exported_users} users, {exported_rows} rows to {out_path} in {elapsed:.1f}s "
+        f"({exported_rows / elapsed if elapsed else 0:.0f} rows/s, {exported_users / elapsed if elapsed else 0:.0f} users/s)",
+        file=sys.stderr,
+    )
+    return state["users"], state["rows"]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Export every user's skills as NDJSON or Parquet")
+    parser.add_argument("--out", default="skills.ndjson", help="Output file (NDJSON) or directory (Parquet)")
+    parser.add_argument("--format", choices=["ndjson", "parquet"], help="Output format (default: from --out extension)")
+    parser.add_argument("--page-size", type=int, default=DEFAULT_PAGE_SIZE, help="Users read from the store per page")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and export from scratch")
+    args = parser.parse_args(argv)
+
+    fmt = args.format or ("parquet" if args.out.rstrip("/\\").endswith(".parquet") else "ndjson")
+    if fmt == "parquet":
+        try:
+            load_pyarrow()
+        except RuntimeError as e:
+            print(e, file=sys.stderr)
+            return 1
+    if not 1 <= args.page_size <= MAX_PAGE_SIZE:
+        print(f"--page-size must be between 1 and {MAX_PAGE_SIZE}", file=sys.stderr)
+        return 1
+
+    from main import skills_store
+
+    run(skills_store, args.out, fmt, args.page_size, args.restart)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
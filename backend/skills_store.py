@@ -0,0 +1,711 @@
+"""
+Skills Storage
+Pluggable storage backends for user skill documents (Firestore, in-memory, SQLite)
+
+A skills document has the shape written by save_skills:
+    {"skills": [{"skill": ..., "level": ...}], "categories": {category: [skill, ...]}, "updated_at": ...}
+"""
+import heapq
+import json
+import os
+import sqlite3
+import threading
+from itertools import groupby
+from typing import Dict, Iterator, List, Optional, Tuple
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SQLITE_PATH = os.path.join(BASE_DIR, "skills.db")
+
+STORE_FIRESTORE = "firestore"
+STORE_MEMORY = "memory"
+STORE_SQLITE = "sqlite"
+
+
+class SkillsStore:
+    """Interface for reading and writing user skill documents."""
+
+    name = "base"
+
+    def get(self, user_id: str) -> Optional[dict]:
+        """Return the stored skills document for a user, or None."""
+        raise NotImplementedError
+
+    def get_for_update(self, user_id: str) -> Optional[dict]:
+        """
+        Like get, for a read that a partial update is built on: backends with a
+        fallback raise instead of answering from it.
+        """
+        return self.get(user_id)
+
+    def save(self, user_id: str, doc: dict):
+        """Replace the skills of a user with doc."""
+        raise NotImplementedError
+
+    def save_many(self, docs: Dict[str, dict]):
+        """Save several users' documents; backends override this to commit them together."""
+        for user_id, doc in docs.items():
+            self.save(user_id, doc)
+
+    def apply_changes(self, user_id: str, changes: dict):
+        """
+        Apply an incremental change set to an existing skills document.
+
+        changes holds "added" and "removed" lists of {skill, level, category},
+        "updated" entries of {skill, old_level, level, category}, the
+        "emptied_categories" left with no skills and "updated_at". Backends
+        override this to write only the changed fields; this default rewrites
+        the document.
+        """
+        doc = self.get(user_id) or {"skills": [], "categories": {}}
+        self.save(user_id, apply_changes_to_doc(doc, changes))
+
+    def iter_all(self) -> Iterator[Tuple[str, dict]]:
+        """Yield (user_id, doc) for every user with stored skills, e.g. to rebuild indexes."""
+        raise NotImplementedError
+
+    def scan(self, start_after: Optional[str], limit: int) -> Tuple[List[Tuple[str, dict]], Optional[str]]:
+        """
+        One page of users in user_id order, starting after the given user_id.
+        Returns (page, next_cursor); next_cursor is None once the store is exhausted.
+        """
+        raise NotImplementedError
+
+    def get_snapshot(self, name: str) -> Optional[dict]:
+        """Return a named snapshot document (e.g. analytics counters), or None."""
+        raise NotImplementedError
+
+    def save_snapshot(self, name: str, doc: dict):
+        """Replace a named snapshot document."""
+        raise NotImplementedError
+
+    def get_linkedin_profile(self, member_id: str) -> Optional[dict]:
+        """Return the cached LinkedIn profile for a member id, or None."""
+        raise NotImplementedError
+
+    def save_linkedin_profile(self, member_id: str, doc: dict):
+        """Replace the cached LinkedIn profile for a member id."""
+        raise NotImplementedError
+
+    def list_items(self) -> List[dict]:
+        """All items of the /items API, in id order."""
+        raise NotImplementedError
+
+    def get_item(self, item_id: int) -> Optional[dict]:
+        raise NotImplementedError
+
+    def create_item(self, fields: dict) -> dict:
+        """Store a new item under the next id and return it."""
+        raise NotImplementedError
+
+    def update_item(self, item_id: int, fields: dict) -> Optional[dict]:
+        """Replace an item's fields; returns None if there is no such item."""
+        raise NotImplementedError
+
+    def delete_item(self, item_id: int) -> bool:
+        raise NotImplementedError
+
+    def ping(self):
+        """Raise if the backend cannot be reached; used by the readiness probe."""
+
+    def after_fork(self):
+        """Called in a forked child process; drop connections inherited from the parent."""
+
+    def close(self):
+        """Release any resources held by the store."""
+
+
+class MemorySkillsStore(SkillsStore):
+    """Process-local dict storage. Lost on restart and not shared between workers."""
+
+    name = STORE_MEMORY
+
+    def __init__(self, data: Optional[Dict[str, dict]] = None):
+        self.data = data if data is not None else {}
+        self.snapshots: Dict[str, dict] = {}
+        self.linkedin_profiles: Dict[str, dict] = {}
+        self.items: Dict[int, dict] = {}
+        self.next_item_id = 1
+
+    def get(self, user_id: str) -> Optional[dict]:
+        return self.data.get(user_id)
+
+    def save(self, user_id: str, doc: dict):
+        self.data[user_id] = {"user_id": user_id, **doc}
+
+    def apply_changes(self, user_id: str, changes: dict):
+        doc = self.data.get(user_id) or {"user_id": user_id, "skills": [], "categories": {}}
+        self.data[user_id] = apply_changes_to_doc(doc, changes)
+
+    def iter_all(self) -> Iterator[Tuple[str, dict]]:
+        yield from list(self.data.items())
+
+    def scan(self, start_after: Optional[str], limit: int) -> Tuple[List[Tuple[str, dict]], Optional[str]]:
+        keys = heapq.nsmallest(limit, (k for k in list(self.data) if start_after is None or k > start_after))
+        page = [(k, self.data[k]) for k in keys if k in self.data]
+        return page, keys[-1] if len(keys) == limit else None
+
+    def get_snapshot(self, name: str) -> Optional[dict]:
+        return self.snapshots.get(name)
+
+    def save_snapshot(self, name: str, doc: dict):
+        self.snapshots[name] = doc
+
+    def get_linkedin_profile(self, member_id: str) -> Optional[dict]:
+        return self.linkedin_profiles.get(member_id)
+
+    def save_linkedin_profile(self, member_id: str, doc: dict):
+        self.linkedin_profiles[member_id] = doc
+
+    def list_items(self) -> List[dict]:
+        return list(self.items.values())
+
+    def get_item(self, item_id: int) -> Optional[dict]:
+        return self.items.get(item_id)
+
+    def create_item(self, fields: dict) -> dict:
+        item = {"id": self.next_item_id, **fields}
+        self.items[item["id"]] = item
+        self.next_item_id += 1
+        return item
+
+    def update_item(self, item_id: int, fields: dict) -> Optional[dict]:
+        if item_id not in self.items:
+            return None
+        self.items[item_id] = {"id": item_id, **fields}
+        return self.items[item_id]
+
+    def delete_item(self, item_id: int) -> bool:
+        return self.items.pop(item_id, None) is not None
+
+
+class FirestoreSkillsStore(SkillsStore):
+    """Skills stored on the users/{user_id} Firestore document, with an in-memory fallback on errors."""
+
+    name = STORE_FIRESTORE
+
+    def __init__(self, client, fallback: Optional[MemorySkillsStore] = None):
+        self.client = client
+        self.fallback = fallback if fallback is not None else MemorySkillsStore()
+
+    def ping(self):
+        # One small document read; unlike the other methods this raises instead of falling back
+        self.client.collection("_health").document("ping").get(timeout=5)
+
+    def get(self, user_id: str) -> Optional[dict]:
+        try:
+            user_doc = self.client.collection("users").document(user_id).get()
+            if user_doc.exists:
+                return user_doc.to_dict()
+        except Exception as e:
+            print(f"Firestore read error: {e}, falling back to in-memory storage")
+        return self.fallback.get(user_id)
+
+    def get_for_update(self, user_id: str) -> Optional[dict]:
+        user_doc = self.client.collection("users").document(user_id).get()
+        return user_doc.to_dict() if user_doc.exists else None
+
+    def save(self, user_id: str, doc: dict):
+        try:
+            self.client.collection("users").document(user_id).set(doc, merge=True)
+        except Exception as e:
+            print(f"Firestore save error: {e}, falling back to in-memory storage")
+            self.fallback.save(user_id, doc)
+
+    def save_many(self, docs: Dict[str, dict]):
+        """Commit all documents in one Firestore batch write (at most 500 per batch)."""
+        try:
+            batch = self.client.batch()
+            for user_id, doc in docs.items():
+                batch.set(self.client.collection("users").document(user_id), doc, merge=True)
+            batch.commit()
+        except Exception as e:
+            print(f"Firestore batch save error: {e}, falling back to in-memory storage")
+            self.fallback.save_many(docs)
+
+    def apply_changes(self, user_id: str, changes: dict):
+        """
+        Update only the changed fields: ArrayRemove/ArrayUnion on the skills array and
+        on the affected categories.<name> arrays, committed atomically in one batch.
+        Firestore can't remove and union the same field in one update, so removals
+        and additions are two updates in the same batch.
+
+        Errors are raised rather than applied to the fallback: the changes were
+        computed from the Firestore document and mean nothing against another one.
+        """
+        from firebase_admin import firestore
+        from google.cloud.firestore_v1.field_path import FieldPath
+
+        ref = self.client.collection("users").document(user_id)
+        emptied = set(changes.get("emptied_categories", []))
+        removals = [
+            {"skill": c["skill"], "level": c.get("old_level", c["level"])}
+            for c in changes["removed"] + changes["updated"]
+        ]
+        additions = [{"skill": c["skill"], "level": c["level"]} for c in changes["added"] + changes["updated"]]
+
+        removed_by_category: Dict[str, List[str]] = {}
+        for c in changes["removed"]:
+            removed_by_category.setdefault(c["category"], []).append(c["skill"])
+        added_by_category: Dict[str, List[str]] = {}
+        for c in changes["added"]:
+            added_by_category.setdefault(c["category"], []).append(c["skill"])
+
+        def category_path(category: str) -> str:
+            return FieldPath("categories", category).to_api_repr()
+
+        try:
+            batch = self.client.batch()
+            if removals:
+                update = {"skills": firestore.ArrayRemove(removals)}
+                for category, skills in removed_by_category.items():
+                    update[category_path(category)] = (
+                        firestore.DELETE_FIELD if category in emptied else firestore.ArrayRemove(skills)
+                    )
+                batch.update(ref, update)
+            update = {"updated_at": changes["updated_at"]}
+            if additions:
+                update["skills"] = firestore.ArrayUnion(additions)
+            for category, skills in added_by_category.items():
+                update[category_path(category)] = firestore.ArrayUnion(skills)
+            batch.update(ref, update)
+            batch.commit()
+        except Exception as e:
+            print(f"Firestore update error: {e}")
+            raise
+
+    def iter_all(self) -> Iterator[Tuple[str, dict]]:
+        """Stream the users collection; documents without a skills field are skipped."""
+        try:
+            for snapshot in self.client.collection("users").stream():
+                doc = snapshot.to_dict() or {}
+                if "skills" in doc:
+                    yield snapshot.id, doc
+        except Exception as e:
+            print(f"Firestore scan error: {e}, falling back to in-memory storage")
+        yield from self.fallback.iter_all()
+
+    def scan(self, start_after: Optional[str], limit: int) -> Tuple[List[Tuple[str, dict]], Optional[str]]:
+        """Page by document id; the cursor advances past user documents without skills too."""
+        from google.cloud.firestore_v1.field_path import FieldPath
+
+        try:
+            query = self.client.collection("users").order_by(FieldPath.document_id()).limit(limit)
+            if start_after is not None:
+                query = query.start_after({FieldPath.document_id(): self.client.collection("users").document(start_after)})
+            snapshots = list(query.stream())
+        except Exception as e:
+            print(f"Firestore scan error: {e}, falling back to in-memory storage")
+            return self.fallback.scan(start_after, limit)
+        page = []
+        for snapshot in snapshots:
+            doc = snapshot.to_dict() or {}
+            if "skills" in doc:
+                page.append((snapshot.id, doc))
+        return page, snapshots[-1].id if len(snapshots) == limit else None
+
+    def get_snapshot(self, name: str) -> Optional[dict]:
+        """Snapshots live in the analytics collection, one document per name."""
+        try:
+            snapshot = self.client.collection("analytics").document(name).get()
+            if snapshot.exists:
+                return snapshot.to_dict()
+        except Exception as e:
+            print(f"Firestore read error: {e}, falling back to in-memory storage")
+        return self.fallback.get_snapshot(name)
+
+    def save_snapshot(self, name: str, doc: dict):
+        try:
+            self.client.collection("analytics").document(name).set(doc)
+        except Exception as e:
+            print(f"Firestore save error: {e}, falling back to in-memory storage")
+            self.fallback.save_snapshot(name, doc)
+
+    def get_linkedin_profile(self, member_id: str) -> Optional[dict]:
+        """Profiles live in the linkedin_profiles collection, keyed by member id."""
+        try:
+            snapshot = self.client.collection("linkedin_profiles").document(member_id).get()
+            if snapshot.exists:
+                return snapshot.to_dict()
+        except Exception as e:
+            print(f"Firestore read error: {e}, falling back to in-memory storage")
+        return self.fallback.get_linkedin_profile(member_id)
+
+    def save_linkedin_profile(self, member_id: str, doc: dict):
+        try:
+            self.client.collection("linkedin_profiles").document(member_id).set(doc)
+        except Exception as e:
+            print(f"Firestore save error: {e}, falling back to in-memory storage")
+            self.fallback.save_linkedin_profile(member_id, doc)
+
+    def list_items(self) -> List[dict]:
+        """Items live in the items collection; ids come from a counter document."""
+        try:
+            return [snapshot.to_dict() for snapshot in self.client.collection("items").order_by("id").stream()]
+        except Exception as e:
+            print(f"Firestore read error: {e}, falling back to in-memory storage")
+            return self.fallback.list_items()
+
+    def get_item(self, item_id: int) -> Optional[dict]:
+        try:
+            snapshot = self.client.collection("items").document(str(item_id)).get()
+            return snapshot.to_dict() if snapshot.exists else None
+        except Exception as e:
+            print(f"Firestore read error: {e}, falling back to in-memory storage")
+            return self.fallback.get_item(item_id)
+
+    def create_item(self, fields: dict) -> dict:
+        from firebase_admin import firestore
+
+        counter = self.client.collection("counters").document("items")
+
+        @firestore.transactional
+        def allocate_id(transaction) -> int:
+            snapshot = counter.get(transaction=transaction)
+            next_id = (snapshot.to_dict() or {}).get("next_id", 1) if snapshot.exists else 1
+            transaction.set(counter, {"next_id": next_id + 1})
+            return next_id
+
+        try:
+            item = {"id": allocate_id(self.client.transaction()), **fields}
+            self.client.collection("items").document(str(item["id"])).set(item)
+            return item
+        except Exception as e:
+            print(f"Firestore save error: {e}, falling back to in-memory storage")
+            return self.fallback.create_item(fields)
+
+    def update_item(self, item_id: int, fields: dict) -> Optional[dict]:
+        try:
+            ref = self.client.collection("items").document(str(item_id))
+            if not ref.get().exists:
+                return None
+            item = {"id": item_id, **fields}
+            ref.set(item)
+            return item
+        except Exception as e:
+            print(f"Firestore save error: {e}, falling back to in-memory storage")
+            return self.fallback.update_item(item_id, fields)
+
+    def delete_item(self, item_id: int) -> bool:
+        try:
+            ref = self.client.collection("items").document(str(item_id))
+            if not ref.get().exists:
+                return False
+            ref.delete()
+            return True
+        except Exception as e:
+            print(f"Firestore delete error: {e}, falling back to in-memory storage")
+            return self.fallback.delete_item(item_id)
+
+
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    user_id TEXT PRIMARY KEY,
+    updated_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS user_skills (
+    user_id TEXT NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+    skill TEXT NOT NULL,
+    level TEXT NOT NULL,
+    category TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    PRIMARY KEY (user_id, skill)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_user_skills_skill_level ON user_skills(skill, level);
+CREATE INDEX IF NOT EXISTS idx_user_skills_category ON user_skills(category);
+CREATE TABLE IF NOT EXISTS snapshots (
+    name TEXT PRIMARY KEY,
+    doc TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS linkedin_profiles (
+    member_id TEXT PRIMARY KEY,
+    doc TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS items (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    description TEXT,
+    price REAL NOT NULL
+);
+"""
+
+
+class SQLiteSkillsStore(SkillsStore):
+    """
+    Durable local storage in SQLite (WAL mode), one row per (user, skill, level, category).
+
+    Several uvicorn workers on one host can share the same database file.
+    """
+
+    name = STORE_SQLITE
+
+    def __init__(self, path: str = DEFAULT_SQLITE_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        conn = self._connect()
+        conn.executescript(_SQLITE_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        """One connection per thread, created on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def ping(self):
+        self._connect().execute("SELECT 1 FROM users LIMIT 1").fetchall()
+
+    def get(self, user_id: str) -> Optional[dict]:
+        conn = self._connect()
+        user = conn.execute("SELECT updated_at FROM users WHERE user_id = ?", (user_id,)).fetchone()
+        if user is None:
+            return None
+        rows = conn.execute(
+            "SELECT skill, level, category FROM user_skills WHERE user_id = ? ORDER BY position",
+            (user_id,),
+        ).fetchall()
+        return _rows_to_doc(rows, user[0])
+
+    def save(self, user_id: str, doc: dict):
+        self.save_many({user_id: doc})
+
+    def iter_all(self) -> Iterator[Tuple[str, dict]]:
+        """Stream all users in user_id order on a dedicated cursor."""
+        conn = self._connect()
+        rows = conn.execute(
+            "SELECT u.user_id, u.updated_at, s.skill, s.level, s.category "
+            "FROM users u LEFT JOIN user_skills s ON s.user_id = u.user_id "
+            "ORDER BY u.user_id, s.position"
+        )
+        for (user_id, updated_at), group in groupby(rows, key=lambda row: (row[0], row[1])):
+            skill_rows = [(skill, level, category) for _, _, skill, level, category in group if skill is not None]
+            yield user_id, _rows_to_doc(skill_rows, updated_at)
+
+    def scan(self, start_after: Optional[str], limit: int) -> Tuple[List[Tuple[str, dict]], Optional[str]]:
+        """Two range reads on the primary keys: the page of users, then their skill rows."""
+        conn = self._connect()
+        users = conn.execute(
+            "SELECT user_id, updated_at FROM users WHERE user_id > ? ORDER BY user_id LIMIT ?",
+            (start_after or "", limit),
+        ).fetchall()
+        if not users:
+            return [], None
+        skill_rows: Dict[str, List[tuple]] = {}
+        for user_id, skill, level, category in conn.execute(
+            "SELECT user_id, skill, level, category FROM user_skills "
+            "WHERE user_id > ? AND user_id <= ? ORDER BY user_id, position",
+            (start_after or "", users[-1][0]),
+        ):
+            skill_rows.setdefault(user_id, []).append((skill, level, category))
+        page = [(user_id, _rows_to_doc(skill_rows.get(user_id, []), updated_at)) for user_id, updated_at in users]
+        return page, users[-1][0] if len(users) == limit else None
+
+    def get_snapshot(self, name: str) -> Optional[dict]:
+        row = self._connect().execute("SELECT doc FROM snapshots WHERE name = ?", (name,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save_snapshot(self, name: str, doc: dict):
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO snapshots (name, doc) VALUES (?, ?)", (name, json.dumps(doc))
+            )
+
+    def get_linkedin_profile(self, member_id: str) -> Optional[dict]:
+        row = self._connect().execute(
+            "SELECT doc FROM linkedin_profiles WHERE member_id = ?", (member_id,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save_linkedin_profile(self, member_id: str, doc: dict):
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO linkedin_profiles (member_id, doc) VALUES (?, ?)",
+                (member_id, json.dumps(doc)),
+            )
+
+    def list_items(self) -> List[dict]:
+        rows = self._connect().execute("SELECT id, name, description, price FROM items ORDER BY id")
+        return [_item_row(row) for row in rows]
+
+    def get_item(self, item_id: int) -> Optional[dict]:
+        row = self._connect().execute(
+            "SELECT id, name, description, price FROM items WHERE id = ?", (item_id,)
+        ).fetchone()
+        return _item_row(row) if row else None
+
+    def create_item(self, fields: dict) -> dict:
+        conn = self._connect()
+        with conn:
+            cursor = conn.execute(
+                "INSERT INTO items (name, description, price) VALUES (?, ?, ?)",
+                (fields["name"], fields.get("description"), fields["price"]),
+            )
+        return {"id": cursor.lastrowid, **fields}
+
+    def update_item(self, item_id: int, fields: dict) -> Optional[dict]:
+        conn = self._connect()
+        with conn:
+            cursor = conn.execute(
+                "UPDATE items SET name = ?, description = ?, price = ? WHERE id = ?",
+                (fields["name"], fields.get("description"), fields["price"], item_id),
+            )
+        return {"id": item_id, **fields} if cursor.rowcount else None
+
+    def delete_item(self, item_id: int) -> bool:
+        conn = self._connect()
+        with conn:
+            return conn.execute("DELETE FROM items WHERE id = ?", (item_id,)).rowcount > 0
+
+    def save_many(self, docs: Dict[str, dict]):
+        """Write all documents in a single transaction."""
+        conn = self._connect()
+        with conn:
+            for user_id, doc in docs.items():
+                conn.execute(
+                    "INSERT INTO users (user_id, updated_at) VALUES (?, ?) "
+                    "ON CONFLICT(user_id) DO UPDATE SET updated_at = excluded.updated_at",
+                    (user_id, doc.get("updated_at", "")),
+                )
+                conn.execute("DELETE FROM user_skills WHERE user_id = ?", (user_id,))
+                conn.executemany(
+                    "INSERT OR REPLACE INTO user_skills (user_id, skill, level, category, position) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    _doc_to_rows(user_id, doc),
+                )
+
+    def apply_changes(self, user_id: str, changes: dict):
+        """Insert, delete or update only the affected user_skills rows."""
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT INTO users (user_id, updated_at) VALUES (?, ?) "
+                "ON CONFLICT(user_id) DO UPDATE SET updated_at = excluded.updated_at",
+                (user_id, changes["updated_at"]),
+            )
+            conn.executemany(
+                "DELETE FROM user_skills WHERE user_id = ? AND skill = ?",
+                [(user_id, c["skill"]) for c in changes["removed"]],
+            )
+            conn.executemany(
+                "UPDATE user_skills SET level = ? WHERE user_id = ? AND skill = ?",
+                [(c["level"], user_id, c["skill"]) for c in changes["updated"]],
+            )
+            if changes["added"]:
+                next_position = conn.execute(
+                    "SELECT COALESCE(MAX(position) + 1, 0) FROM user_skills WHERE user_id = ?", (user_id,)
+                ).fetchone()[0]
+                conn.executemany(
+                    "INSERT OR REPLACE INTO user_skills (user_id, skill, level, category, position) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    [
+                        (user_id, c["skill"], c["level"], c["category"], next_position + i)
+                        for i, c in enumerate(changes["added"])
+                    ],
+                )
+
+    def after_fork(self):
+        # SQLite connections must not cross a fork; abandon the parent's without closing them
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+
+    def close(self):
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+
+def _doc_to_rows(user_id: str, doc: dict) -> List[tuple]:
+    """Flatten a skills document into user_skills rows."""
+    category_of = {
+        skill: category
+        for category, skills in doc.get("categories", {}).items()
+        for skill in skills
+    }
+    return [
+        (user_id, entry["skill"], entry["level"], category_of.get(entry["skill"], ""), position)
+        for position, entry in enumerate(doc.get("skills", []))
+    ]
+
+
+def _item_row(row: tuple) -> dict:
+    item_id, name, description, price = row
+    return {"id": item_id, "name": name, "description": description, "price": price}
+
+
+def _rows_to_doc(rows: List[tuple], updated_at: str) -> dict:
+    """Rebuild a skills document from (skill, level, category) rows."""
+    categories: Dict[str, List[str]] = {}
+    for skill, _, category in rows:
+        categories.setdefault(category, []).append(skill)
+    return {
+        "skills": [{"skill": skill, "level": level} for skill, level, _ in rows],
+        "categories": categories,
+        "updated_at": updated_at,
+    }
+
+
+def apply_changes_to_doc(doc: dict, changes: dict) -> dict:
+    """Return a copy of a skills document with an incremental change set applied."""
+    removed = {c["skill"] for c in changes["removed"]}
+    new_levels = {c["skill"]: c["level"] for c in changes["updated"]}
+
+    skills = [
+        {"skill": s["skill"], "level": new_levels.get(s["skill"], s["level"])}
+        for s in doc.get("skills", [])
+        if s["skill"] not in removed
+    ]
+    skills.extend({"skill": c["skill"], "level": c["level"]} for c in changes["added"])
+
+    categories = {
+        category: [s for s in members if s not in removed]
+        for category, members in doc.get("categories", {}).items()
+    }
+    for c in changes["added"]:
+        members = categories.setdefault(c["category"], [])
+        if c["skill"] not in members:
+            members.append(c["skill"])
+
+    return {
+        **doc,
+        "skills": skills,
+        "categories": {category: members for category, members in categories.items() if members},
+        "updated_at": changes["updated_at"],
+    }
+
+
+def create_skills_store(backend: Optional[str] = None, firestore_client=None, fallback_data: Optional[Dict[str, dict]] = None) -> SkillsStore:
+    """
+    Build the skills store selected by SKILLS_STORE (firestore, sqlite or memory).
+
+    Without a setting, Firestore is used when a client is available and memory otherwise,
+    which matches the behaviour before storage was configurable. SKILLS_DB_PATH sets the
+    SQLite file.
+    """
+    backend = (backend or os.getenv("SKILLS_STORE", "")).strip().lower()
+    memory = MemorySkillsStore(fallback_data)
+
+    if not backend:
+        backend = STORE_FIRESTORE if firestore_client is not None else STORE_MEMORY
+
+    if backend == STORE_SQLITE:
+        return SQLiteSkillsStore(os.getenv("SKILLS_DB_PATH", DEFAULT_SQLITE_PATH))
+    if backend == STORE_FIRESTORE:
+        if firestore_client is None:
+            print("Warning: SKILLS_STORE=firestore but Firestore is not available. Using in-memory storage.")
+            return memory
+        return FirestoreSkillsStore(firestore_client, fallback=memory)
+    if backend == STORE_MEMORY:
+        return memory
+    raise ValueError(f"Unknown SKILLS_STORE '{backend}'. Use firestore, sqlite or memory.")
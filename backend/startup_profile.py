@@ -0,0 +1,72 @@
+"""
+Startup Profile
+Wall-clock timings of each cold start phase, from module import to ready
+
+Import it before anything heavy: its import time is taken as the start of the
+process, so the "imports" phase covers framework and module imports.
+"""
+import time
+from contextlib import contextmanager
+from typing import List, Optional
+
+PROCESS_STARTED = time.perf_counter()
+
+
+class StartupProfile:
+    """Ordered (phase, seconds, status) records plus the time readiness was reported."""
+
+    def __init__(self, started: float = PROCESS_STARTED):
+        self.started = started
+        self.phases: List[dict] = []
+        self._mark = started
+        self.ready_at: Optional[float] = None
+
+    def record(self, name: str, seconds: float, status: str = "ok", error: Optional[str] = None):
+        entry = {"phase": name, "ms": round(seconds * 1000, 1), "status": status}
+        if error:
+            entry["error"] = error
+        self.phases.append(entry)
+
+    def mark(self, name: str):
+        """Record the time since the previous mark (or process start) as a phase."""
+        now = time.perf_counter()
+        self.record(name, now - self._mark)
+        self._mark = now
+
+    @contextmanager
+    def phase(self, name: str, required: bool = True):
+        """
+        Time a block as one phase. Failures of optional phases are recorded and
+        printed as warnings instead of raised, since their work happens lazily later.
+        """
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.record(name, time.perf_counter() - started, "failed", str(e))
+            if required:
+                raise
+            print(f"Warning: Startup phase '{name}' failed, it will run on first use: {e}")
+        else:
+            self.record(name, time.perf_counter() - started)
+        self._mark = time.perf_counter()
+
+    def set_ready(self):
+        self.ready_at = time.perf_counter()
+
+    @property
+    def ready(self) -> bool:
+        return self.ready_at is not None
+
+    def report(self) -> dict:
+        return {
+            "ready": self.ready,
+            "ready_ms": round((self.ready_at - self.started) * 1000, 1) if self.ready else None,
+            "phases": list(self.phases),
+        }
+
+    def summary(self) -> str:
+        lines = [f"{p['phase']:<22}{p['ms']:>10.1f} ms  {p['status']}" for p in self.phases]
+        if self.ready:
+            lines.append(f"{'ready after':<22}{(self.ready_at - self.started) * 1000:>10.1f} ms")
+        return "\n".join(lines)
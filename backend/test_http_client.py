@@ -0,0 +1,148 @@
+"""
+Tests for the shared HTTP client against the fake LinkedIn: the retry policy,
+and the latency of the LinkedIn callback's profile fetch
+
+Usage:
+    python -m pytest test_http_client.py
+"""
+import asyncio
+import socket
+import statistics
+import threading
+import time
+from contextlib import contextmanager
+
+import pytest
+import uvicorn
+
+from fake_linkedin import _sequential_baseline, create_app
+from http_client import PooledHTTPClient
+
+RETRIES = 2
+LATENCY_MS = 80.0
+RUNS = 5
+
+
+@contextmanager
+def serve(fake):
+    """Serve a fake LinkedIn app on a free local port; yields its base URL."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(fake, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 10
+    while not server.started:
+        if time.monotonic() > deadline:
+            raise RuntimeError("fake LinkedIn did not start")
+        time.sleep(0.01)
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        server.should_exit = True
+        thread.join(timeout=10)
+
+
+@pytest.fixture
+def failing_linkedin():
+    """The fake LinkedIn with every request answered 503."""
+    fake = create_app(error_rate=1.0, seed=0)
+    with serve(fake) as base:
+        yield fake, base
+
+
+@pytest.fixture
+def slow_linkedin(monkeypatch, tmp_path):
+    """
+    The fake LinkedIn with LATENCY_MS on every call and userinfo failing, so the
+    callback takes the v2 fallback; main is pointed at it with in-memory storage.
+    """
+    monkeypatch.setenv("FIREBASE_ENABLED", "0")
+    monkeypatch.setenv("SEARCH_INDEX_PATH", str(tmp_path / "search_index.db"))
+    import main
+
+    fake = create_app(latency_ms=LATENCY_MS, userinfo=False)
+    with serve(fake) as base:
+        monkeypatch.setattr(main, "LINKEDIN_OAUTH_BASE", base)
+        monkeypatch.setattr(main, "LINKEDIN_API_BASE", base)
+        monkeypatch.setattr(main, "LINKEDIN_CLIENT_ID", "fake-client")
+        monkeypatch.setattr(main, "LINKEDIN_CLIENT_SECRET", "fake-secret")
+        # Every callback fetches the profile instead of answering from the cache
+        monkeypatch.setattr(main.linkedin_profiles, "ttl_seconds", 0)
+        yield main, fake, base
+
+
+async def _call(method: str, url: str, **kwargs):
+    client = PooledHTTPClient(retries=RETRIES, backoff=0.0)
+    try:
+        return await client.request(method, url, **kwargs)
+    finally:
+        await client.close()
+
+
+async def _timed(make_call, runs: int):
+    """Milliseconds for each of runs calls, after one untimed call that opens the pooled connections."""
+    await make_call()
+    times = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        await make_call()
+        times.append((time.perf_counter() - started) * 1000)
+    return times
+
+
+def test_idempotent_request_is_retried(failing_linkedin):
+    fake, base = failing_linkedin
+    response = asyncio.run(_call("GET", f"{base}/v2/me"))
+    assert response.status_code == 503
+    assert fake.state.calls["/v2/me"] == RETRIES + 1
+
+
+def test_non_idempotent_request_is_not_retried(failing_linkedin):
+    fake, base = failing_linkedin
+    response = asyncio.run(_call("POST", f"{base}/oauth/v2/accessToken", data={"code": "abc"}))
+    assert response.status_code == 503
+    assert fake.state.calls["/oauth/v2/accessToken"] == 1
+
+
+def test_fallback_lookups_run_concurrently(slow_linkedin):
+    main, fake, _ = slow_linkedin
+    results = []
+
+    async def fetch():
+        results.append(await main.fetch_linkedin_profile("token-x"))
+
+    async def run():
+        try:
+            return await _timed(fetch, RUNS)
+        finally:
+            await main.http_client.close()
+
+    times = asyncio.run(run())
+    status, profile, _ = results[-1]
+    assert status == "ok"
+    assert profile["email"] == "ada@example.com"
+    assert profile["profile_picture"] == "https://media.example.com/ada-400.jpg"
+    assert fake.state.calls["/v2/emailAddress"] == RUNS + 1
+    # userinfo, then profile, email and picture together: two latencies, not the four of a sequential fetch
+    assert statistics.median(times) < 2.75 * LATENCY_MS
+
+
+def test_pooled_callback_beats_sequential_calls(slow_linkedin):
+    main, _, base = slow_linkedin
+    pages = []
+
+    async def callback():
+        pages.append((await main.linkedin_callback(code="c")).body.decode())
+
+    async def run():
+        try:
+            return await _timed(callback, RUNS)
+        finally:
+            await main.http_client.close()
+
+    pooled = asyncio.run(run())
+    sequential = _sequential_baseline(base, RUNS)
+    assert "Connected Successfully" in pages[-1]
+    assert statistics.median(pooled) < statistics.median(sequential) - LATENCY_MS
@@ -0,0 +1,142 @@
+"""
+Write-Behind Queue
+Coalesces bursts of writes to the same key and flushes them in batches
+"""
+import asyncio
+import os
+from typing import Callable, Dict, List, Optional
+
+from fastapi.concurrency import run_in_threadpool
+
+FIRESTORE_BATCH_LIMIT = 500  # Maximum number of writes in one Firestore batch
+
+
+class WriteBehindQueue:
+    """
+    Holds the latest pending document per key for a short window, then writes all
+    pending documents through `write_batch` in chunks of at most `max_batch`.
+
+    `submit` returns only after the batch containing the document was committed,
+    so callers acknowledge a save once it is durable. If the batch fails, every
+    waiter of that batch gets the exception.
+
+    `on_written`, when given, is called with each committed batch right after the
+    commit and before any waiter is released. Batches commit one at a time, so it
+    sees every key's states in commit order, and only the coalesced state that
+    was actually written.
+    """
+
+    def __init__(
+        self,
+        write_batch: Callable[[Dict[str, dict]], None],
+        window_seconds: float = 0.05,
+        max_batch: int = FIRESTORE_BATCH_LIMIT,
+        on_written: Optional[Callable[[Dict[str, dict]], None]] = None,
+    ):
+        self.write_batch = write_batch
+        self.on_written = on_written
+        self.window_seconds = window_seconds
+        self.max_batch = max_batch
+        self._pending: Dict[str, dict] = {}
+        self._waiters: Dict[str, List[asyncio.Future]] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._closed = False
+        self._stats = {"submitted": 0, "coalesced": 0, "written": 0, "batches": 0, "failed_batches": 0}
+
+    async def submit(self, key: str, doc: dict):
+        """Queue doc as the new state for key and wait until it has been written."""
+        if self._closed:
+            raise RuntimeError("Write-behind queue is closed")
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        self._stats["submitted"] += 1
+        if key in self._pending:
+            # A newer state replaces the one still waiting; both callers get the same ack
+            self._stats["coalesced"] += 1
+        self._pending[key] = doc
+        self._waiters.setdefault(key, []).append(future)
+
+        if len(self._pending) >= self.max_batch:
+            self._cancel_timer()
+            loop.create_task(self.flush())
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window_seconds, lambda: loop.create_task(self.flush()))
+
+        await future
+
+    async def flush(self):
+        """Write everything pending now, in batches of at most max_batch."""
+        self._cancel_timer()
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        # Serialize flushes so an older batch can never land after a newer one
+        async with self._flush_lock:
+            pending, waiters = self._pending, self._waiters
+            self._pending, self._waiters = {}, {}
+            keys = list(pending)
+            for start in range(0, len(keys), self.max_batch):
+                chunk = {key: pending[key] for key in keys[start:start + self.max_batch]}
+                try:
+                    await run_in_threadpool(self._write, chunk)
+                    self._stats["batches"] += 1
+                    self._stats["written"] += len(chunk)
+                    error = None
+                except Exception as e:
+                    self._stats["failed_batches"] += 1
+                    error = e
+                for key in chunk:
+                    for future in waiters.get(key, []):
+                        if future.done():
+                            continue
+                        if error is None:
+                            future.set_result(None)
+                        else:
+                            future.set_exception(error)
+
+    def _write(self, chunk: Dict[str, dict]):
+        self.write_batch(chunk)
+        if self.on_written is not None:
+            try:
+                self.on_written(chunk)
+            except Exception as e:
+                # The batch is durable; a failing listener must not fail its callers
+                print(f"Warning: Write-behind listener failed: {e}")
+
+    async def flush_key(self, key: str):
+        """Make sure any pending write for key has been committed."""
+        if key in self._pending:
+            await self.flush()
+        elif self._flush_lock is not None:
+            # A flush that already took this key may still be writing it
+            async with self._flush_lock:
+                pass
+
+    def _cancel_timer(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    async def close(self):
+        """Flush outstanding writes and refuse new ones (call on shutdown)."""
+        self._closed = True
+        await self.flush()
+
+    def stats(self) -> Dict[str, object]:
+        submitted, written = self._stats["submitted"], self._stats["written"]
+        return {
+            **self._stats,
+            "pending": len(self._pending),
+            "window_ms": self.window_seconds * 1000,
+            "write_reduction": round(submitted / written, 2) if written else 0.0,
+        }
+
+
+def create_skills_writer(
+    write_batch: Callable[[Dict[str, dict]], None],
+    on_written: Optional[Callable[[Dict[str, dict]], None]] = None,
+) -> WriteBehindQueue:
+    """Build the skills write-behind queue; SKILLS_WRITE_COALESCE_MS sets the window."""
+    window_ms = float(os.getenv("SKILLS_WRITE_COALESCE_MS", "50"))
+    return WriteBehindQueue(write_batch, window_seconds=max(0.0, window_ms) / 1000, on_written=on_written)